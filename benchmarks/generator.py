@@ -0,0 +1,100 @@
+"""Generates synthetic AppSchemas for benchmarks.
+
+The shape of the schema is controlled by the number of top-level modules,
+the depth of the module tree and the number of children of each module
+below the top level, the number of params per module, the fraction of
+modules that are instances of module types, and the number and size of the
+option lists. Generation is deterministic for a given seed.
+"""
+
+import random
+from tctrl.parsing import ReadAppFromObj
+
+_ParamTypes = ['float', 'int', 'bool', 'menu', 'fvec', 'string', 'trigger']
+
+def _BuildParamObj(rand, i, optionlists, optionlistsize):
+	ptype = _ParamTypes[i % len(_ParamTypes)]
+	obj = {
+		'key': 'p%d' % i,
+		'label': 'Param %d' % i,
+		'type': ptype,
+		'group': 'group%d' % (i // 8),
+	}
+	if ptype == 'float':
+		obj.update(minNorm=0, maxNorm=1, default=round(rand.random(), 3))
+	elif ptype == 'int':
+		obj.update(minLimit=0, maxLimit=100, default=rand.randrange(100))
+	elif ptype == 'bool':
+		obj.update(default=rand.random() < 0.5)
+	elif ptype == 'menu':
+		if optionlists:
+			obj['optionList'] = 'list%d' % rand.randrange(optionlists)
+		else:
+			obj['options'] = ['option%d' % j for j in range(optionlistsize)]
+	elif ptype == 'fvec':
+		obj.update(
+			default=[0.0, 0.5, 1.0],
+			parts=[{'key': 'p%d%s' % (i, axis)} for axis in 'xyz'])
+	elif ptype == 'string':
+		obj.update(tags=['text'])
+	return obj
+
+def GenerateSchemaObj(
+		modules=100,
+		depth=1,
+		fanout=0,
+		params=20,
+		moduletyperatio=0.0,
+		moduletypes=10,
+		optionlists=10,
+		optionlistsize=8,
+		seed=0):
+	"""Generates the JSON object for a synthetic schema.
+
+	There are modules top-level modules, each of which has a tree of
+	fanout children per module down to depth levels. Each module has params
+	params, except for the moduletyperatio fraction of modules that are
+	instances of one of the module types, which instead get their params
+	from the type."""
+	rand = random.Random(seed)
+	moduletypes = moduletypes if moduletyperatio > 0 else 0
+	def _BuildModuleObj(key, level):
+		obj = {
+			'key': key,
+			'label': key.capitalize(),
+			'group': 'group%d' % (rand.randrange(4)),
+		}
+		if moduletypes and rand.random() < moduletyperatio:
+			obj['moduleType'] = 'type%d' % rand.randrange(moduletypes)
+		else:
+			obj['params'] = [_BuildParamObj(rand, i, optionlists, optionlistsize) for i in range(params)]
+		if level < depth and fanout:
+			obj['children'] = [_BuildModuleObj('%s_%d' % (key, i), level + 1) for i in range(fanout)]
+		return obj
+	return {
+		'key': 'bench',
+		'label': 'Benchmark',
+		'optionLists': [
+			{
+				'key': 'list%d' % i,
+				'options': [{'key': 'option%d' % j, 'label': 'Option %d' % j} for j in range(optionlistsize)],
+			}
+			for i in range(optionlists)
+		],
+		'moduleTypes': [
+			{
+				'key': 'type%d' % i,
+				'params': [_BuildParamObj(rand, j, optionlists, optionlistsize) for j in range(params)],
+			}
+			for i in range(moduletypes)
+		],
+		'children': [_BuildModuleObj('mod%d' % i, 1) for i in range(modules)],
+	}
+
+def GenerateSchema(**kwargs):
+	"""Generates a synthetic AppSchema. See GenerateSchemaObj for the
+	arguments."""
+	return ReadAppFromObj(GenerateSchemaObj(**kwargs))
+
+def CountParams(appschema):
+	return sum(len(module.params or ()) for module, _, _ in appschema.WalkModules())
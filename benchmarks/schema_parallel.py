@@ -0,0 +1,34 @@
+"""Compares ReadAppFromObj with ReadAppFromObjParallel for a range of schema
+sizes, to help choose ParallelParseThreshold for a machine. The process pool
+is started before timing, as it would be when an executor is reused.
+
+Usage: python -m benchmarks.schema_parallel [workers] [params...]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import time
+from benchmarks.generator import GenerateSchemaObj
+from tctrl.parallel import ReadAppFromObjParallel
+from tctrl.parsing import ReadAppFromObj
+
+def main(args):
+	workers = int(args[1]) if len(args) > 1 else (os.cpu_count() or 1)
+	sizes = [int(arg) for arg in args[2:]] or [10000, 50000, 100000, 500000]
+	print('%9s %9s %10s %8s' % ('params', 'serial s', 'parallel s', 'speedup'))
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		# start the workers
+		list(pool.map(abs, range(workers)))
+		for paramcount in sizes:
+			obj = GenerateSchemaObj(modules=paramcount // 20, params=20)
+			start = time.perf_counter()
+			ReadAppFromObj(obj)
+			serialtime = time.perf_counter() - start
+			start = time.perf_counter()
+			ReadAppFromObjParallel(obj, maxworkers=workers, minparams=0, executor=pool)
+			paralleltime = time.perf_counter() - start
+			print('%9d %9.3f %10.3f %7.1fx' % (paramcount, serialtime, paralleltime, serialtime / paralleltime))
+
+if __name__ == '__main__':
+	main(sys.argv)
@@ -0,0 +1,272 @@
+"""Runs timed benchmark scenarios against a synthetic schema and writes the
+results as JSON, for comparing runs across changes and machines.
+
+Each scenario is run a number of times, with any setup (such as building a
+fresh copy of the schema so that cached JSON isn't reused) done outside of
+the timed section, and the best, median and mean times are recorded.
+
+Usage: python -m benchmarks.suite [--size small|medium|large] [--repeat N]
+	[--output results.json] [scenario name prefixes...]
+"""
+
+import argparse
+import copy
+import json
+import platform
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from benchmarks.generator import GenerateSchemaObj, CountParams
+from tctrl.model import AppModel, ArrayAccessor
+from tctrl.parsing import ReadAppFromObj
+from tctrl.presets import PresetStore
+from tctrl.processing import ProcessAppSchema
+from tctrl.ramps import RampEngine
+from tctrl.ranges import RangeTable, numpy
+from tctrl.schema import *
+
+try:
+	from tctrl.remote import OscAccessor
+except ImportError:
+	OscAccessor = None
+
+Sizes = {
+	'small': dict(modules=20, depth=2, fanout=4, params=20, moduletyperatio=0.25),
+	'medium': dict(modules=100, depth=3, fanout=3, params=20, moduletyperatio=0.25),
+	'large': dict(modules=500, depth=3, fanout=4, params=20, moduletyperatio=0.25),
+}
+
+_ProcessFlags = ['embedlists', 'embedmoduletypes', 'generateparamgroups', 'generatechildgroups']
+
+class _Scenario:
+	def __init__(self, name, run, setup=None, items=None):
+		self.name = name
+		self.run = run
+		self.setup = setup
+		self.items = items
+
+class _UdpSink:
+	"""A local UDP socket that receives and discards datagrams on a thread."""
+
+	def __init__(self):
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.bind(('127.0.0.1', 0))
+		self.sock.settimeout(0.1)
+		self.address = self.sock.getsockname()
+		self.receivedcount = 0
+		self._running = True
+		self._thread = threading.Thread(target=self._Receive, daemon=True)
+		self._thread.start()
+
+	def _Receive(self):
+		while self._running:
+			try:
+				self.sock.recv(65536)
+			except socket.timeout:
+				continue
+			self.receivedcount += 1
+
+	def Close(self):
+		self._running = False
+		self._thread.join()
+		self.sock.close()
+
+def _SampleValue(param):
+	ptype = param.ptype
+	if ptype == ParamType.float:
+		return 0.25
+	if ptype == ParamType.int:
+		return 7
+	if ptype == ParamType.bool:
+		return True
+	if ptype == ParamType.fvec:
+		return [0.1, 0.2, 0.3]
+	if ptype == ParamType.trigger:
+		return None
+	return 'option1'
+
+def _CollectParams(app: AppModel):
+	params = []
+	modules = list(app.children.values())
+	while modules:
+		module = modules.pop()
+		params.extend(module.params.values())
+		modules.extend(module.children.values())
+	return params
+
+def _IterParams(appschema):
+	for module, _, _ in appschema.WalkModules():
+		yield from module.params or ()
+
+def _BuildScenarios(obj, sink):
+	appschema = ReadAppFromObj(obj)
+	paramcount = CountParams(appschema)
+	scenarios = [
+		_Scenario('read_app_from_obj', lambda _: ReadAppFromObj(obj), items=paramcount),
+		_Scenario('to_json', lambda schema: schema.ToJson(), setup=lambda: ReadAppFromObj(obj), items=paramcount),
+		_Scenario('to_json_cached', lambda _: appschema.ToJson(), setup=appschema.ToJson, items=paramcount),
+	]
+	scenarios.append(_Scenario('process_copy', lambda _: ProcessAppSchema(appschema), items=paramcount))
+	for flag in _ProcessFlags:
+		scenarios.append(_Scenario(
+			'process_' + flag,
+			lambda _, flag=flag: ProcessAppSchema(appschema, **{flag: True}),
+			items=paramcount))
+		scenarios.append(_Scenario(
+			'process_' + flag + '_shared',
+			lambda _, flag=flag: ProcessAppSchema(appschema, sharenodes=True, **{flag: True}),
+			items=paramcount))
+
+	# the process scenarios would time a no-op if nothing used the option lists
+	embedded = ProcessAppSchema(appschema, embedlists=True)
+	if not any(param.optionlist and param.options for param in _IterParams(embedded)):
+		raise AssertionError('No options were embedded from option lists')
+
+	keypaths = []
+	stack = [(m, m.key) for m in appschema.children]
+	while stack:
+		module, keypath = stack.pop()
+		keypaths.append(keypath)
+		stack.extend((child, keypath + '/' + child.key) for child in module.children or ())
+	rand = random.Random(0)
+	lookups = [rand.choice(keypaths) for _ in range(10000)]
+	def _EvaluatePaths(schema):
+		for keypath in lookups:
+			schema.EvaluatePath(keypath)
+	indexed = copy.copy(appschema)
+	indexed.indexpaths = True
+	scenarios += [
+		_Scenario('evaluate_path', lambda _: _EvaluatePaths(appschema), items=len(lookups)),
+		_Scenario('evaluate_path_indexed', lambda _: _EvaluatePaths(indexed), setup=indexed.GetIndex, items=len(lookups)),
+		_Scenario('app_model', lambda _: AppModel(appschema), items=paramcount),
+		_Scenario('app_model_lazy', lambda _: AppModel(appschema, lazy=True), items=paramcount),
+	]
+
+	model = AppModel(appschema)
+	rangetables = [('python', RangeTable(model, usenumpy=False))]
+	if numpy is not None:
+		rangetables.append(('numpy', RangeTable(model, usenumpy=True)))
+	for suffix, table in rangetables:
+		faders = [0.5] * len(table)
+		scenarios += [
+			_Scenario('ranges_denormalize_' + suffix, lambda _, t=table, f=faders: t.Clamp(t.Denormalize(f)), items=len(table)),
+			_Scenario('ranges_normalize_' + suffix, lambda _, t=table, f=faders: t.Normalize(f), items=len(table)),
+		]
+		def _SetupRamps(usenumpy=table.usenumpy):
+			# every numeric param is ramped, and each tick moves all of them
+			engine = RampEngine(AppModel(appschema), usenumpy=usenumpy)
+			for param in dict.fromkeys(engine.table.params):
+				length = len(param.spec.parts) if param.spec.parts else None
+				target = [1.0] * length if length else 1.0
+				engine.Ramp(param, target, 1.0, start=[0.0] * length if length else 0.0, now=0.0)
+			engine.Tick(0.0)
+			return engine
+		scenarios.append(_Scenario('ramp_tick_' + suffix, lambda engine: engine.Tick(0.5), setup=_SetupRamps, items=len(table)))
+		def _SetupPresets(usenumpy=table.usenumpy):
+			# two presets that differ in every numeric value, with the current
+			# state differing from the first in 1% of the params
+			store = PresetStore(AppModel(appschema, accessor=ArrayAccessor()), usenumpy=usenumpy)
+			params = [param for param in dict.fromkeys(store.table.params) if param.ptype != ParamType.int]
+			for param in params:
+				param.value = [0.0] * len(param.spec.parts) if param.spec.parts else 0.0
+			store.Capture('a')
+			for param in params:
+				param.value = [1.0] * len(param.spec.parts) if param.spec.parts else 1.0
+			store.Capture('b')
+			store.Recall('a')
+			for param in params[::100]:
+				param.value = [0.5] * len(param.spec.parts) if param.spec.parts else 0.5
+			return store
+		scenarios += [
+			_Scenario('preset_capture_' + suffix, lambda store: store.Capture(), setup=_SetupPresets, items=len(table)),
+			_Scenario('preset_recall_' + suffix, lambda store: store.Recall('a'), setup=_SetupPresets, items=len(table)),
+			_Scenario('preset_morph_' + suffix, lambda store: store.Morph('a', 'b', 0.5), setup=_SetupPresets, items=len(table)),
+		]
+
+	if OscAccessor is not None and sink is not None:
+		def _SetupSend(batch):
+			accessor = OscAccessor(sink.address[0], sink.address[1], batch=batch, flushinterval=None)
+			params = _CollectParams(AppModel(appschema, accessor=accessor))
+			return accessor, [(param, _SampleValue(param)) for param in params]
+		def _Send(args):
+			accessor, items = args
+			for param, value in items:
+				accessor.SetParam(param, value)
+			if accessor.batch:
+				accessor.Flush()
+		scenarios += [
+			_Scenario('osc_send', _Send, setup=lambda: _SetupSend(False), items=paramcount),
+			_Scenario('osc_send_batched', _Send, setup=lambda: _SetupSend(True), items=paramcount),
+		]
+	return scenarios
+
+def _RunScenario(scenario, repeat):
+	times = []
+	for _ in range(repeat):
+		arg = scenario.setup() if scenario.setup is not None else None
+		start = time.perf_counter()
+		scenario.run(arg)
+		times.append(time.perf_counter() - start)
+		del arg
+	result = {
+		'name': scenario.name,
+		'repeat': repeat,
+		'best': min(times),
+		'median': statistics.median(times),
+		'mean': statistics.mean(times),
+	}
+	if scenario.items:
+		result['items'] = scenario.items
+		result['bestPerItemUs'] = min(times) / scenario.items * 1e6
+	return result
+
+def RunSuite(shape, repeat=5, names=None, log=None):
+	"""Runs the scenarios whose names start with any of the specified names (or
+	all of them) on a schema generated with the specified shape, and returns
+	the results as a JSON-compatible dict."""
+	obj = GenerateSchemaObj(**shape)
+	sink = _UdpSink() if OscAccessor is not None else None
+	try:
+		scenarios = _BuildScenarios(obj, sink)
+		results = []
+		for scenario in scenarios:
+			if names and not any(scenario.name.startswith(name) for name in names):
+				continue
+			result = _RunScenario(scenario, repeat)
+			if log is not None:
+				log('%-36s best %10.6f s  median %10.6f s' % (result['name'], result['best'], result['median']))
+			results.append(result)
+	finally:
+		if sink is not None:
+			sink.Close()
+	return {
+		'python': platform.python_version(),
+		'implementation': platform.python_implementation(),
+		'platform': platform.platform(),
+		'shape': shape,
+		'params': CountParams(ReadAppFromObj(obj)),
+		'results': results,
+	}
+
+def main(args):
+	parser = argparse.ArgumentParser(prog='python -m benchmarks.suite')
+	parser.add_argument('--size', choices=sorted(Sizes), default='small')
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--output', help='file to write the JSON results to, instead of stdout')
+	parser.add_argument('names', nargs='*', help='prefixes of the scenarios to run')
+	options = parser.parse_args(args[1:])
+	log = lambda message: print(message, file=sys.stderr)
+	results = RunSuite(Sizes[options.size], repeat=options.repeat, names=options.names, log=log)
+	results['size'] = options.size
+	text = json.dumps(results, indent='  ', sort_keys=True)
+	if options.output:
+		with open(options.output, 'w') as f:
+			f.write(text + '\n')
+	else:
+		print(text)
+
+if __name__ == '__main__':
+	main(sys.argv)
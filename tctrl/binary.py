@@ -0,0 +1,578 @@
+from array import array
+from itertools import repeat
+import gc
+import struct
+import sys
+from tctrl.parsing import ReadAppFromObj, ParseException
+from tctrl.schema import *
+from tctrl.schema import _NodeListAttrs
+
+# A compact binary format for AppSchemas, laid out so that it can be loaded
+# with as little per-value Python code as possible.
+#
+# Nodes are stored in a table per class rather than as a tree, and each field
+# of a class is stored as a column with a value for every node in its table.
+# Most columns are packed arrays (strings as indices into a string table), so
+# loading a column is a single array conversion, and the values are assigned
+# to the nodes' slots with map(). Lists of child nodes are stored as the
+# number of children of each node, since the children of each field are laid
+# out contiguously in the child class's table in the order of their parents.
+#
+# The layout is:
+#   magic bytes and version
+#   the string table: a mode, the number of strings and then either the
+#     UTF-8 data of the strings separated by null characters, or the length
+#     of each string followed by the data if any string contains a null
+#   the class table: the number of classes, and for each one its name, the
+#     number of nodes and the names of its fields, so that files can still be
+#     read if fields are added or reordered
+#   the columns, in the same order as the classes and fields
+#
+# Counts, indices and other structural numbers are varints. Columns of ints,
+# floats and string indices are packed arrays, using the narrowest element
+# size that fits all of the values.
+
+_Magic = b'TCSB'
+_Version = 1
+
+# Classes in the order that their tables are filled, which guarantees that
+# all of the parents of a class's nodes have been added before its children.
+_NodeClasses = [
+	AppSchema,
+	ModuleSpec,
+	ModuleTypeSpec,
+	ParamSpec,
+	OptionList,
+	ParamPartSpec,
+	ParamOption,
+	ConnectionInfo,
+	GroupInfo,
+]
+
+_JoinedStrings = 0
+_SizedStrings = 1
+
+_NoneColumn = 0
+_StringColumn = 1
+_BoolColumn = 2
+_ParamTypeColumn = 3
+_IntColumn = 4
+_FloatColumn = 5
+_NodeListColumn = 6
+_ValueColumn = 7
+_ListColumn = 8
+_DictColumn = 9
+_MixedColumn = 10
+
+# Types of values which can be combined in a mixed column
+_MixedKinds = [str, bool, int, float, list, dict]
+
+_UnsignedTypes = [('B', 0xff), ('H', 0xffff), ('I', 0xffffffff), ('Q', 0xffffffffffffffff)]
+_SignedTypes = [('b', 0x7f), ('h', 0x7fff), ('i', 0x7fffffff), ('q', 0x7fffffffffffffff)]
+
+# Tags for values in generic columns
+_FalseTag = 0
+_TrueTag = 1
+_IntTag = 2
+_FloatTag = 3
+_StringTag = 4
+_ListTag = 5
+_DictTag = 6
+_NoneTag = 7
+
+_Double = struct.Struct('<d')
+_BigEndian = sys.byteorder == 'big'
+
+class BinaryFormatException(ParseException):
+	pass
+
+def WriteAppToBinary(appschema: AppSchema):
+	"""Serializes an AppSchema to bytes in the binary schema format.
+
+	The schema is first normalized through its JSON form, so reading the
+	result with ReadAppFromBinary produces a schema equal to the one that
+	ReadAppFromObj produces from the parsed output of ToJson."""
+	return _BinaryWriter(ReadAppFromObj(appschema._GetJsonDict())).GetBytes()
+
+def WriteAppToBinaryFile(appschema: AppSchema, filepath):
+	with open(filepath, 'wb') as f:
+		f.write(WriteAppToBinary(appschema))
+
+def ReadAppFromBinaryFile(filepath):
+	with open(filepath, 'rb') as f:
+		return ReadAppFromBinary(f.read())
+
+def WriteModulesToBinary(modules):
+	"""Serializes a list of ModuleSpecs to bytes in the binary schema format,
+	which ReadModulesFromBinary reads back.
+
+	Unlike WriteAppToBinary, the modules are written as they are rather than
+	being normalized through their JSON form, so this is meant for modules
+	that were just read by ReadModuleFromObj, such as when passing them
+	between processes."""
+	return _BinaryWriter(AppSchema('', children=modules)).GetBytes()
+
+def ReadModulesFromBinary(data):
+	"""Reads a list of ModuleSpecs from bytes produced by
+	WriteModulesToBinary."""
+	return ReadAppFromBinary(data).children
+
+def _WriteVarint(out, n):
+	while n >= 0x80:
+		out.append((n & 0x7f) | 0x80)
+		n >>= 7
+	out.append(n)
+
+def _WriteArray(out, typecode, values):
+	arr = array(typecode, values)
+	if _BigEndian:
+		arr.byteswap()
+	out += arr.tobytes()
+
+def _ChooseType(types, low, high):
+	for typecode, limit in types:
+		if low >= -limit - 1 and high <= limit:
+			return typecode
+	raise ValueError('Integer out of range for binary schema: %d' % max(-low, high))
+
+def _HasNodesOfClass(nodes, name, cls):
+	if name not in _NodeListAttrs:
+		return False
+	for node in nodes:
+		for item in getattr(node, name, None) or ():
+			return item._nodeclass is cls
+	return False
+
+class _BinaryWriter:
+	def __init__(self, appschema):
+		self.strings = {}
+		self.tables = {cls: [] for cls in _NodeClasses}
+		self.tables[AppSchema].append(appschema)
+		self.columns = bytearray()
+		self.fieldorders = {}
+		self._WriteTables()
+
+	def StringIndex(self, s):
+		index = self.strings.get(s)
+		if index is None:
+			index = self.strings[s] = len(self.strings)
+		return index
+
+	def _WriteTables(self):
+		done = set()
+		for cls in _NodeClasses:
+			table = self.tables[cls]
+			done.add(cls)
+			# lists of nodes of the same class (module children) add to the
+			# table, so they're written before the columns that need it to be
+			# complete
+			fields = self.fieldorders[cls] = sorted(
+				cls._fields,
+				key=lambda name: not _HasNodesOfClass(table, name, cls))
+			for name in fields:
+				column = [getattr(node, name, None) for node in table]
+				self._WriteColumn(cls, name, column, done)
+
+	def _WriteColumn(self, cls, name, column, done):
+		if name in _NodeListAttrs and any(column):
+			self._WriteNodeListColumn(cls, name, column, done)
+		else:
+			self._WriteValues(column)
+
+	def _WriteValues(self, column):
+		out = self.columns
+		present = [value for value in column if value is not None]
+		if not present:
+			out.append(_NoneColumn)
+			return
+		kinds = set(map(type, present))
+		if len(kinds) > 1:
+			if not kinds.issubset(_MixedKinds):
+				out.append(_ValueColumn)
+				for value in column:
+					self._WriteValue(value)
+				return
+			# a column of each type, and the type of each value
+			out.append(_MixedColumn)
+			kinds = sorted(kinds, key=_MixedKinds.index)
+			_WriteVarint(out, len(kinds))
+			for kind in kinds:
+				out.append(_MixedKinds.index(kind))
+			out += bytes(0 if value is None else _MixedKinds.index(type(value)) + 1 for value in column)
+			for kind in kinds:
+				self._WriteValues([value for value in present if type(value) is kind])
+			return
+		kind = kinds.pop()
+		if kind is str:
+			out.append(_StringColumn)
+			indices = [self.StringIndex(value) + 1 if value is not None else 0 for value in column]
+			typecode = _ChooseType(_UnsignedTypes, 0, max(indices))
+			out.append(ord(typecode))
+			_WriteArray(out, typecode, indices)
+		elif kind is bool:
+			out.append(_BoolColumn)
+			out += bytes(0 if value is None else value + 1 for value in column)
+		elif kind is ParamType:
+			out.append(_ParamTypeColumn)
+			out += bytes(0 if value is None else value.value for value in column)
+		elif kind is int and _SignedTypes[-1][1] >= max(present) and min(present) >= -_SignedTypes[-1][1] - 1:
+			out.append(_IntColumn)
+			typecode = _ChooseType(_SignedTypes, min(present), max(present))
+			self._WriteNumbers(column, present, typecode)
+		elif kind is float:
+			out.append(_FloatColumn)
+			typecode = 'f' if array('f', present).tolist() == present else 'd'
+			self._WriteNumbers(column, present, typecode)
+		elif kind is list:
+			# the number of items in each list and a column of all of the items
+			out.append(_ListColumn)
+			self._WriteCounts(column)
+			self._WriteValues([item for value in present for item in value])
+		elif kind is dict:
+			out.append(_DictColumn)
+			self._WriteCounts(column)
+			self._WriteValues([str(key) for value in present for key in value])
+			self._WriteValues([item for value in present for item in value.values()])
+		else:
+			out.append(_ValueColumn)
+			for value in column:
+				self._WriteValue(value)
+
+	def _WriteCounts(self, column):
+		# counts are stored as length + 1, so that 0 can mean None
+		out = self.columns
+		counts = [0 if value is None else len(value) + 1 for value in column]
+		typecode = _ChooseType(_UnsignedTypes, 0, max(counts))
+		out.append(ord(typecode))
+		_WriteArray(out, typecode, counts)
+
+	def _WriteNumbers(self, column, present, typecode):
+		out = self.columns
+		out.append(ord(typecode))
+		if len(present) == len(column):
+			out.append(0)
+		else:
+			out.append(1)
+			out += bytes(value is not None for value in column)
+		_WriteArray(out, typecode, present)
+
+	def _WriteNodeListColumn(self, cls, name, column, done):
+		out = self.columns
+		targets = {item._nodeclass for nodes in column if nodes for item in nodes}
+		if not targets:
+			# only empty lists, so they don't refer to any table
+			target = cls
+		elif len(targets) == 1:
+			target = targets.pop()
+		else:
+			raise ValueError('Mixed node types in %s.%s' % (cls.__name__, name))
+		if target in done and target is not cls:
+			raise ValueError('%s nodes are written before %s.%s' % (target.__name__, cls.__name__, name))
+		table = self.tables[target]
+		out.append(_NodeListColumn)
+		_WriteVarint(out, _NodeClasses.index(target))
+		_WriteVarint(out, len(table))
+		if target is cls:
+			# the table grows while its own nodes' children are added
+			column = []
+			i = 0
+			while i < len(table):
+				nodes = getattr(table[i], name, None)
+				column.append(nodes)
+				table.extend(nodes or ())
+				i += 1
+		else:
+			for nodes in column:
+				table.extend(nodes or ())
+		self._WriteCounts(column)
+
+	def _WriteValue(self, value):
+		out = self.columns
+		if value is None:
+			out.append(_NoneTag)
+		elif value is True:
+			out.append(_TrueTag)
+		elif value is False:
+			out.append(_FalseTag)
+		elif isinstance(value, str):
+			out.append(_StringTag)
+			_WriteVarint(out, self.StringIndex(value))
+		elif isinstance(value, int):
+			out.append(_IntTag)
+			_WriteVarint(out, value * 2 if value >= 0 else -value * 2 - 1)
+		elif isinstance(value, float):
+			out.append(_FloatTag)
+			out += _Double.pack(value)
+		elif isinstance(value, (list, tuple)):
+			out.append(_ListTag)
+			_WriteVarint(out, len(value))
+			for item in value:
+				self._WriteValue(item)
+		elif isinstance(value, dict):
+			out.append(_DictTag)
+			_WriteVarint(out, len(value))
+			for key, item in value.items():
+				_WriteVarint(out, self.StringIndex(str(key)))
+				self._WriteValue(item)
+		else:
+			raise TypeError('Unsupported value in binary schema: %r' % (value,))
+
+	def GetBytes(self):
+		for cls in _NodeClasses:
+			self.StringIndex(cls.__name__)
+			for name in cls._fields:
+				self.StringIndex(name)
+		out = bytearray(_Magic)
+		out.append(_Version)
+		strings = list(self.strings)
+		if any('\0' in s for s in strings):
+			out.append(_SizedStrings)
+			_WriteVarint(out, len(strings))
+			for s in strings:
+				_WriteVarint(out, len(s))
+			data = ''.join(strings).encode('utf-8', 'surrogatepass')
+		else:
+			out.append(_JoinedStrings)
+			_WriteVarint(out, len(strings))
+			data = '\0'.join(strings).encode('utf-8', 'surrogatepass')
+		_WriteVarint(out, len(data))
+		out += data
+		_WriteVarint(out, len(_NodeClasses))
+		for cls in _NodeClasses:
+			_WriteVarint(out, self.strings[cls.__name__])
+			_WriteVarint(out, len(self.tables[cls]))
+			fields = self.fieldorders[cls]
+			_WriteVarint(out, len(fields))
+			for name in fields:
+				_WriteVarint(out, self.strings[name])
+		out += self.columns
+		return bytes(out)
+
+def ReadAppFromBinary(data):
+	"""Reads an AppSchema from bytes produced by WriteAppToBinary."""
+	if data[:len(_Magic)] != _Magic:
+		raise BinaryFormatException('Not a binary schema')
+	if data[len(_Magic)] != _Version:
+		raise BinaryFormatException('Unsupported binary schema version: %d' % data[len(_Magic)])
+	# the nodes don't form reference cycles, so garbage collection (which
+	# would otherwise run repeatedly while millions of objects are created)
+	# is paused until they've all been loaded
+	gcenabled = gc.isenabled()
+	gc.disable()
+	try:
+		tables = _BinaryReader(data, len(_Magic) + 1).ReadTables()
+	except (IndexError, KeyError, ValueError, TypeError, struct.error) as e:
+		raise BinaryFormatException('Invalid binary schema: %s' % e) from None
+	finally:
+		if gcenabled:
+			gc.enable()
+	apps = tables.get(AppSchema)
+	if not apps or len(apps) != 1:
+		raise BinaryFormatException('Binary schema does not contain an app')
+	return apps[0]
+
+class _BinaryReader:
+	def __init__(self, data, pos):
+		self.data = data
+		self.pos = pos
+		self.strings = None
+
+	def ReadVarint(self):
+		data = self.data
+		pos = self.pos
+		b = data[pos]
+		pos += 1
+		n = b & 0x7f
+		shift = 7
+		while b & 0x80:
+			b = data[pos]
+			pos += 1
+			n |= (b & 0x7f) << shift
+			shift += 7
+		self.pos = pos
+		return n
+
+	def ReadByte(self):
+		b = self.data[self.pos]
+		self.pos += 1
+		return b
+
+	def ReadBytes(self, size):
+		start = self.pos
+		self.pos += size
+		if self.pos > len(self.data):
+			raise IndexError('Unexpected end of data')
+		return self.data[start:self.pos]
+
+	def ReadArray(self, typecode, count):
+		arr = array(typecode)
+		arr.frombytes(self.ReadBytes(arr.itemsize * count))
+		if _BigEndian:
+			arr.byteswap()
+		return arr
+
+	def ReadCounts(self, count):
+		return self.ReadArray(chr(self.ReadByte()), count)
+
+	def ReadSlices(self, items, start, count, counts=None):
+		if counts is None:
+			counts = self.ReadCounts(count)
+		lists = []
+		for n in counts:
+			if n:
+				end = start + n - 1
+				lists.append(items[start:end])
+				start = end
+			else:
+				lists.append(None)
+		return lists
+
+	def ReadStrings(self):
+		mode = self.ReadByte()
+		count = self.ReadVarint()
+		if mode == _SizedStrings:
+			lengths = [self.ReadVarint() for _ in range(count)]
+			text = self.ReadBytes(self.ReadVarint()).decode('utf-8', 'surrogatepass')
+			strings = []
+			start = 0
+			for length in lengths:
+				strings.append(text[start:start + length])
+				start += length
+		else:
+			text = self.ReadBytes(self.ReadVarint()).decode('utf-8', 'surrogatepass')
+			strings = text.split('\0') if count else []
+		if len(strings) != count:
+			raise ValueError('String table is the wrong size')
+		return strings
+
+	def ReadTables(self):
+		strings = self.strings = self.ReadStrings()
+		classesbyname = {cls.__name__: cls for cls in _NodeClasses}
+		classes = []
+		tables = {}
+		for _ in range(self.ReadVarint()):
+			cls = classesbyname[strings[self.ReadVarint()]]
+			count = self.ReadVarint()
+			fields = [strings[self.ReadVarint()] for _ in range(self.ReadVarint())]
+			tables[cls] = list(map(cls.__new__, repeat(cls, count)))
+			classes.append((cls, fields))
+		for cls, fields in classes:
+			nodes = tables[cls]
+			columns = {}
+			for name in fields:
+				columns[name] = self.ReadColumn(len(nodes), classes, tables)
+			# fields which weren't in the file are set to None
+			_GetFiller(cls)(nodes, *[
+				columns[name] if name in columns else repeat(None)
+				for name in cls._fields])
+		return tables
+
+	def ReadColumn(self, count, classes, tables):
+		kind = self.ReadByte()
+		if kind == _NoneColumn:
+			return repeat(None, count)
+		if kind == _StringColumn:
+			typecode = chr(self.ReadByte())
+			lookup = [None] + self.strings
+			return map(lookup.__getitem__, self.ReadArray(typecode, count))
+		if kind == _BoolColumn:
+			return map((None, False, True).__getitem__, self.ReadBytes(count))
+		if kind == _ParamTypeColumn:
+			return map(_ParamTypesByValue.__getitem__, self.ReadBytes(count))
+		if kind == _IntColumn or kind == _FloatColumn:
+			typecode = chr(self.ReadByte())
+			if not self.ReadByte():
+				return self.ReadArray(typecode, count).tolist()
+			presence = self.ReadBytes(count)
+			values = iter(self.ReadArray(typecode, count - presence.count(0)).tolist())
+			return [next(values) if p else None for p in presence]
+		if kind == _NodeListColumn:
+			target = tables[classes[self.ReadVarint()][0]]
+			start = self.ReadVarint()
+			return self.ReadSlices(target, start, count)
+		if kind == _ListColumn:
+			counts = self.ReadCounts(count)
+			items = list(self.ReadColumn(sum(counts) - count + counts.count(0), classes, tables))
+			return self.ReadSlices(items, 0, count, counts)
+		if kind == _DictColumn:
+			counts = self.ReadCounts(count)
+			total = sum(counts) - count + counts.count(0)
+			keys = list(self.ReadColumn(total, classes, tables))
+			values = list(self.ReadColumn(total, classes, tables))
+			if not total:
+				return [{} if n else None for n in counts]
+			dicts = []
+			start = 0
+			for n in counts:
+				if n:
+					end = start + n - 1
+					dicts.append(dict(zip(keys[start:end], values[start:end])))
+					start = end
+				else:
+					dicts.append(None)
+			return dicts
+		if kind == _MixedColumn:
+			kinds = [self.ReadByte() + 1 for _ in range(self.ReadVarint())]
+			rowkinds = self.ReadBytes(count)
+			columns = [iter([None] * rowkinds.count(0))] + [None] * len(_MixedKinds)
+			for k in kinds:
+				columns[k] = iter(list(self.ReadColumn(rowkinds.count(k), classes, tables)))
+			return [next(columns[k]) for k in rowkinds]
+		if kind == _ValueColumn:
+			return [self.ReadValue() for _ in range(count)]
+		raise ValueError('Unknown column type: %d' % kind)
+
+	def ReadValue(self):
+		tag = self.ReadByte()
+		if tag == _NoneTag:
+			return None
+		if tag == _TrueTag:
+			return True
+		if tag == _FalseTag:
+			return False
+		if tag == _StringTag:
+			return self.strings[self.ReadVarint()]
+		if tag == _IntTag:
+			n = self.ReadVarint()
+			return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+		if tag == _FloatTag:
+			value = _Double.unpack_from(self.data, self.pos)[0]
+			self.pos += 8
+			return value
+		if tag == _ListTag:
+			return [self.ReadValue() for _ in range(self.ReadVarint())]
+		if tag == _DictTag:
+			items = {}
+			for _ in range(self.ReadVarint()):
+				key = self.strings[self.ReadVarint()]
+				items[key] = self.ReadValue()
+			return items
+		raise ValueError('Unknown value tag: %d' % tag)
+
+_Fillers = {}
+
+def _GetFiller(cls):
+	"""Gets a function that assigns the fields of a class's nodes from one
+	column of values per field, in the order of the class's _fields.
+
+	The function is generated so that each field is a plain attribute
+	assignment in a single loop over the nodes, which is several times faster
+	than assigning each column through the slot descriptors."""
+	filler = _Fillers.get(cls)
+	if filler is None:
+		columns = ', '.join('c%d' % i for i in range(len(cls._fields)))
+		values = ', '.join('v%d' % i for i in range(len(cls._fields)))
+		lines = ['def _Fill(nodes, %s):' % columns]
+		if cls._fields:
+			lines.append('\tfor node, %s in zip(nodes, %s):' % (values, columns))
+			lines += ['\t\tnode.%s = v%d' % (name, i) for i, name in enumerate(cls._fields)]
+		else:
+			lines.append('\tpass')
+		namespace = {}
+		exec('\n'.join(lines), namespace)
+		filler = _Fillers[cls] = namespace['_Fill']
+	return filler
+
+_ParamTypesByValue = [None] * (max(t.value for t in ParamType) + 1)
+for _t in ParamType:
+	_ParamTypesByValue[_t.value] = _t
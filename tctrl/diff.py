@@ -0,0 +1,287 @@
+import copy
+import json
+from tctrl.parsing import ReadModuleFromObj, ReadModuleTypeFromObj, ReadOptionListFromObj, ReadParamFromObj, ReadGroupInfoFromObj, ReadConnectionFromObj
+from tctrl.schema import *
+from tctrl.util import GetByKey
+
+class PatchException(Exception):
+	pass
+
+# Fields which hold child nodes that are diffed separately rather than being
+# compared as values
+_ChildListAttrs = {
+	'app': ('children', 'optionlists', 'moduletypes'),
+	'module': ('children', 'params'),
+	'moduletype': ('params',),
+	'param': (),
+	'optionlist': (),
+}
+
+class SchemaPatch:
+	"""A set of changes that turns one AppSchema into another, produced by
+	DiffSchemas and applied with ApplyPatch.
+
+	The patch is a list of operations, each of which is a dict in JSON form.
+	Every operation has an 'op' ('add', 'remove', 'change', 'reorder' or
+	'replace') and a 'type' ('app', 'module', 'param', 'optionlist' or
+	'moduletype'). Modules are located by the list of keys of their parent
+	modules in 'parent', and params by the list of keys of their module in
+	'module' or by the key of their module type in 'moduleType'. Other fields
+	depend on the operation:
+		add: 'index' in the final list and the JSON of the new node in 'value'
+		remove: the 'key' of the node
+		change: the 'key' of the node (except for the app) and a dict of the
+			changed JSON fields in 'fields', where removed fields are null
+		reorder: the final order of the 'keys' in the list
+		replace: the JSON of all of the nodes in the list in 'value', which is
+			used instead of matching by key when keys are duplicated"""
+
+	def __init__(self, ops=None):
+		self.ops = ops or []
+
+	def __bool__(self):
+		return bool(self.ops)
+
+	def __len__(self):
+		return len(self.ops)
+
+	def __eq__(self, other):
+		return isinstance(other, SchemaPatch) and self.ops == other.ops
+
+	def __repr__(self):
+		return 'SchemaPatch(%r)' % self.ops
+
+	@property
+	def JsonDict(self):
+		return {'ops': self.ops}
+
+	def ToJson(self, **kwargs):
+		dumpargs = {'sort_keys': True}
+		dumpargs.update(kwargs)
+		return json.dumps(self.JsonDict, **dumpargs)
+
+def ReadPatchFromObj(obj):
+	if not isinstance(obj, dict) or not isinstance(obj.get('ops'), list):
+		raise PatchException('Invalid schema patch: %r' % obj)
+	return SchemaPatch(obj['ops'])
+
+def DiffSchemas(old: AppSchema, new: AppSchema):
+	"""Builds a SchemaPatch of the differences between two AppSchemas, matching
+	modules, params, option lists and module types by key within their
+	parents. Subtrees with the same Fingerprint are skipped without being
+	visited, so after the first diff (which computes the fingerprints) the
+	time taken mostly depends on how much has changed."""
+	ops = []
+	if old.Fingerprint() == new.Fingerprint():
+		return SchemaPatch(ops)
+	_DiffFields(ops, 'app', {}, old, new)
+	for o, n in _DiffNodeLists(ops, 'optionlist', {}, old.optionlists, new.optionlists):
+		_DiffFields(ops, 'optionlist', {'key': n.key}, o, n)
+	for o, n in _DiffNodeLists(ops, 'moduletype', {}, old.moduletypes, new.moduletypes):
+		_DiffFields(ops, 'moduletype', {'key': n.key}, o, n)
+		_DiffParams(ops, {'moduleType': n.key}, o, n)
+	stack = [([], old.children, new.children)]
+	while stack:
+		parentkeys, oldchildren, newchildren = stack.pop()
+		changed = _DiffNodeLists(ops, 'module', {'parent': parentkeys}, oldchildren, newchildren)
+		for o, n in reversed(changed):
+			_DiffFields(ops, 'module', {'parent': parentkeys, 'key': n.key}, o, n)
+			keys = parentkeys + [n.key]
+			_DiffParams(ops, {'module': keys}, o, n)
+			stack.append((keys, o.children, n.children))
+	return SchemaPatch(ops)
+
+def _DiffParams(ops, location, old, new):
+	for o, n in _DiffNodeLists(ops, 'param', location, old.params, new.params):
+		_DiffFields(ops, 'param', dict(location, key=n.key), o, n)
+
+def _Op(op, kind, location, **fields):
+	result = {'op': op, 'type': kind}
+	result.update(location)
+	result.update(fields)
+	return result
+
+def _DiffNodeLists(ops, kind, location, oldnodes, newnodes):
+	"""Adds operations for nodes added to, removed from or moved within a
+	list, and returns (old, new) pairs of matching nodes whose contents
+	differ."""
+	oldnodes = oldnodes or []
+	newnodes = newnodes or []
+	oldbykey = {n.key: n for n in oldnodes}
+	newbykey = {n.key: n for n in newnodes}
+	if len(oldbykey) != len(oldnodes) or len(newbykey) != len(newnodes):
+		if len(oldnodes) != len(newnodes) or any(o.Fingerprint() != n.Fingerprint() for o, n in zip(oldnodes, newnodes)):
+			ops.append(_Op('replace', kind, location, value=[n.JsonDict for n in newnodes]))
+		return []
+	for node in oldnodes:
+		if node.key not in newbykey:
+			ops.append(_Op('remove', kind, location, key=node.key))
+	oldorder = [n.key for n in oldnodes if n.key in newbykey]
+	neworder = [n.key for n in newnodes if n.key in oldbykey]
+	if oldorder != neworder:
+		ops.append(_Op('reorder', kind, location, keys=[n.key for n in newnodes]))
+	changed = []
+	for i, node in enumerate(newnodes):
+		oldnode = oldbykey.get(node.key)
+		if oldnode is None:
+			ops.append(_Op('add', kind, location, index=i, value=node.JsonDict))
+		elif oldnode is not node and oldnode.Fingerprint() != node.Fingerprint():
+			changed.append((oldnode, node))
+	return changed
+
+def _FieldsJson(node, kind):
+	"""Gets the JSON of a node without its child lists. Nodes with child lists
+	are shallow copied so that the JSON of the children isn't built."""
+	listattrs = _ChildListAttrs[kind]
+	if not listattrs:
+		return node.JsonDict or {}
+	shallow = copy.copy(node)
+	for name in listattrs:
+		setattr(shallow, name, None)
+	return shallow._BuildJsonDict() or {}
+
+def _DiffFields(ops, kind, location, old, new):
+	olddict = _FieldsJson(old, kind)
+	newdict = _FieldsJson(new, kind)
+	fields = {}
+	for name in olddict.keys() | newdict.keys():
+		if name == 'key':
+			continue
+		value = newdict.get(name)
+		if olddict.get(name) != value:
+			fields[name] = value
+	if fields:
+		ops.append(_Op('change', kind, location, fields=fields))
+
+def ApplyPatch(appschema: AppSchema, patch: SchemaPatch):
+	"""Applies a SchemaPatch to an AppSchema in place. Nodes which aren't
+	added or removed keep their identity, and the patched schema serializes
+	to the same JSON as the schema that the patch was built from."""
+	for op in patch.ops:
+		action = op.get('op')
+		kind = op.get('type')
+		if kind == 'app':
+			if action != 'change':
+				raise PatchException('Unsupported operation for app: %r' % op)
+			_ApplyFields(appschema, kind, op['fields'])
+			continue
+		owner, attrname = _FindList(appschema, op)
+		nodes = getattr(owner, attrname, None)
+		if nodes is None:
+			setattr(owner, attrname, [])
+			nodes = getattr(owner, attrname)
+		if action == 'add':
+			nodes.insert(op['index'], _ReadNode(kind, op['value']))
+		elif action == 'remove':
+			nodes.remove(_GetNode(nodes, op))
+		elif action == 'change':
+			_ApplyFields(_GetNode(nodes, op), kind, op['fields'])
+		elif action == 'reorder':
+			positions = {key: i for i, key in enumerate(op['keys'])}
+			nodes.sort(key=lambda n: positions.get(n.key, len(positions)))
+		elif action == 'replace':
+			setattr(owner, attrname, [_ReadNode(kind, obj) for obj in op['value']])
+		else:
+			raise PatchException('Unsupported patch operation: %r' % op)
+
+def _FindList(appschema, op):
+	kind = op['type']
+	if kind == 'optionlist':
+		return appschema, 'optionlists'
+	if kind == 'moduletype':
+		return appschema, 'moduletypes'
+	if kind == 'module':
+		return _FindModule(appschema, op['parent'], op), 'children'
+	if kind == 'param':
+		if 'moduleType' in op:
+			modtype = GetByKey(appschema.moduletypes, op['moduleType'])
+			if modtype is None:
+				raise PatchException('Module type not found for patch operation: %r' % op)
+			return modtype, 'params'
+		return _FindModule(appschema, op['module'], op), 'params'
+	raise PatchException('Unsupported patch node type: %r' % op)
+
+def _FindModule(appschema, keys, op):
+	node = appschema
+	for key in keys:
+		node = node.GetChild(key)
+		if node is None:
+			raise PatchException('Module not found for patch operation: %r' % op)
+	return node
+
+def _GetNode(nodes, op):
+	node = GetByKey(nodes, op['key'])
+	if node is None:
+		raise PatchException('Node not found for patch operation: %r' % op)
+	return node
+
+def _ApplyFields(node, kind, fields):
+	# The changed fields are merged into the node's JSON and read as a new
+	# node, whose fields are then copied onto the existing node (apart from
+	# its child lists, which are patched separately).
+	obj = dict(_FieldsJson(node, kind))
+	for name, value in fields.items():
+		if value is None:
+			obj.pop(name, None)
+		else:
+			obj[name] = value
+	if kind == 'app':
+		source = _ReadApp(obj)
+		skipattrs = _ChildListAttrs[kind] + ('indexpaths',)
+	else:
+		source = _ReadNode(kind, obj)
+		skipattrs = _ChildListAttrs[kind]
+	for name in node._fields:
+		if name not in skipattrs:
+			setattr(node, name, getattr(source, name, None))
+
+# The readers in tctrl.parsing derive paths from keys and treat the param
+# type as the other type when there isn't one, so those fields are restored
+# from the JSON to reproduce the original nodes.
+
+def _ReadNode(kind, obj):
+	if kind == 'module':
+		node = ReadModuleFromObj(obj)
+		_RestoreModule(node, obj)
+	elif kind == 'param':
+		node = ReadParamFromObj(obj)
+		_RestoreParam(node, obj)
+	elif kind == 'moduletype':
+		node = ReadModuleTypeFromObj(obj)
+		for param, paramobj in zip(node.params or [], obj.get('params') or []):
+			_RestoreParam(param, paramobj)
+	elif kind == 'optionlist':
+		node = ReadOptionListFromObj(obj)
+	else:
+		raise PatchException('Unsupported patch node type: %r' % kind)
+	return node
+
+def _RestoreModule(module, obj):
+	stack = [(module, obj)]
+	while stack:
+		module, obj = stack.pop()
+		module.path = obj.get('path')
+		for param, paramobj in zip(module.params or [], obj.get('params') or []):
+			_RestoreParam(param, paramobj)
+		stack.extend(zip(module.children or [], obj.get('children') or []))
+
+def _RestoreParam(param, obj):
+	param.path = obj.get('path')
+	param.othertype = obj.get('otherType')
+	for part, partobj in zip(param.parts or [], obj.get('parts') or []):
+		part.path = partobj.get('path')
+
+def _ReadApp(obj):
+	groupobjs = obj.get('childGroups')
+	connobjs = obj.get('connections')
+	app = AppSchema(
+		obj['key'],
+		label=obj.get('label'),
+		tags=obj.get('tags'),
+		description=obj.get('description'),
+		childgroups=[ReadGroupInfoFromObj(o) for o in groupobjs] if groupobjs else None,
+		connections=[ReadConnectionFromObj(o) for o in connobjs] if connobjs else None,
+	)
+	if 'path' in obj:
+		app.path = obj['path']
+	return app
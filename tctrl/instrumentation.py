@@ -0,0 +1,234 @@
+import threading
+import time
+
+# Latencies are counted in buckets whose upper bounds are powers of two
+# microseconds, from 1us up to about 35 minutes.
+_BucketCount = 32
+
+class LatencyHistogram:
+	"""Counts durations in power-of-two microsecond buckets, along with their
+	total and maximum, so that percentiles can be estimated without keeping
+	every sample."""
+
+	__slots__ = ('count', 'total', 'max', 'buckets')
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+		self.buckets = [0] * _BucketCount
+
+	def Add(self, seconds):
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+		self.buckets[min(int(seconds * 1e6).bit_length(), _BucketCount - 1)] += 1
+
+	def Percentile(self, fraction):
+		"""Gets the upper bound (in seconds) of the bucket that contains the
+		specified fraction of the durations, or None if there aren't any."""
+		if not self.count:
+			return None
+		target = fraction * self.count
+		seen = 0
+		for i, n in enumerate(self.buckets):
+			seen += n
+			if seen >= target:
+				return min((1 << i) / 1e6, self.max)
+		return self.max
+
+	@property
+	def JsonDict(self):
+		return {
+			'count': self.count,
+			'totalSeconds': self.total,
+			'meanSeconds': self.total / self.count if self.count else None,
+			'maxSeconds': self.max,
+			'p50Seconds': self.Percentile(0.5),
+			'p99Seconds': self.Percentile(0.99),
+			# [upper bound in microseconds, count] for each non-empty bucket
+			'buckets': [[1 << i, n] for i, n in enumerate(self.buckets) if n],
+		}
+
+class _LatencyBreakdown:
+	"""Latencies in total, by parameter type and by module path."""
+
+	def __init__(self):
+		self.total = LatencyHistogram()
+		self.bytype = {}
+		self.bymodule = {}
+		self.bytes = 0
+
+	def Add(self, ptypename, modulepath, seconds):
+		self.total.Add(seconds)
+		hist = self.bytype.get(ptypename)
+		if hist is None:
+			hist = self.bytype[ptypename] = LatencyHistogram()
+		hist.Add(seconds)
+		hist = self.bymodule.get(modulepath)
+		if hist is None:
+			hist = self.bymodule[modulepath] = LatencyHistogram()
+		hist.Add(seconds)
+
+	@property
+	def JsonDict(self):
+		return {
+			'total': self.total.JsonDict,
+			'byType': {name: hist.JsonDict for name, hist in self.bytype.items()},
+			'byModule': {path: hist.JsonDict for path, hist in self.bymodule.items()},
+		}
+
+def _ParamKeys(param):
+	ptype = getattr(param, 'ptype', None)
+	parent = getattr(param, 'parent', None)
+	return (
+		ptype.name if ptype is not None else 'other',
+		parent.path if parent is not None else None)
+
+class Instrumentation:
+	"""Collects timings for ProcessAppSchema stages, Accessor.SetParam calls
+	and OSC sends.
+
+	Sends are timed and counted per datagram, as it goes to the socket (or
+	the asyncio transport), so a batched bundle is recorded once, under the
+	'bundle' type, with the size of the whole bundle.
+
+	If a profilehook is specified, it's called with (kind, name, seconds)
+	after each timing is recorded, where kind is 'stage', 'setParam' or
+	'send' and name is the stage name or the parameter's path (None for
+	bundles). It's called on whichever thread recorded the timing, so it
+	should return quickly."""
+
+	def __init__(self, profilehook=None):
+		self.profilehook = profilehook
+		self._lock = threading.Lock()
+		self.Reset()
+
+	def Reset(self):
+		with self._lock:
+			self.stages = {}
+			self.setparams = _LatencyBreakdown()
+			self.sends = _LatencyBreakdown()
+
+	def RecordStage(self, name, seconds):
+		with self._lock:
+			hist = self.stages.get(name)
+			if hist is None:
+				hist = self.stages[name] = LatencyHistogram()
+			hist.Add(seconds)
+		if self.profilehook is not None:
+			self.profilehook('stage', name, seconds)
+
+	def RecordSetParam(self, param, seconds):
+		ptypename, modulepath = _ParamKeys(param)
+		with self._lock:
+			self.setparams.Add(ptypename, modulepath, seconds)
+		if self.profilehook is not None:
+			self.profilehook('setParam', param.path, seconds)
+
+	def RecordSend(self, param, path, size, seconds):
+		if param is not None:
+			ptypename, modulepath = _ParamKeys(param)
+		elif path is None:
+			ptypename, modulepath = 'bundle', None
+		else:
+			ptypename, modulepath = 'other', path.rpartition('/')[0]
+		with self._lock:
+			self.sends.Add(ptypename, modulepath, seconds)
+			self.sends.bytes += size
+		if self.profilehook is not None:
+			self.profilehook('send', path, seconds)
+
+	def GetStats(self):
+		"""Gets a snapshot of the collected timings as a JSON-compatible
+		dict."""
+		with self._lock:
+			sends = self.sends.JsonDict
+			sends['bytes'] = self.sends.bytes
+			return {
+				'stages': {name: hist.JsonDict for name, hist in self.stages.items()},
+				'setParam': self.setparams.JsonDict,
+				'send': sends,
+			}
+
+_active = None
+
+def EnableInstrumentation(profilehook=None):
+	"""Enables the global Instrumentation (creating it if needed), which
+	ProcessAppSchema records its stage timings to, and which accessors are
+	instrumented with by default. Returns the Instrumentation."""
+	global _active
+	if _active is None:
+		_active = Instrumentation(profilehook=profilehook)
+	elif profilehook is not None:
+		_active.profilehook = profilehook
+	return _active
+
+def DisableInstrumentation():
+	"""Disables the global Instrumentation. Accessors that were instrumented
+	keep recording to it until UninstrumentAccessor is called."""
+	global _active
+	_active = None
+
+def GetActiveInstrumentation():
+	return _active
+
+def GetStats():
+	"""Gets the stats of the global Instrumentation, or None if it isn't
+	enabled."""
+	return _active.GetStats() if _active is not None else None
+
+def ResetStats():
+	if _active is not None:
+		_active.Reset()
+
+# Accessors are instrumented by switching them to a subclass which wraps the
+# methods that are timed, in the same way that schema nodes are switched to
+# their tracked classes, so accessors that aren't instrumented have no
+# overhead at all.
+_InstrumentedClasses = {}
+
+def InstrumentAccessor(accessor, instrumentation: Instrumentation=None):
+	"""Records the timings of the accessor's SetParam calls and OSC sends to
+	the specified Instrumentation, or to the global one (which is enabled if
+	needed)."""
+	if instrumentation is None:
+		instrumentation = EnableInstrumentation()
+	cls = accessor.__class__
+	base = cls.__dict__.get('_uninstrumentedclass', cls)
+	instrumented = _InstrumentedClasses.get(base)
+	if instrumented is None:
+		attrs = {
+			'__module__': base.__module__,
+			'__qualname__': base.__qualname__,
+			'_uninstrumentedclass': base,
+			'SetParam': _InstrumentedSetParam,
+		}
+		if hasattr(base, '_SendDatagram'):
+			attrs['_SendDatagram'] = _InstrumentedSendDatagram
+		instrumented = _InstrumentedClasses[base] = type(base.__name__, (base,), attrs)
+	accessor._instrumentation = instrumentation
+	accessor._instrumentedparams = {}
+	accessor.__class__ = instrumented
+
+def UninstrumentAccessor(accessor):
+	base = accessor.__class__.__dict__.get('_uninstrumentedclass')
+	if base is not None:
+		accessor.__class__ = base
+		del accessor._instrumentation
+		del accessor._instrumentedparams
+
+def _InstrumentedSetParam(self, param, value):
+	# sends only have the path, so they look up the param through this
+	self._instrumentedparams[param.path] = param
+	start = time.perf_counter()
+	result = self._uninstrumentedclass.SetParam(self, param, value)
+	self._instrumentation.RecordSetParam(param, time.perf_counter() - start)
+	return result
+
+def _InstrumentedSendDatagram(self, dgram, path=None):
+	start = time.perf_counter()
+	self._uninstrumentedclass._SendDatagram(self, dgram, path)
+	self._instrumentation.RecordSend(
+		self._instrumentedparams.get(path), path, len(dgram), time.perf_counter() - start)
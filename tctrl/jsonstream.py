@@ -0,0 +1,135 @@
+import codecs
+import json.decoder
+import re
+
+_Whitespace = re.compile(r'[ \t\n\r]*')
+_Number = re.compile(r'-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?')
+_Literals = {'true': True, 'false': False, 'null': None}
+_Punctuation = frozenset('{}[],:')
+
+# The longest escape sequence in a JSON string (\uXXXX), used to tell whether
+# a bad escape might just be cut off at the end of the buffer.
+_MaxEscapeLength = 6
+
+StringToken = 's'
+ValueToken = 'v'
+
+class JsonSyntaxError(ValueError):
+	def __init__(self, message, offset):
+		super().__init__(message)
+		self.offset = offset
+
+class JsonTokenizer:
+	"""Splits JSON text read incrementally from a stream into tokens, without
+	ever holding more than a chunk or two of the text in memory.
+
+	Iterating yields (token, value, offset) tuples, where token is one of the
+	punctuation characters '{}[],:', StringToken for a string (which may be
+	either a key or a value) or ValueToken for a number, boolean or null.
+	Offsets are character offsets from the start of the stream, which
+	Position() converts to line and column numbers."""
+
+	def __init__(self, stream, chunksize=65536):
+		self.stream = stream
+		self.chunksize = chunksize
+		self._decoder = None
+		self._buffer = ''
+		self._bufferoffset = 0
+		self._eof = False
+		self._linesbefore = 0
+		self._lastnewline = -1
+
+	def _Read(self):
+		chunk = self.stream.read(self.chunksize)
+		if not isinstance(chunk, bytes):
+			return chunk
+		if self._decoder is None:
+			self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+		text = self._decoder.decode(chunk, final=not chunk)
+		while not text and chunk:
+			# only part of a multi-byte character was read
+			chunk = self.stream.read(self.chunksize)
+			text = self._decoder.decode(chunk, final=not chunk)
+		return text
+
+	def _Fill(self, pos):
+		"""Discards the text before pos and reads another chunk. Returns False
+		if the stream has already been read to the end."""
+		if self._eof:
+			return False
+		buf = self._buffer
+		if pos:
+			self._linesbefore += buf.count('\n', 0, pos)
+			newline = buf.rfind('\n', 0, pos)
+			if newline >= 0:
+				self._lastnewline = self._bufferoffset + newline
+			self._bufferoffset += pos
+			buf = buf[pos:]
+		chunk = self._Read()
+		if not chunk:
+			self._eof = True
+		self._buffer = buf + chunk
+		return True
+
+	def Position(self, offset):
+		"""Gets the (line, column) of an offset, both starting from 1. The
+		offset must not be before the text that is currently buffered."""
+		rel = max(0, min(offset - self._bufferoffset, len(self._buffer)))
+		line = self._linesbefore + self._buffer.count('\n', 0, rel) + 1
+		newline = self._buffer.rfind('\n', 0, rel)
+		if newline >= 0:
+			newline += self._bufferoffset
+		else:
+			newline = self._lastnewline
+		return line, offset - newline
+
+	def __iter__(self):
+		pos = 0
+		while True:
+			buf = self._buffer
+			pos = _Whitespace.match(buf, pos).end()
+			if pos >= len(buf):
+				if self._Fill(pos):
+					pos = 0
+					continue
+				return
+			offset = self._bufferoffset + pos
+			c = buf[pos]
+			if c in _Punctuation:
+				pos += 1
+				yield c, None, offset
+			elif c == '"':
+				try:
+					value, end = json.decoder.scanstring(buf, pos + 1)
+				except json.decoder.JSONDecodeError as e:
+					incomplete = e.msg.startswith('Unterminated') or e.pos >= len(buf) - _MaxEscapeLength
+					if incomplete and self._Fill(pos):
+						pos = 0
+						continue
+					raise JsonSyntaxError(e.msg, self._bufferoffset + e.pos)
+				pos = end
+				yield StringToken, value, offset
+			else:
+				match = _Number.match(buf, pos)
+				if match:
+					end = match.end()
+					# the number may continue past the end of the buffer, possibly
+					# after a '.', 'e' or 'e-' which didn't match on their own
+					if len(buf) - end < 3 and self._Fill(pos):
+						pos = 0
+						continue
+					text = match.group()
+					value = float(text) if match.group(1) or match.group(2) else int(text)
+					pos = end
+					yield ValueToken, value, offset
+					continue
+				for literal, value in _Literals.items():
+					if buf.startswith(literal, pos):
+						pos += len(literal)
+						break
+				else:
+					if len(buf) - pos < 5 and self._Fill(pos):
+						pos = 0
+						continue
+					raise JsonSyntaxError('Unexpected character %r' % c, offset)
+				yield ValueToken, value, offset
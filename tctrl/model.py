@@ -1,15 +1,142 @@
+from array import array
+from collections.abc import Mapping
 from tctrl.schema import *
 
 class Accessor:
 	def __init__(self):
 		self.paramVals = {}
 
+	def AddParam(self, param):
+		"""Called by the AppModel for each ParamModel once it has been assigned
+		a slot."""
+		pass
+
 	def SetParam(self, param, value):
+		self.UpdateParam(param, value)
+
+	def UpdateParam(self, param, value):
+		"""Stores a value without sending it anywhere, for values that were
+		received from the target app. SetParam uses this to store values, so
+		Accessors that only change how values are stored should override this
+		rather than SetParam."""
 		self.paramVals[param.path] = value
 
 	def GetParam(self, param):
 		return self.paramVals.get(param.path)
 
+	def SetMany(self, items):
+		"""Sets the values for a sequence of (param, value) pairs."""
+		for param, value in items:
+			self.SetParam(param, value)
+
+# Storage kinds for ArrayAccessor slots
+_OtherSlot = 0
+_FloatSlot = 1
+_IntSlot = 2
+_BoolSlot = 3
+
+_SlotKinds = {
+	ParamType.float: _FloatSlot,
+	ParamType.int: _IntSlot,
+	ParamType.bool: _BoolSlot,
+}
+
+class ArrayAccessor(Accessor):
+	"""An Accessor which stores values by the slot numbers that the AppModel
+	assigns to its ParamModels, rather than by path.
+	
+	Values of float, int and bool parameters are stored in a contiguous
+	array('d') buffer (which can be wrapped with numpy.frombuffer() without
+	copying), and all other values are stored in a dict keyed by slot. That
+	includes the values of ivec and fvec parameters, which are stored as the
+	lists that they were set to, since the number of parts isn't fixed by
+	every schema. RangeTable reads their parts from the dict.
+	
+	Since int values are stored as doubles, they are only exact up to 2**53
+	in magnitude. The paramVals dict of the base Accessor isn't used (it
+	stays empty), so values should be read with GetParam or GetAll.
+	
+	This only handles storage, so it can be combined with another Accessor
+	that sends values, for example:
+		class ArrayOscAccessor(OscAccessor, ArrayAccessor): pass"""
+	
+	def __init__(self):
+		super().__init__()
+		self.params = []
+		self.numericvals = array('d')
+		self._isset = bytearray()
+		self._kinds = bytearray()
+		self._othervals = {}
+
+	def AddParam(self, param):
+		super().AddParam(param)
+		slot = param.slot
+		if slot >= len(self.params):
+			count = slot + 1 - len(self.params)
+			self.params.extend([None] * count)
+			self.numericvals.extend([0.0] * count)
+			self._isset.extend(bytes(count))
+			self._kinds.extend(bytes(count))
+		self.params[slot] = param
+		self._kinds[slot] = _SlotKinds.get(param.ptype, _OtherSlot)
+
+	def UpdateParam(self, param, value):
+		self._Store(param.slot, value)
+
+	def GetParam(self, param):
+		return self._Load(param.slot)
+
+	def GetAll(self):
+		"""Gets a list of the values of all params, indexed by slot."""
+		return [self._Load(slot) for slot in range(len(self.params))]
+
+	def Snapshot(self):
+		"""Captures the current values of all params. The numeric buffer is
+		copied as a block, so this is cheap even for large models."""
+		return AccessorSnapshot(
+			array('d', self.numericvals),
+			bytes(self._isset),
+			dict(self._othervals))
+
+	def Restore(self, snapshot: 'AccessorSnapshot'):
+		"""Replaces the stored values with those of a snapshot taken from this
+		accessor. This only updates the stored values, without calling
+		SetParam."""
+		count = len(snapshot.numericvals)
+		self.numericvals[:count] = snapshot.numericvals
+		self._isset[:count] = snapshot.isset
+		self._othervals = dict(snapshot.othervals)
+
+	def _Store(self, slot, value):
+		if self._kinds[slot] == _OtherSlot:
+			self._othervals[slot] = value
+		elif value is None:
+			self._isset[slot] = 0
+		else:
+			self.numericvals[slot] = value
+			self._isset[slot] = 1
+
+	def _Load(self, slot):
+		kind = self._kinds[slot]
+		if kind == _OtherSlot:
+			return self._othervals.get(slot)
+		if not self._isset[slot]:
+			return None
+		value = self.numericvals[slot]
+		if kind == _IntSlot:
+			return int(value)
+		if kind == _BoolSlot:
+			return bool(value)
+		return value
+
+class AccessorSnapshot:
+	"""A copy of the values stored in an ArrayAccessor."""
+	
+	def __init__(self, numericvals, isset, othervals):
+		self.numericvals = numericvals
+		self.isset = isset
+		self.othervals = othervals
+
 class ModelNode:
 	def __init__(self, key, path):
 		self.key = key
@@ -29,6 +156,9 @@ class ParamModel(ModelNode):
 		self.parent = parent
 		self.label = spec.label
 		self.ptype = spec.ptype
+		self.oscencoder = None
+		self.slot = None
+		self.app.AddParam(self)
 
 	@property
 	def value(self):
@@ -43,6 +173,39 @@ def _MapByKey(nodes):
 	return {n.key: n for n in nodes} if nodes else {}
 
 
+class _LazyNodeMap(Mapping):
+	"""A read-only mapping of keys to model nodes, which creates each node from
+	its spec the first time that it's accessed. As with _MapByKey, if several
+	specs have the same key, the last one is used."""
+	
+	def __init__(self, specs, factory):
+		self._specs = specs
+		self._factory = factory
+		self._specsbykey = None
+		self._nodes = {}
+
+	def _GetSpecsByKey(self):
+		if self._specsbykey is None:
+			self._specsbykey = _MapByKey(self._specs)
+			self._specs = None
+		return self._specsbykey
+
+	def __getitem__(self, key):
+		node = self._nodes.get(key)
+		if node is None:
+			node = self._nodes[key] = self._factory(self._GetSpecsByKey()[key])
+		return node
+
+	def __contains__(self, key):
+		return key in self._GetSpecsByKey()
+
+	def __iter__(self):
+		return iter(self._GetSpecsByKey())
+
+	def __len__(self):
+		return len(self._GetSpecsByKey())
+
+
 class ModuleModel(ModelNode):
 	def __init__(
 			self,
@@ -55,8 +218,18 @@ class ModuleModel(ModelNode):
 		self.app = app
 		self.spec = spec
 		self.parent = parent
-		self.children = _MapByKey([ModuleModel(app=app, spec=spec, parent=self) for spec in spec.children] if spec.children else None)
-		self.params = _MapByKey([ParamModel(spec=spec, parent=self) for spec in spec.params] if spec.params else None)
+		if app.lazy:
+			self.children = _LazyNodeMap(spec.children, self._CreateChild)
+			self.params = _LazyNodeMap(spec.params, self._CreateParam)
+		else:
+			self.children = _MapByKey([self._CreateChild(spec) for spec in spec.children] if spec.children else None)
+			self.params = _MapByKey([self._CreateParam(spec) for spec in spec.params] if spec.params else None)
+
+	def _CreateChild(self, spec: ModuleSpec):
+		return ModuleModel(app=self.app, spec=spec, parent=self)
+
+	def _CreateParam(self, spec: ParamSpec):
+		return ParamModel(spec=spec, parent=self)
 
 	@property
 	def label(self):
@@ -64,8 +237,45 @@ class ModuleModel(ModelNode):
 
 
 class AppModel(ModelNode):
-	def __init__(self, spec, accessor=None):
+	"""The root of a model of an application, built from an AppSchema.
+	
+	By default the whole tree of ModuleModels and ParamModels is built up
+	front. If lazy is True, the children and params of each module are instead
+	mappings that create each node the first time it's accessed, so only the
+	parts of the schema that are actually used get model nodes. In that case,
+	ParamModels are assigned slots in the order that they are created."""
+	
+	def __init__(self, spec, accessor=None, lazy=False):
 		super().__init__(spec.key, '/%s' % spec.key)
 		self.app = self
+		self.spec = spec
 		self.accessor = accessor or Accessor()
-		self.children = _MapByKey([ModuleModel(app=self, spec=spec) for spec in spec.children] if spec.children else [])
+		self.lazy = lazy
+		self.paramcount = 0
+		self._presets = None
+		if lazy:
+			self.children = _LazyNodeMap(spec.children, self._CreateChild)
+		else:
+			self.children = _MapByKey([self._CreateChild(spec) for spec in spec.children] if spec.children else [])
+
+	def _CreateChild(self, spec: ModuleSpec):
+		return ModuleModel(app=self, spec=spec, parent=None)
+
+	@property
+	def presets(self):
+		"""The PresetStore of the model, which is created the first time that
+		it's used. It covers the params that exist at that point, so for a lazy
+		model, it creates all of them."""
+		store = self._presets
+		if store is None:
+			# imported here since the presets module depends on this one
+			from tctrl.presets import PresetStore
+			store = self._presets = PresetStore(self)
+		return store
+
+	def AddParam(self, param: ParamModel):
+		"""Assigns the next dense slot number to a ParamModel and registers it
+		with the accessor."""
+		param.slot = self.paramcount
+		self.paramcount += 1
+		self.accessor.AddParam(param)
@@ -0,0 +1,163 @@
+import struct
+from tctrl.schema import ParamType
+from tctrl.util import FillToLength
+
+_Int = struct.Struct('>i')
+_Float = struct.Struct('>f')
+_Double = struct.Struct('>d')
+_Long = struct.Struct('>q')
+_TimeTag = struct.Struct('>Q')
+
+# '#bundle' string followed by the special time tag meaning "immediately"
+_BundlePrefix = b'#bundle\0' + struct.pack('>Q', 1)
+
+def EncodeOscString(s):
+	"""Encodes a string as a null terminated OSC string, padded to a multiple of
+	4 bytes."""
+	b = s.encode('utf-8')
+	return b + b'\0' * (4 - len(b) % 4)
+
+def EncodeOscBundle(messages):
+	"""Combines a sequence of encoded OSC messages into a bundle to be
+	processed immediately."""
+	parts = [_BundlePrefix]
+	for message in messages:
+		parts.append(_Int.pack(len(message)))
+		parts.append(message)
+	return b''.join(parts)
+
+def _ReadOscString(dgram, pos):
+	end = dgram.index(b'\0', pos)
+	return dgram[pos:end].decode('utf-8'), (end + 4) & ~3
+
+def DecodeOscMessage(dgram):
+	"""Decodes an OSC message into an (address, args) tuple. Raises a
+	ValueError or struct.error if the message is malformed."""
+	address, pos = _ReadOscString(dgram, 0)
+	if pos >= len(dgram):
+		return address, []
+	typetags, pos = _ReadOscString(dgram, pos)
+	if not typetags.startswith(','):
+		raise ValueError('Invalid OSC type tags: %r' % typetags)
+	args = []
+	for tag in typetags[1:]:
+		if tag == 'i':
+			args.append(_Int.unpack_from(dgram, pos)[0])
+			pos += 4
+		elif tag == 'f':
+			args.append(_Float.unpack_from(dgram, pos)[0])
+			pos += 4
+		elif tag == 's' or tag == 'S':
+			arg, pos = _ReadOscString(dgram, pos)
+			args.append(arg)
+		elif tag == 'T' or tag == 'I':
+			args.append(True)
+		elif tag == 'F':
+			args.append(False)
+		elif tag == 'N':
+			args.append(None)
+		elif tag == 'd':
+			args.append(_Double.unpack_from(dgram, pos)[0])
+			pos += 8
+		elif tag == 'h':
+			args.append(_Long.unpack_from(dgram, pos)[0])
+			pos += 8
+		elif tag == 't':
+			args.append(_TimeTag.unpack_from(dgram, pos)[0])
+			pos += 8
+		elif tag == 'c' or tag == 'r' or tag == 'm':
+			args.append(_Int.unpack_from(dgram, pos)[0])
+			pos += 4
+		elif tag == 'b':
+			size = _Int.unpack_from(dgram, pos)[0]
+			pos += 4
+			args.append(dgram[pos:pos + size])
+			pos += (size + 3) & ~3
+		else:
+			raise ValueError('Unsupported OSC type tag: %r' % tag)
+	return address, args
+
+def DecodeOscPacket(dgram):
+	"""Decodes an OSC message or bundle into a list of (address, args) tuples
+	for all of the messages that it contains, including those in nested
+	bundles. Bundle time tags are ignored."""
+	if not dgram.startswith(b'#bundle\0'):
+		return [DecodeOscMessage(dgram)]
+	messages = []
+	pos = len(_BundlePrefix)
+	while pos + 4 <= len(dgram):
+		size = _Int.unpack_from(dgram, pos)[0]
+		pos += 4
+		messages.extend(DecodeOscPacket(dgram[pos:pos + size]))
+		pos += size
+	return messages
+
+class OscParamEncoder:
+	"""Encodes OSC messages which set the value of a parameter.
+
+	The address and type tags for a parameter never change, so they are encoded
+	once when the encoder is created and each call to Encode only needs to pack
+	the argument values. Vector parameters use the specified length if there is
+	one, or otherwise the length of each value.
+
+	Encode(value) returns the encoded message, or None if the parameter's type
+	can't be sent. It's bound to the method for the parameter's type when the
+	encoder is created, so there's no dispatch on the type for each value."""
+
+	def __init__(self, path, ptype, length=None):
+		self.path = path
+		self.ptype = ptype
+		self.length = length
+		self._address = EncodeOscString(path)
+		self._vectorformats = {}
+		if ptype == ParamType.bool:
+			self._true = self._address + EncodeOscString(',T')
+			self._false = self._address + EncodeOscString(',F')
+			self.Encode = self._EncodeBool
+		elif ptype == ParamType.string or ptype == ParamType.menu:
+			self._prefix = self._address + EncodeOscString(',s')
+			self.Encode = self._EncodeString
+		elif ptype == ParamType.int:
+			self._prefix = self._address + EncodeOscString(',i')
+			self._pack = _Int.pack
+			self.Encode = self._EncodeScalar
+		elif ptype == ParamType.float:
+			self._prefix = self._address + EncodeOscString(',f')
+			self._pack = _Float.pack
+			self.Encode = self._EncodeScalar
+		elif ptype == ParamType.ivec or ptype == ParamType.fvec:
+			self._typetag = 'i' if ptype == ParamType.ivec else 'f'
+			self.Encode = self._EncodeVector
+		elif ptype == ParamType.trigger:
+			self._trigger = self._address + EncodeOscString(',i') + _Int.pack(1)
+			self.Encode = self._EncodeTrigger
+		else:
+			self.Encode = self._EncodeNothing
+
+	def _EncodeBool(self, value):
+		return self._true if value else self._false
+
+	def _EncodeString(self, value):
+		return self._prefix + EncodeOscString(value)
+
+	def _EncodeScalar(self, value):
+		return self._prefix + self._pack(value)
+
+	def _EncodeVector(self, value):
+		length = self.length
+		if not length:
+			length = len(value) if isinstance(value, list) else 1
+		vals = FillToLength(value, length)
+		fmt = self._vectorformats.get(length)
+		if fmt is None:
+			fmt = self._vectorformats[length] = (
+				self._address + EncodeOscString(',' + self._typetag * length),
+				struct.Struct('>' + self._typetag * length))
+		prefix, packer = fmt
+		return prefix + packer.pack(*vals)
+
+	def _EncodeTrigger(self, value):
+		return self._trigger
+
+	def _EncodeNothing(self, value):
+		return None
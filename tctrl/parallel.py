@@ -0,0 +1,74 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+from tctrl.binary import ReadModulesFromBinary, WriteModulesToBinary
+from tctrl.parsing import ReadAppFromObj, ReadModuleFromObj, ParseException
+
+ParallelParseThreshold = 50000
+"""The number of params below which ReadAppFromObjParallel parses serially,
+since starting worker processes and transferring the objects to and from
+them costs more than it saves for smaller schemas."""
+
+def ReadAppFromObjParallel(obj, maxworkers=None, minparams=None, executor=None):
+	"""Reads an AppSchema in the same way as ReadAppFromObj, but converts the
+	top-level modules in worker processes. The result is equal to that of
+	ReadAppFromObj.
+
+	The modules are split into contiguous chunks with similar numbers of
+	params, and each worker returns its chunk in the binary schema format,
+	which is much faster to load in this process than pickled nodes. Schemas
+	with fewer than minparams params (ParallelParseThreshold by default) are
+	read serially. An existing executor can be provided to avoid starting a
+	new process pool for each call."""
+	if 'key' not in obj:
+		raise ParseException('App is missing key')
+	childobjs = obj.get('children')
+	if minparams is None:
+		minparams = ParallelParseThreshold
+	if not childobjs or len(childobjs) < 2:
+		return ReadAppFromObj(obj)
+	counts = [_CountParams(o) for o in childobjs]
+	if sum(counts) < minparams:
+		return ReadAppFromObj(obj)
+	if executor is None:
+		with ProcessPoolExecutor(max_workers=maxworkers) as pool:
+			return _ReadAppInParallel(obj, counts, pool, maxworkers or os.cpu_count() or 1)
+	return _ReadAppInParallel(obj, counts, executor, maxworkers or os.cpu_count() or 1)
+
+def _CountParams(moduleobj):
+	count = 0
+	stack = [moduleobj]
+	while stack:
+		o = stack.pop()
+		count += len(o.get('params') or ())
+		stack.extend(o.get('children') or ())
+	return count
+
+def _SplitChunks(objs, counts, chunkcount):
+	# a few chunks per worker, so that a slow chunk doesn't hold up the rest
+	target = max(1, (sum(counts) + len(objs)) // chunkcount)
+	chunks = []
+	start = 0
+	size = 0
+	for i, count in enumerate(counts):
+		size += count + 1
+		if size >= target:
+			chunks.append(objs[start:i + 1])
+			start = i + 1
+			size = 0
+	if start < len(objs):
+		chunks.append(objs[start:])
+	return chunks
+
+def _ReadAppInParallel(obj, counts, executor, workers):
+	childprefix = obj['key'] + '/'
+	chunks = _SplitChunks(obj['children'], counts, workers * 4)
+	futures = [executor.submit(_ReadModules, chunk, childprefix) for chunk in chunks]
+	appschema = ReadAppFromObj(dict(obj, children=None))
+	children = []
+	for future in futures:
+		children += ReadModulesFromBinary(future.result())
+	appschema.children = children
+	return appschema
+
+def _ReadModules(objs, pathprefix):
+	return WriteModulesToBinary([ReadModuleFromObj(o, pathprefix=pathprefix) for o in objs])
@@ -1,10 +1,13 @@
 # tctrl.parser
 
+from tctrl.jsonstream import JsonTokenizer, JsonSyntaxError, StringToken, ValueToken
 from tctrl.schema import ParamType, ParamOption, ParamPartSpec, ParamSpec, ModuleSpec, ConnectionInfo, AppSchema, ModuleTypeSpec, OptionList, GroupInfo
 
 class ParseException(Exception):
-	def __init__(self, *args, **kwargs):
+	def __init__(self, *args, line=None, column=None, **kwargs):
 		super().__init__(*args, **kwargs)
+		self.line = line
+		self.column = column
 
 
 def ParseParamType(s):
@@ -83,6 +86,7 @@ def ReadParamFromObj(obj, pathprefix=None):
 		minnorm=obj.get('minNorm'),
 		maxnorm=obj.get('maxNorm'),
 		options=OptionsFromObjList(obj.get('options')),
+		optionlist=obj.get('optionList'),
 		parts=[
 			ReadParamPartFromObj(p, pathprefix=path)
 			for p in partobjs
@@ -107,6 +111,7 @@ _KnownKeys = [
 	'style',
 	'group',
 	'options',
+	'optionList',
 	'help',
 	'offHelp',
 	'buttonText',
@@ -121,6 +126,18 @@ def ReadModuleFromObj(obj, pathprefix=None):
 	childobjs = obj.get('children')
 	path = (pathprefix + obj['key']) if pathprefix else None
 	childprefix = (path + '/') if path else None
+	return _ModuleFromObj(
+		obj,
+		path=path,
+		params=[
+			ReadParamFromObj(o, pathprefix=childprefix) for o in paramobjs
+			] if paramobjs else None,
+		children=[
+			ReadModuleFromObj(o, pathprefix=childprefix) for o in childobjs
+			] if childobjs else None,
+	)
+
+def _ModuleFromObj(obj, path, params, children):
 	return ModuleSpec(
 		obj['key'],
 		path=path,
@@ -128,13 +145,9 @@ def ReadModuleFromObj(obj, pathprefix=None):
 		label=obj.get('label'),
 		group=obj.get('group'),
 		tags=obj.get('tags'),
-		params=[
-			ReadParamFromObj(o, pathprefix=childprefix) for o in paramobjs
-			] if paramobjs else None,
+		params=params,
 		paramgroups=_GroupsFromObjs(obj.get('paramGroups')),
-		children=[
-			ReadModuleFromObj(o, pathprefix=childprefix) for o in childobjs
-			] if childobjs else None,
+		children=children,
 		childgroups=_GroupsFromObjs(obj.get('childGroups')),
 	)
 
@@ -142,12 +155,18 @@ def ReadModuleTypeFromObj(obj):
 	if 'key' not in obj:
 		raise ParseException('Module type is missing key')
 	paramobjs = obj.get('params')
-	return ModuleTypeSpec(
-		obj['key'],
-		label=obj.get('label'),
+	return _ModuleTypeFromObj(
+		obj,
 		params=[
 			ReadParamFromObj(o, pathprefix=':') for o in paramobjs
 			] if paramobjs else None,
+	)
+
+def _ModuleTypeFromObj(obj, params):
+	return ModuleTypeSpec(
+		obj['key'],
+		label=obj.get('label'),
+		params=params,
 		paramgroups=_GroupsFromObjs(obj.get('paramGroups')),
 	)
 
@@ -182,11 +201,8 @@ def ReadAppFromObj(obj):
 	childprefix = obj['key'] + '/'
 	modtypeobjs = obj.get('moduleTypes')
 	optionlistobjs = obj.get('optionLists')
-	return AppSchema(
-		obj['key'],
-		label=obj.get('label'),
-		tags=obj.get('tags'),
-		description=obj.get('description'),
+	return _AppFromObj(
+		obj,
 		children=[
 			ReadModuleFromObj(o, pathprefix=childprefix) for o in childobjs
 			] if childobjs else None,
@@ -200,3 +216,213 @@ def ReadAppFromObj(obj):
 			ReadOptionListFromObj(o) for o in optionlistobjs
 		] if optionlistobjs else None,
 	)
+
+def _AppFromObj(obj, children, connections, moduletypes, optionlists):
+	return AppSchema(
+		obj['key'],
+		label=obj.get('label'),
+		tags=obj.get('tags'),
+		description=obj.get('description'),
+		children=children,
+		connections=connections,
+		moduletypes=moduletypes,
+		optionlists=optionlists,
+	)
+
+def ReadAppFromFile(filepath, chunksize=65536):
+	"""Reads an AppSchema from a JSON file without loading the whole document
+	into memory first. See ReadAppFromStream."""
+	with open(filepath, 'r', encoding='utf-8') as stream:
+		return ReadAppFromStream(stream, chunksize=chunksize)
+
+def ReadAppFromStream(stream, chunksize=65536):
+	"""Reads an AppSchema from a stream of JSON text (or UTF-8 bytes).
+	
+	Unlike ReadAppFromObj, this doesn't need the whole document as Python
+	objects. The JSON is tokenized incrementally and each module, param,
+	module type, option list and connection is converted to its schema object
+	as soon as its JSON object ends, so only the raw objects along the current
+	path are kept in memory. The result is the same as that of
+	ReadAppFromObj. Errors are reported as ParseExceptions that include the
+	line and column where they were found."""
+	return _StreamingAppReader(JsonTokenizer(stream, chunksize=chunksize)).Read()
+
+# Which kind of schema object the objects in an array are converted to, based
+# on the kind of object containing the array and the array's key.
+_StreamArrayKinds = {
+	('app', 'children'): 'module',
+	('app', 'connections'): 'connection',
+	('app', 'moduleTypes'): 'moduletype',
+	('app', 'optionLists'): 'optionlist',
+	('module', 'children'): 'module',
+	('module', 'params'): 'param',
+	('moduletype', 'params'): 'moduletypeparam',
+}
+
+_StreamConverters = {
+	'app': lambda obj: _AppFromObj(
+		_RequireKey(obj, 'App'),
+		children=obj.get('children') or None,
+		connections=obj.get('connections') or None,
+		moduletypes=obj.get('moduleTypes') or None,
+		optionlists=obj.get('optionLists') or None),
+	'module': lambda obj: _ModuleFromObj(
+		_RequireKey(obj, 'Module'),
+		path=None,
+		params=obj.get('params') or None,
+		children=obj.get('children') or None),
+	'moduletype': lambda obj: _ModuleTypeFromObj(
+		_RequireKey(obj, 'Module type'),
+		params=obj.get('params') or None),
+	'param': lambda obj: ReadParamFromObj(_RequireParamKeys(obj)),
+	'moduletypeparam': lambda obj: ReadParamFromObj(_RequireParamKeys(obj), pathprefix=':'),
+	'connection': ReadConnectionFromObj,
+	'optionlist': ReadOptionListFromObj,
+}
+
+def _RequireKey(obj, description):
+	# paths are built from the keys once the whole app has been read, so they
+	# must be strings
+	if 'key' not in obj:
+		raise ParseException(description + ' is missing key')
+	if not isinstance(obj['key'], str):
+		raise ParseException('%s key must be a string: %r' % (description, obj['key']))
+	return obj
+
+def _RequireParamKeys(obj):
+	_RequireKey(obj, 'Param')
+	for partobj in obj.get('parts') or []:
+		if isinstance(partobj, dict):
+			_RequireKey(partobj, 'Param part')
+	return obj
+
+class _StreamingAppReader:
+	def __init__(self, tokenizer: JsonTokenizer):
+		self.tokenizer = tokenizer
+
+	def _Error(self, message, offset):
+		line, column = self.tokenizer.Position(offset)
+		return ParseException(
+			'%s (line %d, column %d)' % (message, line, column),
+			line=line,
+			column=column)
+
+	def Read(self):
+		try:
+			return self._Read()
+		except JsonSyntaxError as e:
+			raise self._Error(str(e), e.offset) from None
+
+	def _Read(self):
+		# Each entry in the stack is a list of:
+		#   the dict or list being built
+		#   the kind of schema object that the dict will be converted to, or for
+		#     a list, the kind that its items will be converted to (or None)
+		#   the key whose value comes next, for a dict
+		#   the offset where it starts
+		stack = []
+		result = None
+		state = _ExpectValue
+		offset = 0
+		for token, value, offset in self.tokenizer:
+			if state == _ExpectColon:
+				if token != ':':
+					raise self._Error("Expected ':'", offset)
+				state = _ExpectValue
+				continue
+			if state == _ExpectKey or state == _ExpectKeyOrEnd:
+				if token == StringToken:
+					stack[-1][2] = value
+					state = _ExpectColon
+					continue
+				if state == _ExpectKey or token != '}':
+					raise self._Error('Expected a key', offset)
+			elif state == _ExpectCommaOrEnd:
+				if token == ',':
+					state = _ExpectKey if isinstance(stack[-1][0], dict) else _ExpectValue
+					continue
+				if token != '}' and token != ']':
+					raise self._Error("Expected ','", offset)
+			elif state == _ExpectValueOrEnd:
+				pass
+			elif state == _Done:
+				raise self._Error('Unexpected data after the end of the document', offset)
+			elif token == '}' or token == ']':
+				raise self._Error('Expected a value', offset)
+
+			if token == '{' or token == '[':
+				stack.append([{} if token == '{' else [], self._ContainerKind(stack, token, offset), None, offset])
+				state = _ExpectKeyOrEnd if token == '{' else _ExpectValueOrEnd
+				continue
+			if token == '}' or token == ']':
+				container, kind, _, start = stack.pop()
+				if isinstance(container, dict) != (token == '}'):
+					raise self._Error('Unexpected %r' % token, offset)
+				value = container
+				if kind and token == '}':
+					try:
+						value = _StreamConverters[kind](container)
+					except ParseException as e:
+						raise self._Error(str(e), offset) from None
+					except (AttributeError, KeyError, TypeError, ValueError) as e:
+						# fields of the wrong kind, such as a number for parts
+						raise self._Error('Invalid %s: %s' % (kind, e), offset) from None
+			elif token == StringToken or token == ValueToken:
+				start = offset
+				if stack and isinstance(stack[-1][0], list) and stack[-1][1]:
+					raise self._Error('Expected an object', offset)
+			else:
+				raise self._Error('Unexpected %r' % token, offset)
+
+			if not stack:
+				result = value
+				state = _Done
+			else:
+				container, kind, key, _ = stack[-1]
+				if isinstance(container, dict):
+					if value is not None and not isinstance(value, list) and (kind, key) in _StreamArrayKinds:
+						raise self._Error('Expected an array for %r' % key, start)
+					container[key] = value
+				else:
+					container.append(value)
+				state = _ExpectCommaOrEnd
+		if state != _Done:
+			raise self._Error('Unexpected end of document', offset)
+		if not isinstance(result, AppSchema):
+			raise self._Error('App must be an object', 0)
+		_AssignPaths(result)
+		return result
+
+	def _ContainerKind(self, stack, token, offset):
+		if not stack:
+			return 'app' if token == '{' else None
+		container, kind, key, _ = stack[-1]
+		if isinstance(container, list):
+			if kind and token == '[':
+				raise self._Error('Expected an object', offset)
+			return kind
+		if token == '[':
+			return _StreamArrayKinds.get((kind, key))
+		return None
+
+# States of _StreamingAppReader
+_ExpectValue = 0
+_ExpectValueOrEnd = 1
+_ExpectKey = 2
+_ExpectKeyOrEnd = 3
+_ExpectColon = 4
+_ExpectCommaOrEnd = 5
+_Done = 6
+
+def _AssignPaths(appschema):
+	# Module and param paths depend on the keys of their ancestors, which may
+	# come after them in the JSON, so they're filled in once everything has
+	# been read, the same way that ReadAppFromObj builds them.
+	prefixes = {id(appschema): appschema.key + '/'}
+	for module, parent, _ in appschema.WalkModules():
+		module.path = prefixes[id(parent)] + module.key
+		childprefix = prefixes[id(module)] = module.path + '/'
+		for param in module.params or []:
+			param.path = childprefix + param.key
+			for part in param.parts or []:
+				part.path = param.path + part.key
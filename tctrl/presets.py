@@ -0,0 +1,210 @@
+from array import array
+import json
+import struct
+import sys
+import zlib
+from tctrl.model import AppModel
+from tctrl.ranges import RangeTable, numpy, _WalkParams
+from tctrl.schema import ParamType
+
+class PresetFileException(Exception):
+	pass
+
+# A preset file is the magic bytes and a format version, followed by
+# zlib-compressed data: a little-endian uint32 header size, the JSON header
+# (the entry keys and each preset's name and non-numeric values), and then
+# each preset's numeric values as little-endian float64s, in entry order.
+_Magic = b'TCPR'
+_Version = 1
+_HeaderSize = struct.Struct('<I')
+
+_NaN = float('nan')
+
+class Preset:
+	"""Captured values of an AppModel's params. The values of numeric params
+	(the entries of the store's RangeTable) are packed into an array, with NaN
+	where a param had no value, and the values of other params are kept in a
+	dict by path."""
+
+	def __init__(self, name, values, othervals):
+		self.name = name
+		self.values = values
+		self.othervals = othervals
+
+class PresetStore:
+	"""Captures, recalls and morphs between Presets of an AppModel's values,
+	and saves them to and loads them from files.
+
+	Recalling a preset only sets the params whose values differ from their
+	current values, in a single SetMany call (followed by a Flush if the
+	accessor has one), so a batching OscAccessor sends the changes as
+	bundles rather than re-sending the whole state."""
+
+	def __init__(self, app: AppModel, table: RangeTable=None, usenumpy=None):
+		self.app = app
+		self.table = table or RangeTable(app, usenumpy=usenumpy)
+		self.usenumpy = self.table.usenumpy
+		self.presets = {}
+		# triggers don't have values to capture
+		self._otherparams = {
+			param.path: param
+			for param in _WalkParams(app)
+			if param.ptype != ParamType.trigger and self.table.IndexOf(param, 0 if param.spec.parts else None) is None
+		}
+
+	def _Pack(self, values):
+		if self.usenumpy:
+			return numpy.asarray(values, dtype=numpy.float64)
+		return array('d', values)
+
+	def Capture(self, name=None):
+		"""Captures the current values of all params. If a name is specified,
+		the preset is also stored under that name."""
+		accessor = self.app.accessor
+		othervals = {}
+		for path, param in self._otherparams.items():
+			value = accessor.GetParam(param)
+			if value is not None:
+				othervals[path] = value
+		preset = Preset(name, self._Pack(self.table.GetValues(accessor)), othervals)
+		if name is not None:
+			self.presets[name] = preset
+		return preset
+
+	def Recall(self, preset):
+		"""Sets the params to a preset's values (or those of the preset stored
+		with the specified name), skipping params whose current values are the
+		same and params that had no value in the preset. Returns the number of
+		params that were set."""
+		if not isinstance(preset, Preset):
+			preset = self.presets[preset]
+		accessor = self.app.accessor
+		table = self.table
+		current = table.GetValues(accessor)
+		if self.usenumpy:
+			values = preset.values
+			changed = numpy.flatnonzero(~numpy.isnan(values) & (values != current))
+			entries = zip(changed.tolist(), values[changed].tolist())
+		else:
+			entries = [
+				(i, v)
+				for i, (v, c) in enumerate(zip(preset.values, current))
+				if v == v and v != c
+			]
+		items = table.GetEntryItems(accessor, entries)
+		for path, value in preset.othervals.items():
+			param = self._otherparams.get(path)
+			if param is not None and accessor.GetParam(param) != value:
+				items.append((param, value))
+		if items:
+			accessor.SetMany(items)
+			flush = getattr(accessor, 'Flush', None)
+			if flush is not None:
+				flush()
+		return len(items)
+
+	def Morph(self, a, b, amount, name=None):
+		"""Creates a preset that blends the numeric values of presets a and b,
+		where an amount of 0 gives a's values and 1 gives b's. Where only one
+		of them has a value, that value is used, and int values are rounded.
+		Other values are taken from a if the amount is below 0.5, otherwise
+		from b."""
+		if not isinstance(a, Preset):
+			a = self.presets[a]
+		if not isinstance(b, Preset):
+			b = self.presets[b]
+		isint = self.table.isint
+		if self.usenumpy:
+			avals = numpy.where(numpy.isnan(a.values), b.values, a.values)
+			bvals = numpy.where(numpy.isnan(b.values), a.values, b.values)
+			values = avals + (bvals - avals) * amount
+			if self.table._hasints:
+				values = numpy.where(isint, numpy.round(values), values)
+		else:
+			values = array('d', [
+				av + (bv - av) * amount if av == av and bv == bv else (av if av == av else bv)
+				for av, bv in zip(a.values, b.values)
+			])
+			if self.table._hasints:
+				for i, v in enumerate(values):
+					if isint[i] and v == v:
+						values[i] = float(round(v))
+		othervals = dict(b.othervals if amount < 0.5 else a.othervals)
+		othervals.update(a.othervals if amount < 0.5 else b.othervals)
+		return Preset(name, values, othervals)
+
+	def SaveFile(self, filepath, names=None):
+		"""Writes the stored presets (or those with the specified names) to a
+		file."""
+		with open(filepath, 'wb') as f:
+			f.write(self.ToBytes(names))
+
+	def LoadFile(self, filepath):
+		"""Reads presets from a file and stores them, replacing any with the
+		same names. Returns the list of presets that were read."""
+		with open(filepath, 'rb') as f:
+			return self.FromBytes(f.read())
+
+	def ToBytes(self, names=None):
+		presets = [self.presets[name] for name in (names if names is not None else self.presets)]
+		header = json.dumps({
+			'entries': [
+				[param.path, partindex]
+				for param, partindex in zip(self.table.params, self.table.partindices)
+			],
+			'presets': [
+				{'name': preset.name, 'otherValues': preset.othervals}
+				for preset in presets
+			],
+		}, separators=(',', ':')).encode()
+		data = bytearray(_HeaderSize.pack(len(header)))
+		data += header
+		for preset in presets:
+			values = array('d', preset.values)
+			if sys.byteorder != 'little':
+				values.byteswap()
+			data += values.tobytes()
+		return _Magic + bytes([_Version]) + zlib.compress(bytes(data))
+
+	def FromBytes(self, data):
+		if data[:4] != _Magic or len(data) < 5:
+			raise PresetFileException('Not a preset file')
+		if data[4] != _Version:
+			raise PresetFileException('Unsupported preset file version: %d' % data[4])
+		try:
+			data = zlib.decompress(data[5:])
+		except zlib.error as e:
+			raise PresetFileException('Corrupt preset file: %s' % e)
+		try:
+			headersize, = _HeaderSize.unpack_from(data)
+			header = json.loads(data[_HeaderSize.size:_HeaderSize.size + headersize].decode())
+			# entries are matched by path, so files saved from a different
+			# version of the schema load the values that still apply
+			positions = [self.table.IndexOfPath(path, partindex) for path, partindex in header['entries']]
+			presetobjs = [(obj['name'], obj.get('otherValues') or {}) for obj in header['presets']]
+		except (struct.error, ValueError, KeyError, TypeError, AttributeError) as e:
+			# JSON and Unicode decoding errors are ValueErrors
+			raise PresetFileException('Corrupt preset file header: %r' % e)
+		offset = _HeaderSize.size + headersize
+		identical = positions == list(range(len(self.table)))
+		count = len(positions)
+		presets = []
+		for name, othervals in presetobjs:
+			if len(data) < offset + count * 8:
+				raise PresetFileException('Preset file is truncated')
+			values = array('d')
+			values.frombytes(data[offset:offset + count * 8])
+			offset += count * 8
+			if sys.byteorder != 'little':
+				values.byteswap()
+			if not identical:
+				mapped = array('d', [_NaN]) * len(self.table)
+				for position, value in zip(positions, values):
+					if position is not None:
+						mapped[position] = value
+				values = mapped
+			preset = Preset(name, self._Pack(values), othervals)
+			if preset.name is not None:
+				self.presets[preset.name] = preset
+			presets.append(preset)
+		return presets
@@ -1,15 +1,79 @@
 from tctrl.schema import *
+from tctrl.instrumentation import GetActiveInstrumentation
+from collections import OrderedDict
 import copy
+import threading
+import time
 
 class ErrorHandler:
 	def OnMissingList(self, param):
 		pass
 
 def WalkChildModules(node, action):
-	if node.children:
-		for child in node.children:
-			action(child, parent=node)
-			WalkChildModules(child, action)
+	for module, parent, _ in node.WalkModules():
+		action(module, parent=parent)
+
+class _NodeCopier:
+	"""Provides modifiable versions of schema nodes during processing. When
+	sharing nodes, a node is shallow copied the first time that it's modified
+	and the copy is used from then on. Otherwise the whole schema has already
+	been deep copied, so nodes are modified in place."""
+	
+	def __init__(self, sharenodes):
+		self.sharenodes = sharenodes
+		self._copies = {}
+
+	def Edit(self, node):
+		if not self.sharenodes or id(node) in self._copies:
+			return node
+		node = copy.copy(node)
+		self._copies[id(node)] = node
+		return node
+
+	def EditList(self, node, attrname):
+		"""Gets a version of a list field of a node (which must have already
+		been passed through Edit) that can be modified. When sharing nodes, the
+		list is copied the first time, since the original is still used by
+		the input schema."""
+		nodes = getattr(node, attrname)
+		if not self.sharenodes or id(nodes) in self._copies:
+			return nodes
+		nodes = list(nodes)
+		setattr(node, attrname, nodes)
+		nodes = getattr(node, attrname)
+		self._copies[id(nodes)] = nodes
+		return nodes
+
+def _ReplaceChildren(node, replacements, copier):
+	"""Returns the node, or a modified version of it whose children list uses
+	the replacements (by original module id) for any of its children that
+	were changed."""
+	if not replacements or not node.children:
+		return node
+	children = None
+	for i, child in enumerate(node.children):
+		newchild = replacements.get(id(child))
+		if newchild is not None:
+			if children is None:
+				node = copier.Edit(node)
+				children = copier.EditList(node, 'children')
+			children[i] = newchild
+	return node
+
+def _ApplyModuleActions(appschema, actions, copier):
+	"""Runs a set of module actions in a single post-order pass over the
+	schema. Each action takes a module and returns the module to use in its
+	place, which is either that same module or a version of it from the
+	copier. Since children are visited before their parents, each parent can
+	pick up any replaced children before the actions see it."""
+	replacements = {}
+	for module, _, _ in appschema.WalkModules(postorder=True):
+		newmodule = _ReplaceChildren(module, replacements, copier)
+		for action in actions:
+			newmodule = action(newmodule)
+		if newmodule is not module:
+			replacements[id(module)] = newmodule
+	return _ReplaceChildren(appschema, replacements, copier)
 
 def ProcessAppSchema(appschema,
 										 embedlists=False,
@@ -18,40 +82,175 @@ def ProcessAppSchema(appschema,
 										 stripmoduletypes=None,
 										 generateparamgroups=False,
 										 generatechildgroups=False,
-										 errorhandler=None):
+										 errorhandler=None,
+										 sharenodes=False):
+	"""Produces a processed version of an AppSchema, leaving the original
+	unmodified.
+	
+	By default the schema is deep copied before processing. If sharenodes is
+	True, only the nodes that processing modifies are copied (along with their
+	ancestors) and everything else in the result is shared with the input
+	schema. That's much faster for large schemas, but it means that neither
+	schema should be modified afterwards without copying it first."""
 	if striplists is None:
 		striplists = embedlists
 	if stripmoduletypes is None:
 		stripmoduletypes = embedmoduletypes
 
-	appschema = copy.deepcopy(appschema)
+	instrumentation = GetActiveInstrumentation()
+	if instrumentation is not None:
+		timings = {}
+		start = time.perf_counter()
 
-	if embedmoduletypes:
-		_EmbedModuleTypes(appschema, errorhandler)
+	copier = _NodeCopier(sharenodes)
+	if sharenodes:
+		appschema = copier.Edit(appschema)
+	else:
+		appschema = copy.deepcopy(appschema)
+	if instrumentation is not None:
+		timings['copy'] = time.perf_counter() - start
 
+	actions = []
+	if embedmoduletypes:
+		actions.append(('embedModuleTypes', _EmbedModuleTypesAction(appschema, errorhandler, copier)))
 	if embedlists:
-		_EmbedSchemaLists(appschema, errorhandler)
-
+		actions.append(('embedLists', _EmbedSchemaListsAction(appschema, errorhandler, copier)))
 	if generateparamgroups:
-		_GenerateParamGroups(appschema)
+		actions.append(('generateParamGroups', _GenerateParamGroupsAction(copier)))
+	if generatechildgroups:
+		actions.append(('generateChildGroups', _GenerateChildGroupsAction(copier)))
+	actions = [(name, action) for name, action in actions if action]
+	if instrumentation is not None:
+		actions = [(name, _TimedAction(name, action, timings)) for name, action in actions]
+	if actions:
+		appschema = _ApplyModuleActions(appschema, [action for _, action in actions], copier)
 
 	if generatechildgroups:
-		_GenerateChildGroups(appschema)
+		childgroupsaction = _GenerateChildGroupsAction(copier)
+		if instrumentation is not None:
+			childgroupsaction = _TimedAction('generateChildGroups', childgroupsaction, timings)
+		appschema = childgroupsaction(appschema)
 
 	if striplists:
 		appschema.optionlists = []
 	if stripmoduletypes:
 		appschema.moduletypes = []
 
+	if instrumentation is not None:
+		for name, seconds in timings.items():
+			instrumentation.RecordStage(name, seconds)
+		instrumentation.RecordStage('processAppSchema', time.perf_counter() - start)
 	return appschema
 
+def _TimedAction(name, action, timings):
+	"""Wraps a module action to add the time that it takes to the total for
+	its stage. The stages run interleaved in a single pass over the schema, so
+	each stage's time is the sum over all of the modules."""
+	timings.setdefault(name, 0.0)
+	def _moduleAction(module):
+		start = time.perf_counter()
+		result = action(module)
+		timings[name] += time.perf_counter() - start
+		return result
+	return _moduleAction
+
+
+class ProcessingCache:
+	"""A bounded LRU cache of ProcessAppSchema results, keyed by the input
+	schema's Fingerprint and the processing options, so that processing the
+	same schema with the same options again returns the earlier result.
+	
+	Results are shared between callers, so they must be treated as
+	read-only. Since they are cached, so is their JSON, which makes repeated
+	ToJson calls on a result cheap as well. Schemas are always deep copied
+	for processing so that results never share nodes with an input schema
+	which might be modified later. The error handler is only called when a
+	result is actually processed.
+	
+	The cache can be shared between threads. If several threads miss on the
+	same key at once, each processes the schema, and they all get the result
+	that was stored first."""
+	
+	def __init__(self, maxsize=32):
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._results = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._results)
+
+	def Process(self,
+	            appschema,
+	            embedlists=False,
+	            striplists=None,
+	            embedmoduletypes=False,
+	            stripmoduletypes=None,
+	            generateparamgroups=False,
+	            generatechildgroups=False,
+	            errorhandler=None):
+		"""Gets the result of ProcessAppSchema for a schema and options, either
+		from the cache or by processing it."""
+		if striplists is None:
+			striplists = embedlists
+		if stripmoduletypes is None:
+			stripmoduletypes = embedmoduletypes
+		key = (
+			appschema.Fingerprint(),
+			bool(embedlists),
+			bool(striplists),
+			bool(embedmoduletypes),
+			bool(stripmoduletypes),
+			bool(generateparamgroups),
+			bool(generatechildgroups),
+		)
+		with self._lock:
+			result = self._results.get(key)
+			if result is not None:
+				self._results.move_to_end(key)
+				self.hits += 1
+				return result
+			self.misses += 1
+		result = ProcessAppSchema(
+			appschema,
+			embedlists=embedlists,
+			striplists=striplists,
+			embedmoduletypes=embedmoduletypes,
+			stripmoduletypes=stripmoduletypes,
+			generateparamgroups=generateparamgroups,
+			generatechildgroups=generatechildgroups,
+			errorhandler=errorhandler)
+		with self._lock:
+			existing = self._results.get(key)
+			if existing is not None:
+				return existing
+			self._results[key] = result
+			while len(self._results) > self.maxsize:
+				self._results.popitem(last=False)
+				self.evictions += 1
+		return result
+
+	def Clear(self):
+		"""Discards all cached results and resets the statistics."""
+		with self._lock:
+			self._results.clear()
+			self.hits = 0
+			self.misses = 0
+			self.evictions = 0
+
 
-def _EmbedModuleTypes(appschema,
-                      errorhandler):
+def _EmbedModuleTypesAction(appschema,
+                            errorhandler,
+                            copier):
 	if not appschema.moduletypes:
-		return
+		return None
 	moduletypesbykey = {t.key: t for t in appschema.moduletypes}
-	def _moduleAction(module: ModuleSpec, **kwargs):
+	# each module type's groups are copied once and shared by its instances,
+	# which get their own copies of them if they're modified
+	sharedgroups = {}
+	def _moduleAction(module: ModuleSpec):
 		if not module.path:
 			raise Exception('OMG MODULE HAS NO PATH: ' + repr(module))
 		if module.moduletype and module.moduletype in moduletypesbykey:
@@ -59,71 +258,111 @@ def _EmbedModuleTypes(appschema,
 			instanceparamsbykey = {
 				p.key: p for p in module.params or []
 			}
-			if not module.params:
-				module.params = []
-				for masterparam in modtype.params:
-					param = _CreateParamFromMaster(masterparam, module, instanceparamsbykey.get(masterparam.key))
-					module.params.append(param)
-			if not module.paramgroups:
-				module.paramgroups = copy.deepcopy(modtype.paramgroups)
-	WalkChildModules(appschema, _moduleAction)
+			if not module.params and modtype.params:
+				module = copier.Edit(module)
+				module.params = [
+					_CreateParamFromMaster(masterparam, module, instanceparamsbykey.get(masterparam.key))
+					for masterparam in modtype.params
+				]
+			if not module.paramgroups and modtype.paramgroups:
+				module = copier.Edit(module)
+				groups = sharedgroups.get(modtype.key)
+				if groups is None:
+					groups = sharedgroups[modtype.key] = tuple(
+						copy.deepcopy(tuple(PeekNodes(modtype.paramgroups))))
+				ShareNodeList(module, 'paramgroups', groups)
+		return module
+	return _moduleAction
 
 def _CreateParamFromMaster(masterparam, module, instanceparam):
-	param = copy.deepcopy(masterparam)
+	# the params are overlays which share the master's fields, so that each
+	# instance only holds its own paths and values
 	if masterparam.path:
-		param.path = module.path + masterparam.path
+		path = module.path + masterparam.path
 	else:
-		param.path = module.path + ':' + param.key
-	if instanceparam.value is not None:
-		param.value = instanceparam.value
-	if instanceparam.valueindex is not None:
-		param.valueindex = instanceparam.valueindex
-	if param.parts:
-		for i, part in enumerate(param.parts):
-			part.path = param.path + param.key
-			if instanceparam.parts and i < len(instanceparam.parts):
+		path = module.path + ':' + masterparam.key
+	fields = {'path': path}
+	if instanceparam is not None and instanceparam.value is not None:
+		fields['value'] = instanceparam.value
+	if instanceparam is not None and instanceparam.valueindex is not None:
+		fields['valueindex'] = instanceparam.valueindex
+	if masterparam.parts:
+		parts = []
+		for i, masterpart in enumerate(masterparam.parts):
+			partfields = {'path': path + masterparam.key}
+			if instanceparam is not None and instanceparam.parts and i < len(instanceparam.parts):
 				instancepart = instanceparam.parts[i]
 				if instancepart.value is not None:
-					part.value = instancepart.value
-	return param
+					partfields['value'] = instancepart.value
+			parts.append(CreateOverlay(masterpart, **partfields))
+		fields['parts'] = parts
+	return CreateOverlay(masterparam, **fields)
 
-def _EmbedSchemaLists(appschema,
-                      errorhandler):
+def _EmbedSchemaListsAction(appschema,
+                            errorhandler,
+                            copier):
 	if not appschema.optionlists:
-		return
+		return None
 	optionlistsbykey = {l.key: l for l in appschema.optionlists}
-	def _moduleAction(module: ModuleSpec, **kwargs):
-		for param in module.params:
+	# each list's options are copied once and shared by all of the params
+	# that use it
+	sharedoptions = {}
+	def _moduleAction(module: ModuleSpec):
+		params = None
+		for i, param in enumerate(module.params):
 			if param.optionlist and not param.options:
 				if param.optionlist not in optionlistsbykey:
 					if errorhandler:
 						errorhandler.OnMissingList(param)
 					continue
-				param.options = copy.deepcopy(optionlistsbykey[param.optionlist].options)
-	WalkChildModules(appschema, _moduleAction)
+				if params is None:
+					module = copier.Edit(module)
+					params = copier.EditList(module, 'params')
+				param = params[i] = copier.Edit(param)
+				options = sharedoptions.get(param.optionlist)
+				if options is None:
+					options = sharedoptions[param.optionlist] = tuple(
+						copy.deepcopy(optionlistsbykey[param.optionlist].options))
+				ShareNodeList(param, 'options', options)
+		return module
+	return _moduleAction
 
-def _GenerateParamGroups(appschema):
-	def _moduleAction(module: ModuleSpec, **kwargs):
+def _GenerateParamGroupsAction(copier):
+	def _moduleAction(module: ModuleSpec):
 		if module.params:
-			module.paramgroups = _GenerateGroups(module.params, module.paramgroups)
-	WalkChildModules(appschema, _moduleAction)
+			groups = _GenerateGroups(module.params, module.paramgroups)
+			if groups is not module.paramgroups:
+				module = copier.Edit(module)
+				module.paramgroups = groups
+		return module
+	return _moduleAction
 
-def _GenerateChildGroups(appschema):
-	def _moduleAction(module, **kwargs):
+def _GenerateChildGroupsAction(copier):
+	def _moduleAction(module):
 		if module.children:
-			module.childgroups = _GenerateGroups(module.children, module.childgroups)
-	_moduleAction(appschema)
-	WalkChildModules(appschema, _moduleAction)
+			groups = _GenerateGroups(module.children, module.childgroups)
+			if groups is not module.childgroups:
+				module = copier.Edit(module)
+				module.childgroups = groups
+		return module
+	return _moduleAction
 
 def _GenerateGroups(nodes, groups):
-	groups = groups or []
+	"""Returns a list of groups with entries added for any groups that are used
+	by the nodes but aren't already in the list. If no groups need to be added,
+	the original list is returned."""
 	if not nodes:
 		return groups
-	knowngroups = {g.key for g in groups}
+	# shared groups are read without copying them, unless groups are added
+	existing = PeekNodes(groups) or []
+	knowngroups = {g.key for g in existing}
+	newgroups = None
 	for node in nodes:
 		if node.group and node.group not in knowngroups:
-			groups.append(GroupInfo(
+			if newgroups is None:
+				newgroups = [copy.copy(g) if g._isfrozen else g for g in existing]
+			newgroups.append(GroupInfo(
 				node.group,
 				label=node.group))
 			knowngroups.add(node.group)
-	return groups
+	return groups if newgroups is None else newgroups
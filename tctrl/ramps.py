@@ -0,0 +1,290 @@
+from array import array
+from enum import Enum
+import threading
+import time
+from tctrl.instrumentation import LatencyHistogram
+from tctrl.model import AppModel, ParamModel
+from tctrl.ranges import RangeTable, numpy, _VectorTypes
+
+class Curve(Enum):
+	"""The shape of a ramp between its start and end values."""
+
+	linear = 0
+	easein = 1
+	easeout = 2
+	easeinout = 3
+
+# These work on floats as well as numpy arrays.
+_CurveFuncs = {
+	Curve.easein.value: lambda t: t * t,
+	Curve.easeout.value: lambda t: t * (2 - t),
+	Curve.easeinout.value: lambda t: t * t * (3 - 2 * t),
+}
+
+_MinDuration = 1e-9
+
+class RampEngine:
+	"""Moves params of an AppModel towards target values over time.
+
+	Active ramps are kept in parallel arrays (numpy arrays if RangeTable uses
+	numpy, otherwise array.array columns), and each Tick advances all of them
+	at once and sends the values that changed through the accessor's SetMany
+	in a single batch, followed by a Flush if the accessor has one (so that a
+	batching OscAccessor sends them as one bundle).
+
+	Ramps apply to the entries of a RangeTable, which are float and int
+	params and the parts of fvec and ivec params. Int values are rounded.
+
+	Ticks can be driven by calling Tick directly, or by Start(), which runs
+	them on a thread at a fixed rate and records how late each tick was
+	(jitter) and how long it took."""
+
+	def __init__(self, app: AppModel, rate=100.0, table: RangeTable=None, usenumpy=None):
+		self.app = app
+		self.table = table or RangeTable(app, usenumpy=usenumpy)
+		self.usenumpy = self.table.usenumpy
+		self.interval = 1.0 / rate
+		self._lock = threading.Lock()
+		self._pending = []
+		self._SetRamps([], [], [], [], [], [], [])
+		self._thread = None
+		self._stopevent = None
+		self.ResetStats()
+
+	def _SetRamps(self, positions, starts, ends, starttimes, durations, curves, lastsent):
+		if self.usenumpy:
+			self._positions = numpy.array(positions, dtype=numpy.intp)
+			self._starts = numpy.array(starts, dtype=numpy.float64)
+			self._ends = numpy.array(ends, dtype=numpy.float64)
+			self._starttimes = numpy.array(starttimes, dtype=numpy.float64)
+			self._durations = numpy.array(durations, dtype=numpy.float64)
+			self._curves = numpy.array(curves, dtype=numpy.int8)
+			self._lastsent = numpy.array(lastsent, dtype=numpy.float64)
+		else:
+			self._positions = array('l', positions)
+			self._starts = array('d', starts)
+			self._ends = array('d', ends)
+			self._starttimes = array('d', starttimes)
+			self._durations = array('d', durations)
+			self._curves = array('b', curves)
+			self._lastsent = array('d', lastsent)
+
+	def _Columns(self):
+		return (
+			self._positions, self._starts, self._ends, self._starttimes,
+			self._durations, self._curves, self._lastsent)
+
+	@property
+	def activecount(self):
+		with self._lock:
+			return len(self._positions) + len(self._pending)
+
+	def Ramp(self, param: ParamModel, target, duration, curve=Curve.linear, start=None, now=None):
+		"""Starts moving a param from its current value (or from start) to the
+		target over duration seconds, replacing any ramp that it already has.
+		For vector params, target (and start) are lists with a value per part.
+		Params that don't have a value jump to the target on the next tick."""
+		if now is None:
+			now = time.monotonic()
+		isvector = param.ptype in _VectorTypes
+		if isvector:
+			count = len(param.spec.parts or ())
+			targets = list(target)[:count]
+			if start is None:
+				start = param.value
+			starts = list(start or ())
+		else:
+			targets = [target]
+			starts = [start if start is not None else param.value]
+		ramps = []
+		for i, end in enumerate(targets):
+			position = self.table.IndexOf(param, i if isvector else None)
+			if position is None:
+				raise ValueError('Param cannot be ramped: %s' % param.path)
+			begin = starts[i] if i < len(starts) and starts[i] is not None else end
+			ramps.append((position, float(begin), float(end), now, max(duration, _MinDuration), curve.value))
+		with self._lock:
+			self._pending += ramps
+
+	def Cancel(self, param: ParamModel):
+		"""Stops any ramps of a param (or its parts), leaving it at its current
+		value."""
+		positions = {
+			i for i, p in enumerate(self.table.params)
+			if p is param
+		}
+		with self._lock:
+			self._pending = [r for r in self._pending if r[0] not in positions]
+			self._Keep([p not in positions for p in self._positions])
+
+	def CancelAll(self):
+		with self._lock:
+			self._pending = []
+			self._SetRamps([], [], [], [], [], [], [])
+
+	def _Keep(self, keep):
+		if self.usenumpy:
+			keep = numpy.asarray(keep, dtype=bool)
+			if not keep.all():
+				self._SetRamps(*[column[keep] for column in self._Columns()])
+		elif not all(keep):
+			self._SetRamps(*[
+				[v for v, k in zip(column, keep) if k]
+				for column in self._Columns()
+			])
+
+	def _MergePending(self):
+		# must be called while holding the lock. New ramps replace active ones
+		# for the same entries.
+		pending = {r[0]: r for r in self._pending}
+		self._pending = []
+		self._Keep([p not in pending for p in self._positions.tolist()])
+		columns = [list(column) for column in zip(*pending.values())]
+		columns.append([float('nan')] * len(pending))
+		if self.usenumpy:
+			self._SetRamps(*[
+				numpy.concatenate((old, numpy.array(new, dtype=old.dtype)))
+				for old, new in zip(self._Columns(), columns)
+			])
+		else:
+			for old, new in zip(self._Columns(), columns):
+				old.extend(new)
+
+	def _Ease(self, t):
+		curves = self._curves
+		if self.usenumpy:
+			eased = t
+			for code, func in _CurveFuncs.items():
+				mask = curves == code
+				if mask.any():
+					if eased is t:
+						eased = t.copy()
+					eased[mask] = func(t[mask])
+			return eased
+		return [
+			_CurveFuncs[code](x) if code else x
+			for x, code in zip(t, curves)
+		]
+
+	def Tick(self, now=None):
+		"""Advances all active ramps to the specified time (or the current
+		time) and sends the values that changed. Returns the number of ramps
+		that were active."""
+		if now is None:
+			now = time.monotonic()
+		with self._lock:
+			if self._pending:
+				self._MergePending()
+			count = len(self._positions)
+			if not count:
+				return 0
+			isint = self.table.isint
+			if self.usenumpy:
+				t = numpy.clip((now - self._starttimes) / self._durations, 0.0, 1.0)
+				eased = self._Ease(t)
+				# this form lands exactly on the end values when eased is 1
+				values = self._starts * (1.0 - eased) + self._ends * eased
+				if self.table._hasints:
+					values = numpy.where(isint[self._positions], numpy.round(values), values)
+				changed = numpy.flatnonzero(values != self._lastsent)
+				self._lastsent = values
+				updates = zip(self._positions[changed].tolist(), values[changed].tolist())
+				self._Keep(t < 1.0)
+			else:
+				t = [
+					min(max((now - s) / d, 0.0), 1.0)
+					for s, d in zip(self._starttimes, self._durations)
+				]
+				eased = self._Ease(t)
+				values = array('d', [
+					a * (1.0 - e) + b * e
+					for a, b, e in zip(self._starts, self._ends, eased)
+				])
+				for i, position in enumerate(self._positions):
+					if isint[position]:
+						values[i] = float(round(values[i]))
+				updates = [
+					(position, value)
+					for position, value, last in zip(self._positions, values, self._lastsent)
+					if value != last
+				]
+				self._lastsent = values
+				self._Keep([x < 1.0 for x in t])
+		self._Send(updates)
+		return count
+
+	def _Send(self, updates):
+		accessor = self.app.accessor
+		items = self.table.GetEntryItems(accessor, updates)
+		if not items:
+			return
+		accessor.SetMany(items)
+		flush = getattr(accessor, 'Flush', None)
+		if flush is not None:
+			flush()
+
+	def ResetStats(self):
+		self.errors = 0
+		self.lasterror = None
+		self.ticks = 0
+		self.rampticks = 0
+		self.cpuseconds = 0.0
+		self.jitter = LatencyHistogram()
+		self.ticktimes = LatencyHistogram()
+
+	def GetStats(self):
+		"""Gets the timings recorded by the tick thread as a JSON-compatible
+		dict."""
+		return {
+			'ticks': self.ticks,
+			'errors': self.errors,
+			'rampTicks': self.rampticks,
+			'jitter': self.jitter.JsonDict,
+			'tickSeconds': self.ticktimes.JsonDict,
+			'cpuSecondsPerRampTick': self.cpuseconds / self.rampticks if self.rampticks else None,
+		}
+
+	def Start(self):
+		"""Starts ticking at the engine's rate on a daemon thread. Exceptions
+		raised by a tick (such as by the accessor) don't stop the thread: they
+		are counted in errors, and the latest one is kept in lasterror."""
+		if self._thread is not None:
+			return
+		self._stopevent = threading.Event()
+		self._thread = threading.Thread(target=self._TickLoop, args=(self._stopevent,), daemon=True)
+		self._thread.start()
+
+	def Stop(self):
+		if self._thread is None:
+			return
+		self._stopevent.set()
+		self._thread.join()
+		self._thread = None
+
+	def _TickLoop(self, stopevent):
+		interval = self.interval
+		due = time.monotonic()
+		while True:
+			delay = due - time.monotonic()
+			if delay > 0 and stopevent.wait(delay):
+				return
+			if stopevent.is_set():
+				return
+			now = time.monotonic()
+			cpustart = time.thread_time()
+			try:
+				count = self.Tick(now)
+			except Exception as e:
+				count = 0
+				self.errors += 1
+				self.lasterror = e
+			end = time.monotonic()
+			self.ticks += 1
+			self.rampticks += count
+			self.cpuseconds += time.thread_time() - cpustart
+			self.jitter.Add(now - due)
+			self.ticktimes.Add(end - now)
+			due += interval
+			if end > due:
+				# skip the ticks that were missed rather than running them late
+				due += (int((end - due) / interval) + 1) * interval
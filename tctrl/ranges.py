@@ -0,0 +1,285 @@
+from array import array
+from tctrl.model import AppModel, ArrayAccessor, AccessorSnapshot
+from tctrl.schema import ParamType
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+_ScalarTypes = (ParamType.float, ParamType.int)
+_VectorTypes = (ParamType.fvec, ParamType.ivec)
+_IntTypes = (ParamType.int, ParamType.ivec)
+
+_NaN = float('nan')
+_Inf = float('inf')
+
+def _WalkParams(app: AppModel):
+	# depth-first, with each module's params before its children
+	stack = list(app.children.values())
+	stack.reverse()
+	while stack:
+		module = stack.pop()
+		yield from module.params.values()
+		children = list(module.children.values())
+		children.reverse()
+		stack.extend(children)
+
+def _Ranges(spec, fallback):
+	"""Gets (minnorm, maxnorm, minlimit, maxlimit) for a param or part, using
+	the fallback's ranges for any that aren't specified."""
+	minlimit = spec.minlimit if spec.minlimit is not None else fallback[2]
+	maxlimit = spec.maxlimit if spec.maxlimit is not None else fallback[3]
+	minnorm = spec.minnorm if spec.minnorm is not None else fallback[0]
+	maxnorm = spec.maxnorm if spec.maxnorm is not None else fallback[1]
+	if minnorm is None:
+		minnorm = minlimit if minlimit is not None else 0
+	if maxnorm is None:
+		maxnorm = maxlimit if maxlimit is not None else 1
+	return minnorm, maxnorm, minlimit, maxlimit
+
+class RangeTable:
+	"""A table of the ranges of the numeric params in an AppModel, which
+	converts whole sets of values (such as a bank of faders or a snapshot)
+	between their normalized 0..1 form and their actual values in one call.
+
+	Each float and int param has an entry, as does each part of an fvec or
+	ivec param, with any ranges that a part doesn't specify taken from its
+	param. Vector params without parts are left out, since their length isn't
+	known. Entries are ordered by a depth-first walk of the model, with each
+	module's params before its children. Missing norm ranges default to the
+	limits, or to 0..1 if there aren't any, and missing limits are unbounded.
+
+	Values are sequences with one number per entry, with NaN for missing
+	values. If numpy is available (and usenumpy isn't False), the ranges are
+	held in numpy arrays, the conversions are vectorized and they return numpy
+	arrays. Otherwise they're done in pure Python and return lists."""
+
+	def __init__(self, app: AppModel, usenumpy=None):
+		if usenumpy is None:
+			usenumpy = numpy is not None
+		elif usenumpy and numpy is None:
+			raise ImportError('numpy is not available')
+		self.usenumpy = usenumpy
+		self.params = []
+		self.partindices = []
+		self._indices = {}
+		# scalar entries can be read straight from an ArrayAccessor's buffer
+		# by slot, while vector entries are read per param
+		scalarpositions = []
+		scalarslots = []
+		self._vectors = []
+		self._partdefaults = {}
+		ranges = []
+		isint = []
+		for param in _WalkParams(app):
+			spec = param.spec
+			if spec.ptype in _ScalarTypes:
+				parts = None
+			elif spec.ptype in _VectorTypes and spec.parts:
+				parts = spec.parts
+			else:
+				continue
+			paramranges = _Ranges(spec, (None, None, None, None))
+			if parts is None:
+				scalarpositions.append(len(self.params))
+				scalarslots.append(param.slot)
+				self._AddEntry(param, None)
+				ranges.append(paramranges)
+			else:
+				self._vectors.append((param, len(self.params), len(parts)))
+				self._partdefaults[param.path] = [_PartDefault(spec, part, i) for i, part in enumerate(parts)]
+				for i, part in enumerate(parts):
+					self._AddEntry(param, i)
+					ranges.append(_Ranges(part, paramranges))
+			isint.extend([spec.ptype in _IntTypes] * (1 if parts is None else len(parts)))
+		minnorm = [r[0] for r in ranges]
+		maxnorm = [r[1] for r in ranges]
+		minlimit = [r[2] if r[2] is not None else -_Inf for r in ranges]
+		maxlimit = [r[3] if r[3] is not None else _Inf for r in ranges]
+		self._hasints = any(isint)
+		if usenumpy:
+			self.minnorm = numpy.array(minnorm, dtype=numpy.float64)
+			self.maxnorm = numpy.array(maxnorm, dtype=numpy.float64)
+			self.minlimit = numpy.array(minlimit, dtype=numpy.float64)
+			self.maxlimit = numpy.array(maxlimit, dtype=numpy.float64)
+			self.isint = numpy.array(isint, dtype=bool)
+			self._span = self.maxnorm - self.minnorm
+			self._scalarpositions = numpy.array(scalarpositions, dtype=numpy.intp)
+			self._scalarslots = numpy.array(scalarslots, dtype=numpy.intp)
+		else:
+			self.minnorm = array('d', minnorm)
+			self.maxnorm = array('d', maxnorm)
+			self.minlimit = array('d', minlimit)
+			self.maxlimit = array('d', maxlimit)
+			self.isint = isint
+			self._span = array('d', [hi - lo for lo, hi in zip(minnorm, maxnorm)])
+			self._scalarpositions = scalarpositions
+			self._scalarslots = scalarslots
+
+	def _AddEntry(self, param, partindex):
+		self._indices[(param.path, partindex)] = len(self.params)
+		self.params.append(param)
+		self.partindices.append(partindex)
+
+	def __len__(self):
+		return len(self.params)
+
+	def IndexOf(self, param, partindex=None):
+		"""Gets the position of a param's entry (or the entry for one of its
+		parts), or None if it isn't in the table."""
+		return self._indices.get((param.path, partindex))
+
+	def IndexOfPath(self, path, partindex=None):
+		"""Gets the position of an entry by its param's model path."""
+		return self._indices.get((path, partindex))
+
+	def Normalize(self, values):
+		"""Maps values from their norm ranges to 0..1. Entries whose norm range
+		is empty map to 0."""
+		if self.usenumpy:
+			values = numpy.asarray(values, dtype=numpy.float64)
+			span = self._span
+			return numpy.divide(values - self.minnorm, span, out=numpy.zeros_like(values), where=span != 0)
+		return [
+			(v - lo) / span if span else 0.0
+			for v, lo, span in zip(values, self.minnorm, self._span)
+		]
+
+	def Denormalize(self, values):
+		"""Maps values from 0..1 to their norm ranges, rounding the values of
+		int entries."""
+		if self.usenumpy:
+			values = self.minnorm + numpy.asarray(values, dtype=numpy.float64) * self._span
+			if self._hasints:
+				values = numpy.where(self.isint, numpy.round(values), values)
+			return values
+		values = [lo + v * span for v, lo, span in zip(values, self.minnorm, self._span)]
+		if self._hasints:
+			for i, isint in enumerate(self.isint):
+				v = values[i]
+				# NaN can't be rounded
+				if isint and v == v:
+					values[i] = float(round(v))
+		return values
+
+	def Clamp(self, values):
+		"""Limits values to the entries' min/max limits."""
+		if self.usenumpy:
+			return numpy.clip(numpy.asarray(values, dtype=numpy.float64), self.minlimit, self.maxlimit)
+		return [
+			min(max(v, lo), hi)
+			for v, lo, hi in zip(values, self.minlimit, self.maxlimit)
+		]
+
+	def GetValues(self, accessor):
+		"""Gets the values of all entries from an accessor. For an
+		ArrayAccessor, the values of scalar params are read directly from its
+		buffer."""
+		if isinstance(accessor, ArrayAccessor):
+			return self.GetSnapshotValues(AccessorSnapshot(
+				accessor.numericvals, accessor._isset, accessor._othervals))
+		values = [_NaN] * len(self.params)
+		for position in self._scalarpositions:
+			value = accessor.GetParam(self.params[position])
+			if value is not None:
+				values[position] = value
+		for param, start, count in self._vectors:
+			_FillVector(values, start, count, accessor.GetParam(param))
+		return numpy.array(values, dtype=numpy.float64) if self.usenumpy else values
+
+	def GetSnapshotValues(self, snapshot: AccessorSnapshot):
+		"""Gets the values of all entries from a snapshot of an ArrayAccessor
+		for the same model."""
+		numericvals = snapshot.numericvals
+		isset = snapshot.isset
+		count = len(numericvals)
+		if self.usenumpy:
+			values = numpy.full(len(self.params), numpy.nan)
+			slots = self._scalarslots
+			# slots beyond the end of the snapshot (for params created after it
+			# was taken) are left missing
+			present = slots < count
+			if not present.all():
+				slots = slots[present]
+			positions = self._scalarpositions[present]
+			if len(slots):
+				setflags = numpy.frombuffer(isset, dtype=numpy.uint8, count=count)[slots]
+				values[positions] = numpy.where(
+					setflags != 0,
+					numpy.frombuffer(numericvals, dtype=numpy.float64, count=count)[slots],
+					numpy.nan)
+		else:
+			values = [_NaN] * len(self.params)
+			for position, slot in zip(self._scalarpositions, self._scalarslots):
+				if slot < count and isset[slot]:
+					values[position] = numericvals[slot]
+		othervals = snapshot.othervals
+		for param, start, length in self._vectors:
+			_FillVector(values, start, length, othervals.get(param.slot))
+		return values
+
+	def SetValues(self, accessor, values):
+		"""Sets params to the values of their entries through the accessor's
+		SetMany, skipping entries that are NaN. Parts that are NaN keep their
+		current values."""
+		accessor.SetMany(self.GetItems(accessor, values))
+
+	def GetItems(self, accessor, values):
+		"""Gets the (param, value) pairs that SetValues would set."""
+		if self.usenumpy:
+			values = numpy.asarray(values, dtype=numpy.float64)
+			positions = numpy.flatnonzero(~numpy.isnan(values)).tolist()
+			values = values.tolist()
+		else:
+			positions = [i for i, v in enumerate(values) if v == v]
+		return self.GetEntryItems(accessor, [(i, values[i]) for i in positions])
+
+	def GetEntryItems(self, accessor, entries):
+		"""Gets (param, value) pairs for setting a set of (position, value)
+		pairs of entries. Parts of vectors that aren't included keep their
+		current values, or if they don't have one, take the value or default
+		from the schema (of the part, or else of the param). Vectors which
+		would still have parts without values are left out, since they can't
+		be sent."""
+		items = []
+		vectors = {}
+		for position, value in entries:
+			param = self.params[position]
+			partindex = self.partindices[position]
+			if partindex is None:
+				items.append((param, int(value) if param.ptype == ParamType.int else value))
+				continue
+			vector = vectors.get(param.path)
+			if vector is None:
+				defaults = self._partdefaults[param.path]
+				current = list(accessor.GetParam(param) or ())[:len(defaults)]
+				current += defaults[len(current):]
+				vector = vectors[param.path] = [
+					v if v is not None else d
+					for v, d in zip(current, defaults)
+				]
+				items.append((param, vector))
+			vector[partindex] = int(value) if param.ptype == ParamType.ivec else value
+		incomplete = {path for path, vector in vectors.items() if None in vector}
+		if incomplete:
+			items = [item for item in items if item[0].path not in incomplete]
+		return items
+
+def _PartDefault(spec, part, index):
+	for value in (part.value, part.defaultval, _Element(spec.value, index), _Element(spec.defaultval, index)):
+		if value is not None:
+			return value
+	return None
+
+def _Element(values, index):
+	if isinstance(values, (list, tuple)) and index < len(values):
+		return values[index]
+	return None
+
+def _FillVector(values, start, length, vector):
+	if not vector:
+		return
+	for i, v in enumerate(vector[:length]):
+		if v is not None:
+			values[start + i] = v
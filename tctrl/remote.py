@@ -1,47 +1,756 @@
+import asyncio
+import collections
+from enum import Enum
+import heapq
+import socket
+import struct
+import threading
+import time
 import pythonosc.udp_client
-from pythonosc.osc_message_builder import OscMessageBuilder
 from tctrl.model import *
+from tctrl.osc import OscParamEncoder, EncodeOscBundle, DecodeOscPacket
 from tctrl.schema import *
-from tctrl.util import FillToLength
+
+# 1500 byte ethernet MTU minus the IPv4 and UDP headers
+DefaultMaxBundleSize = 1472
+
+# '#bundle' string plus the time tag
+_BundleHeaderSize = 16
+
+def _FloatsEqual(a, b, epsilon):
+	if a is None or b is None:
+		return a is b
+	return abs(a - b) <= epsilon
+
+class SendPolicy:
+	"""Decides which param changes an accessor actually sends.
+	
+	If suppressunchanged is True, a value is not sent when it's the same as
+	the value already stored for the param. Float and fvec values are treated
+	as the same when they differ by at most epsilon. Triggers are always sent.
+	
+	If maxrate is specified, each path is sent at most maxrate times per
+	second. Changes within the window after a send are deferred, replacing
+	any earlier deferred change for the same path, and the latest one is sent
+	when the window ends. The accessor using the policy takes deferred
+	messages with TakeDue() once NextDue() has passed.
+	
+	unchangedcount and ratelimitedcount count the changes that were never
+	sent because they were unchanged or were replaced by a later deferred
+	change."""
+	
+	def __init__(self, suppressunchanged=True, epsilon=1e-6, maxrate=None):
+		self.suppressunchanged = suppressunchanged
+		self.epsilon = epsilon
+		self.maxrate = maxrate
+		self.mininterval = 1.0 / maxrate if maxrate else None
+		self.unchangedcount = 0
+		self.ratelimitedcount = 0
+		self._lastsent = {}
+		self._deferred = {}
+		self._due = []
+		self._lock = threading.Lock()
+
+	@property
+	def suppressedcount(self):
+		return self.unchangedcount + self.ratelimitedcount
+
+	def IsUnchanged(self, ptype, previous, value):
+		"""Checks whether a change from previous to value should be suppressed,
+		counting it if so."""
+		if not self.suppressunchanged or ptype == ParamType.trigger:
+			return False
+		if ptype == ParamType.float:
+			unchanged = _FloatsEqual(previous, value, self.epsilon)
+		elif ptype == ParamType.fvec and isinstance(previous, list) and isinstance(value, list):
+			epsilon = self.epsilon
+			unchanged = len(previous) == len(value) and all(
+				_FloatsEqual(a, b, epsilon) for a, b in zip(previous, value))
+		else:
+			unchanged = previous == value
+		if unchanged:
+			self.unchangedcount += 1
+		return unchanged
+
+	def Admit(self, path, message, now=None):
+		"""Returns True if a message should be sent now, or otherwise defers it
+		until the end of the path's rate window and returns False."""
+		if self.mininterval is None:
+			return True
+		if now is None:
+			now = time.monotonic()
+		with self._lock:
+			if path in self._deferred:
+				self._deferred[path] = message
+				self.ratelimitedcount += 1
+				return False
+			last = self._lastsent.get(path)
+			if last is None or now - last >= self.mininterval:
+				self._lastsent[path] = now
+				return True
+			self._deferred[path] = message
+			heapq.heappush(self._due, (last + self.mininterval, path))
+			return False
+
+	def NextDue(self):
+		"""Gets the time.monotonic() time when the next deferred message is due,
+		or None if there aren't any."""
+		with self._lock:
+			return self._due[0][0] if self._due else None
+
+	def TakeDue(self, now=None):
+		"""Removes and returns the (path, message) pairs of all deferred messages
+		which are due, treating them as sent."""
+		if now is None:
+			now = time.monotonic()
+		taken = []
+		with self._lock:
+			while self._due and self._due[0][0] <= now:
+				_, path = heapq.heappop(self._due)
+				taken.append((path, self._deferred.pop(path)))
+				self._lastsent[path] = now
+		return taken
 
 class OscAccessor(Accessor):
-	def __init__(self, address, port):
+	"""An Accessor which sends parameter changes to the target app over OSC.
+	
+	If batch is True, messages are collected into OSC bundles rather than being
+	sent right away. A bundle is sent once flushinterval seconds have passed
+	since its first message, once adding another message would take it over
+	maxbundlesize bytes, or when Flush() is called. If a path is set more than
+	once within a bundle, only the last value is sent. Messages which are too
+	big for a bundle are sent by themselves, replacing any pending message for
+	the same path.
+	
+	If a SendPolicy is specified, it's used to skip unchanged values and to
+	limit how often each path is sent.
+	
+	Bundles whose flush interval has ended and rate limited messages are sent
+	by a daemon thread, which is started when it's first needed and stopped by
+	Close(), which also sends everything that is still waiting. Exceptions
+	raised while it's sending are counted in errors, and the latest one is
+	kept in lasterror."""
+	
+	def __init__(
+			self,
+			address,
+			port,
+			batch=False,
+			flushinterval=0.005,
+			maxbundlesize=DefaultMaxBundleSize,
+			sendpolicy: SendPolicy=None):
 		super().__init__()
 		self.client = pythonosc.udp_client.UDPClient(address, port)
+		self.batch = batch
+		self.flushinterval = flushinterval
+		self.maxbundlesize = maxbundlesize
+		self.sendpolicy = sendpolicy
+		self.errors = 0
+		self.lasterror = None
+		self._pending = {}
+		self._pendingsize = _BundleHeaderSize
+		self._lock = threading.Lock()
+		self._wakeup = threading.Condition(self._lock)
+		self._thread = None
+		self._closing = False
+		self._flushdue = None
+		self._deferreddue = None
 
 	def SetParam(self, param, value):
+		policy = self.sendpolicy
+		if policy is not None:
+			previous = self.GetParam(param)
 		super().SetParam(param, value)
-		message = self._BuildSetParamMessage(param, value)
-		if message is not None:
-			self.client.send(message)
+		if policy is not None and policy.IsUnchanged(param.ptype, previous, value):
+			return
+		message = _GetEncoder(param).Encode(value)
+		if message is None:
+			return
+		if policy is not None and not policy.Admit(param.path, message):
+			self._ScheduleDeferred()
+			return
+		self._Send(param.path, message)
+
+	def _Send(self, path, message):
+		if self.batch:
+			self._AddToBundle(path, message)
+		else:
+			self._SendDatagram(message, path)
+
+	def _SendDatagram(self, dgram, path=None):
+		# UDPClient.send() only takes pythonosc message and bundle objects, so
+		# messages that are already encoded go straight to its socket. path is
+		# the message's path (or None for a bundle), for instrumentation.
+		client = self.client
+		client._sock.sendto(dgram, (client._address, client._port))
+
+	def _ScheduleDeferred(self):
+		due = self.sendpolicy.NextDue()
+		if due is None:
+			return
+		with self._lock:
+			if self._deferreddue is None or due < self._deferreddue:
+				self._deferreddue = due
+				self._Wake()
+
+	def _Wake(self):
+		# must be called while holding the lock
+		if self._thread is None:
+			if self._closing:
+				return
+			self._thread = threading.Thread(target=self._SendLoop, daemon=True)
+			self._thread.start()
+		self._wakeup.notify()
+
+	def _SendLoop(self):
+		with self._lock:
+			while not self._closing:
+				now = time.monotonic()
+				if self._flushdue is not None and self._flushdue <= now:
+					self._Try(self._SendPending)
+				elif self._deferreddue is not None and self._deferreddue <= now:
+					self._deferreddue = None
+					# sending takes the lock again when batching
+					self._lock.release()
+					try:
+						self._Try(self._SendDeferred)
+					finally:
+						self._lock.acquire()
+				else:
+					dues = [due for due in (self._flushdue, self._deferreddue) if due is not None]
+					self._wakeup.wait(min(dues) - now if dues else None)
+
+	def _Try(self, func):
+		try:
+			func()
+		except Exception as e:
+			self.errors += 1
+			self.lasterror = e
 
-	def _BuildSetParamMessage(self, param, value):
-		message = OscMessageBuilder(address=param.path)
-		for argval, argtype in self._BuildSetParamArgs(param, value):
-			message.add_arg(argval, argtype)
-		return message
+	def _SendDeferred(self):
+		for path, message in self.sendpolicy.TakeDue():
+			self._Send(path, message)
+		self._ScheduleDeferred()
 
-	def _BuildSetParamArgs(
+	def _AddToBundle(self, path, message):
+		# each bundle element is prefixed with its size
+		size = 4 + len(message)
+		with self._lock:
+			previous = self._pending.pop(path, None)
+			if previous is not None:
+				self._pendingsize -= 4 + len(previous)
+			if _BundleHeaderSize + size > self.maxbundlesize:
+				self._SendDatagram(message, path)
+				return
+			if self._pendingsize + size > self.maxbundlesize:
+				self._SendPending()
+			self._pending[path] = message
+			self._pendingsize += size
+			if self._flushdue is None and self.flushinterval is not None:
+				self._flushdue = time.monotonic() + self.flushinterval
+				self._Wake()
+
+	def Flush(self):
+		"""Sends any messages that are waiting to be sent in a bundle."""
+		with self._lock:
+			self._SendPending()
+
+	def _SendPending(self):
+		# must be called while holding the lock
+		self._flushdue = None
+		pending = self._pending
+		self._pending = {}
+		self._pendingsize = _BundleHeaderSize
+		if not pending:
+			return
+		if len(pending) == 1:
+			path, message = pending.popitem()
+			self._SendDatagram(message, path)
+		else:
+			self._SendDatagram(EncodeOscBundle(pending.values()))
+
+	def Close(self):
+		"""Stops the sending thread and sends all rate limited and pending
+		messages, as AsyncOscAccessor.Close does."""
+		with self._lock:
+			self._closing = True
+			thread = self._thread
+			self._thread = None
+			self._deferreddue = None
+			self._wakeup.notify()
+		if thread is not None:
+			thread.join()
+		if self.sendpolicy is not None:
+			for path, message in self.sendpolicy.TakeDue(now=float('inf')):
+				self._Send(path, message)
+		self.Flush()
+
+def _GetEncoder(param: ParamModel):
+	encoder = param.oscencoder
+	if encoder is None:
+		parts = param.spec.parts
+		encoder = param.oscencoder = OscParamEncoder(
+			param.path,
+			param.ptype,
+			length=len(parts) if parts else None)
+	return encoder
+
+class QueuePolicy(Enum):
+	"""How an AsyncOscAccessor handles a message when its send queue is
+	full."""
+	
+	block = 1
+	"""Wait until there is room in the queue."""
+	
+	dropoldest = 2
+	"""Discard the oldest message in the queue to make room."""
+	
+	coalesce = 3
+	"""Replace the queued or waiting message for the same path if there is
+	one, so that only the latest value for each path is sent. Otherwise wait
+	until there is room in the queue."""
+
+class _DoneAwaitable:
+	"""An awaitable which has already completed, returned by SetParam when
+	the message didn't have to wait. It isn't tied to an event loop, unlike a
+	future."""
+
+	def __await__(self):
+		return
+		yield
+
+_Done = _DoneAwaitable()
+
+class AsyncOscAccessor(Accessor):
+	"""An Accessor which sends parameter changes over OSC through an asyncio
+	datagram transport, so that sending never blocks the event loop.
+	
+	SetParam stores the value and queues the message right away, and returns
+	an awaitable which completes once the message is in the queue. Awaiting it
+	is only needed to respect backpressure with the block and coalesce
+	policies, so the accessor can also be used by ParamModel.value. The queue
+	holds at most maxqueue messages, and at most maxqueue more can wait for
+	room in it, after which SetParam raises asyncio.QueueFull. Values that
+	SetParam rejects, including those set after Close(), aren't stored. With
+	the coalesce policy, a message replaces a waiting one for the same path,
+	and they share the awaitable.
+	
+	Queued messages are sent by a task started by Start(), which binds the
+	accessor to the running event loop. If a SendPolicy is specified, it's
+	applied before messages are queued, and rate limited messages are queued
+	by an event loop callback. The accessor can be created anywhere, but its
+	other methods must be called from the event loop's thread."""
+	
+	def __init__(
 			self,
-			param : ParamModel,
-			value):
-		if param.ptype == ParamType.bool:
-			return [(value, None)]
-		elif param.ptype == ParamType.string or param.ptype == ParamType.menu:
-			return [(value, OscMessageBuilder.ARG_TYPE_STRING)]
-		elif param.ptype == ParamType.int:
-			return [(value, OscMessageBuilder.ARG_TYPE_INT)]
-		elif param.ptype == ParamType.float:
-			return [(value, OscMessageBuilder.ARG_TYPE_FLOAT)]
-		elif param.ptype == ParamType.ivec:
-			vals = FillToLength(value, param.length)
-			return [(val, OscMessageBuilder.ARG_TYPE_INT) for val in vals]
-		elif param.ptype == ParamType.fvec:
-			vals = FillToLength(value, param.length)
-			return [(val, OscMessageBuilder.ARG_TYPE_FLOAT) for val in vals]
-		elif param.ptype == ParamType.trigger:
-			return [(1, OscMessageBuilder.ARG_TYPE_INT)]
-		return []
+			address,
+			port,
+			maxqueue=1024,
+			policy=QueuePolicy.block,
+			sendpolicy: SendPolicy=None):
+		super().__init__()
+		self.address = address
+		self.port = port
+		self.maxqueue = maxqueue
+		self.policy = policy
+		self.sendpolicy = sendpolicy
+		self.loop = None
+		self._deferredhandle = None
+		self._deferreddue = None
+		self.droppedcount = 0
+		self._transport = None
+		self._sendtask = None
+		self._closing = False
+		# each queue entry is a [path, message] list and each waiter a [future,
+		# path, message] list, so that coalescing can replace the message in
+		# place
+		self._queue = collections.deque()
+		self._queuedbypath = {}
+		self._waiters = collections.deque()
+		self._waitingbypath = {}
+		self._ready = asyncio.Event()
+
+	async def Start(self):
+		"""Opens the datagram endpoint and starts sending queued messages."""
+		self.loop = asyncio.get_running_loop()
+		self._transport, _ = await self.loop.create_datagram_endpoint(
+			asyncio.DatagramProtocol,
+			remote_addr=(self.address, self.port))
+		self._sendtask = self.loop.create_task(self._SendLoop())
+
+	def SetParam(self, param, value):
+		# values are only stored once they're accepted, so that a rejected
+		# value isn't kept as if the app had received it
+		if self._closing:
+			raise Exception('AsyncOscAccessor is closed')
+		sendpolicy = self.sendpolicy
+		if sendpolicy is not None and sendpolicy.IsUnchanged(param.ptype, self.GetParam(param), value):
+			super().SetParam(param, value)
+			return _Done
+		message = _GetEncoder(param).Encode(value)
+		if message is None:
+			super().SetParam(param, value)
+			return _Done
+		path = param.path
+		if self._IsFull(path):
+			self._RaiseFull()
+		super().SetParam(param, value)
+		if sendpolicy is not None and not sendpolicy.Admit(path, message):
+			self._ScheduleDeferred()
+			return _Done
+		return self._QueueMessage(path, message)
+
+	def _ScheduleDeferred(self):
+		due = self.sendpolicy.NextDue()
+		if due is None or (self._deferredhandle is not None and self._deferreddue <= due):
+			return
+		if self._deferredhandle is not None:
+			self._deferredhandle.cancel()
+		self._deferreddue = due
+		self._deferredhandle = asyncio.get_running_loop().call_later(
+			max(0.0, due - time.monotonic()), self._QueueDeferred)
+
+	def _QueueDeferred(self):
+		self._deferredhandle = None
+		self._QueueDue(self.sendpolicy.TakeDue())
+		self._ScheduleDeferred()
+
+	def _QueueDue(self, messages):
+		# nothing awaits these, so they're dropped if too many are waiting
+		for path, message in messages:
+			try:
+				self._QueueMessage(path, message)
+			except asyncio.QueueFull:
+				self.droppedcount += 1
+
+	def _QueueMessage(self, path, message):
+		coalesce = self.policy == QueuePolicy.coalesce
+		if coalesce:
+			entry = self._queuedbypath.get(path)
+			if entry is not None:
+				entry[1] = message
+				return _Done
+			waiting = self._waitingbypath.get(path)
+			if waiting is not None and not waiting[0].cancelled():
+				waiting[2] = message
+				return waiting[0]
+		if len(self._queue) < self.maxqueue and not self._waiters:
+			self._Enqueue(path, message)
+			return _Done
+		if self.policy == QueuePolicy.dropoldest:
+			self._DropOldest()
+			self._Enqueue(path, message)
+			return _Done
+		if len(self._waiters) >= self.maxqueue:
+			self._RaiseFull()
+		waiting = [asyncio.get_running_loop().create_future(), path, message]
+		self._waiters.append(waiting)
+		if coalesce:
+			self._waitingbypath[path] = waiting
+		return waiting[0]
+
+	def _IsFull(self, path):
+		# whether _QueueMessage would raise QueueFull for a message for the path
+		if self.policy == QueuePolicy.dropoldest or len(self._waiters) < self.maxqueue:
+			return False
+		if self.policy == QueuePolicy.coalesce:
+			if path in self._queuedbypath:
+				return False
+			waiting = self._waitingbypath.get(path)
+			if waiting is not None and not waiting[0].cancelled():
+				return False
+		return True
+
+	def _RaiseFull(self):
+		raise asyncio.QueueFull(
+			'AsyncOscAccessor has %d messages waiting, so SetParam must be awaited' % len(self._waiters))
+
+	def _Enqueue(self, path, message):
+		entry = [path, message]
+		self._queue.append(entry)
+		if self.policy == QueuePolicy.coalesce:
+			self._queuedbypath[path] = entry
+		self._ready.set()
+
+	def _DropOldest(self):
+		path, _ = self._queue.popleft()
+		self.droppedcount += 1
+		if self.policy == QueuePolicy.coalesce:
+			self._queuedbypath.pop(path, None)
+
+	def _AdmitWaiters(self):
+		while self._waiters and len(self._queue) < self.maxqueue:
+			self._Admit(self._waiters.popleft())
+
+	def _Admit(self, waiting):
+		waiter, path, message = waiting
+		if self._waitingbypath.get(path) is waiting:
+			del self._waitingbypath[path]
+		if waiter.cancelled():
+			return
+		entry = self._queuedbypath.get(path) if self.policy == QueuePolicy.coalesce else None
+		if entry is not None:
+			entry[1] = message
+		else:
+			self._Enqueue(path, message)
+		waiter.set_result(None)
+
+	async def _SendLoop(self):
+		while True:
+			await self._ready.wait()
+			self._ready.clear()
+			sent = 0
+			while self._queue:
+				path, message = self._queue.popleft()
+				if self.policy == QueuePolicy.coalesce:
+					self._queuedbypath.pop(path, None)
+				self._SendDatagram(message, path)
+				self._AdmitWaiters()
+				sent += 1
+				if sent % 64 == 0:
+					# let other tasks run during long bursts
+					await asyncio.sleep(0)
+			self._AdmitWaiters()
+			if self._closing and not self._queue and not self._waiters:
+				return
+
+	def _SendDatagram(self, dgram, path=None):
+		self._transport.sendto(dgram)
+
+	async def Close(self):
+		"""Stops accepting new values, waits for all queued, waiting and rate
+		limited messages to be sent and then closes the transport. If the
+		accessor was never started, the waiting messages are cancelled and
+		nothing is sent."""
+		self._closing = True
+		if self._deferredhandle is not None:
+			self._deferredhandle.cancel()
+			self._deferredhandle = None
+			self._QueueDue(self.sendpolicy.TakeDue(now=float('inf')))
+		if self._sendtask is not None:
+			self._ready.set()
+			await self._sendtask
+			self._sendtask = None
+		while self._waiters:
+			self._waiters.popleft()[0].cancel()
+		self._waitingbypath.clear()
+		if self._transport is not None:
+			self._transport.close()
+			self._transport = None
+
+# ConnectionInfo types for the target app's OSC ports. The app's output is
+# what a controller receives.
+OscInputConnectionType = 'oscin'
+OscOutputConnectionType = 'oscout'
+
+def FindConnection(appschema: AppSchema, conntype):
+	"""Gets the first ConnectionInfo of an AppSchema with the specified type, or
+	None if there isn't one."""
+	for conn in appschema.connections or []:
+		if conn.conntype == conntype:
+			return conn
+	return None
+
+def _DecodeBool(arg):
+	return bool(arg)
+
+def _DecodeInt(arg):
+	return int(arg)
+
+def _DecodeFloat(arg):
+	return float(arg)
+
+def _DecodeString(arg):
+	return arg if isinstance(arg, str) else str(arg)
+
+def _DecodeAny(arg):
+	return arg
+
+_ArgDecoders = {
+	ParamType.bool: _DecodeBool,
+	ParamType.int: _DecodeInt,
+	ParamType.ivec: _DecodeInt,
+	ParamType.float: _DecodeFloat,
+	ParamType.fvec: _DecodeFloat,
+	ParamType.string: _DecodeString,
+	ParamType.menu: _DecodeString,
+}
+
+class _InboundAddress:
+	"""An entry in an OscListener's address table. The ParamModel is looked up
+	by its module and param keys the first time that the address is received,
+	so that lazy AppModels only create the models that are actually used."""
+	
+	__slots__ = ('keys', 'ptype', 'partindex', 'length', 'decode', 'param')
+
+	def __init__(self, keys, spec: ParamSpec, partindex=None):
+		self.keys = keys
+		self.ptype = spec.ptype
+		self.partindex = partindex
+		self.length = len(spec.parts) if spec.parts else None
+		self.decode = _ArgDecoders.get(spec.ptype, _DecodeAny)
+		self.param = None
+
+def _BuildAddressTable(app: AppModel):
+	table = {}
+	stack = [(app.path, (), module) for module in reversed(app.spec.children or [])]
+	while stack:
+		parentpath, parentkeys, module = stack.pop()
+		path = '%s/%s' % (parentpath, module.key)
+		keys = parentkeys + (module.key,)
+		for spec in module.params or []:
+			parampath = '%s/%s' % (path, spec.key)
+			paramkeys = keys + (spec.key,)
+			table[parampath] = _InboundAddress(paramkeys, spec)
+			if spec.ptype == ParamType.ivec or spec.ptype == ParamType.fvec:
+				for i, part in enumerate(spec.parts or []):
+					table['%s/%s' % (path, part.key)] = _InboundAddress(paramkeys, spec, partindex=i)
+		for child in reversed(module.children or []):
+			stack.append((path, keys, child))
+	return table
+
+def _ResolveParam(app: AppModel, keys):
+	node = app
+	for key in keys[:-1]:
+		node = node.children[key]
+	return node.params[keys[-1]]
+
+class OscListener:
+	"""Receives OSC messages from the target app and stores the values in the
+	AppModel's accessor, so that it stays in sync with changes made in the app
+	itself.
+	
+	Addresses are matched against a table of param paths which is built once
+	from the AppModel's schema. Parts of ivec and fvec params are matched by
+	their keys within the module, like the params themselves.
+	Values are stored with Accessor.UpdateParam, so they aren't sent back to
+	the app. Messages for a single vector part update just that element of the
+	stored value. If onchange is specified, it's called with the ParamModel and
+	the new value after each update, and with a value of None for triggers.
+	
+	If host or port aren't specified they are taken from the schema's
+	OscOutputConnectionType connection. Receiving runs either on a thread
+	started by Start() or on the event loop with StartAsync(). In the threaded
+	mode, the accessor is updated and onchange is called on the receiving
+	thread."""
+	
+	def __init__(self, app: AppModel, host=None, port=None, onchange=None):
+		if host is None or port is None:
+			conn = FindConnection(app.spec, OscOutputConnectionType)
+			if conn is None and port is None:
+				raise Exception('No port specified and schema has no %r connection' % OscOutputConnectionType)
+			if conn is not None:
+				host = conn.host if host is None else host
+				port = conn.port if port is None else port
+		self.app = app
+		self.host = host or '0.0.0.0'
+		self.port = port
+		self.onchange = onchange
+		self.addresses = _BuildAddressTable(app)
+		self.receivedcount = 0
+		self.unmatchedcount = 0
+		self.errorcount = 0
+		self.localaddress = None
+		self._socket = None
+		self._thread = None
+		self._transport = None
+		self._stopping = False
+
+	def HandleDatagram(self, dgram):
+		"""Decodes an OSC message or bundle and applies all of the param values
+		that it contains."""
+		try:
+			messages = DecodeOscPacket(dgram)
+		except (ValueError, struct.error):
+			self.errorcount += 1
+			return
+		accessor = self.app.accessor
+		for address, args in messages:
+			entry = self.addresses.get(address)
+			if entry is None:
+				self.unmatchedcount += 1
+				continue
+			param = entry.param
+			if param is None:
+				param = entry.param = _ResolveParam(self.app, entry.keys)
+			try:
+				value = self._DecodeValue(entry, param, args)
+			except (IndexError, TypeError, ValueError):
+				self.errorcount += 1
+				continue
+			if entry.ptype != ParamType.trigger:
+				accessor.UpdateParam(param, value)
+			self.receivedcount += 1
+			if self.onchange is not None:
+				self.onchange(param, value)
+
+	def _DecodeValue(self, entry, param, args):
+		ptype = entry.ptype
+		if ptype == ParamType.trigger:
+			return None
+		decode = entry.decode
+		if entry.partindex is not None:
+			current = self.app.accessor.GetParam(param)
+			value = list(current) if isinstance(current, list) else []
+			if len(value) < entry.length:
+				value.extend([None] * (entry.length - len(value)))
+			value[entry.partindex] = decode(args[0])
+			return value
+		if ptype == ParamType.ivec or ptype == ParamType.fvec:
+			return [decode(arg) for arg in args]
+		if len(args) != 1 and ptype == ParamType.other:
+			return list(args)
+		return decode(args[0])
+
+	def Start(self):
+		"""Binds the port and starts receiving on a daemon thread."""
+		self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self._socket.bind((self.host, self.port))
+		self._socket.settimeout(0.1)
+		self.localaddress = self._socket.getsockname()
+		self._stopping = False
+		self._thread = threading.Thread(target=self._ReceiveLoop, daemon=True)
+		self._thread.start()
+
+	def _ReceiveLoop(self):
+		sock = self._socket
+		while not self._stopping:
+			try:
+				dgram = sock.recv(65536)
+			except socket.timeout:
+				continue
+			except OSError:
+				if self._stopping:
+					return
+				raise
+			self.HandleDatagram(dgram)
+
+	async def StartAsync(self):
+		"""Binds the port and starts receiving on the running event loop."""
+		self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+			lambda: _OscListenerProtocol(self),
+			local_addr=(self.host, self.port))
+		self.localaddress = self._transport.get_extra_info('sockname')
+
+	def Stop(self):
+		"""Stops receiving and closes the port."""
+		self._stopping = True
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+		if self._socket is not None:
+			self._socket.close()
+			self._socket = None
+		if self._transport is not None:
+			self._transport.close()
+			self._transport = None
+
+class _OscListenerProtocol(asyncio.DatagramProtocol):
+	def __init__(self, listener: OscListener):
+		self.listener = listener
+
+	def datagram_received(self, data, addr):
+		self.listener.HandleDatagram(data)
 
 class RemoteNode:
 	def __init__(self, key, path):
@@ -1,5 +1,8 @@
+import copy
 from enum import Enum
+import hashlib
 import json
+import weakref
 from tctrl.util import CleanDict, MergeDicts, GetByKey
 
 class ParamType(Enum):
@@ -19,36 +22,559 @@ class ParamType(Enum):
 def _NodeListToJson(nodes):
 	if not nodes:
 		return None
-	return [n.JsonDict for n in nodes]
+	return [n._GetJsonDict() for n in PeekNodes(nodes)]
+
+def _CopyJsonValue(value):
+	if value.__class__ is dict:
+		return {k: _CopyJsonValue(v) for k, v in value.items()}
+	if value.__class__ is list:
+		return [_CopyJsonValue(v) for v in value]
+	return value
+
+_StructuralAttrs = frozenset([
+	'key',
+	'path',
+	'children',
+	'params',
+	'parts',
+	'moduletypes',
+])
+
+_NodeListAttrs = frozenset([
+	'children',
+	'params',
+	'parts',
+	'options',
+	'paramgroups',
+	'childgroups',
+	'optionlists',
+	'moduletypes',
+	'connections',
+])
+
+_objsetattr = object.__setattr__
+
+class _NodeList(list):
+	"""A list of child nodes held by a tracked schema node. It records the
+	owner as a parent of each node added to it, and reports in-place changes
+	to the owner. Copying or pickling it produces a plain list."""
+	
+	__slots__ = ('_owner', '_attrname')
+
+	def __init__(self, owner, attrname, items=()):
+		super().__init__(items)
+		self._owner = owner
+		self._attrname = attrname
+		for item in self:
+			_AddParent(item, owner)
+
+	def __reduce_ex__(self, protocol):
+		return list, (list(self),)
+
+	def _Touch(self):
+		if self._attrname in _StructuralAttrs:
+			_InvalidateStructure(self._owner)
+		self._owner.MarkChanged()
+
+	def __setitem__(self, index, value):
+		super().__setitem__(index, value)
+		for item in (value if isinstance(index, slice) else [value]):
+			_AddParent(item, self._owner)
+		self._Touch()
+
+	def __delitem__(self, index):
+		super().__delitem__(index)
+		self._Touch()
+
+	def __iadd__(self, other):
+		other = list(other)
+		result = super().__iadd__(other)
+		for item in other:
+			_AddParent(item, self._owner)
+		self._Touch()
+		return result
+
+	def append(self, item):
+		super().append(item)
+		_AddParent(item, self._owner)
+		self._Touch()
+
+	def extend(self, items):
+		items = list(items)
+		super().extend(items)
+		for item in items:
+			_AddParent(item, self._owner)
+		self._Touch()
+
+	def insert(self, index, item):
+		super().insert(index, item)
+		_AddParent(item, self._owner)
+		self._Touch()
+
+	def remove(self, item):
+		super().remove(item)
+		self._Touch()
+
+	def pop(self, *args):
+		item = super().pop(*args)
+		self._Touch()
+		return item
+
+	def clear(self):
+		super().clear()
+		self._Touch()
+
+	def sort(self, *args, **kwargs):
+		super().sort(*args, **kwargs)
+		self._Touch()
+
+	def reverse(self):
+		super().reverse()
+		self._Touch()
+
+class _SharedNodeList:
+	"""A view of a tuple of nodes that is shared by many schema nodes, such as
+	the options embedded from an OptionList. It compares equal to a list of the
+	same nodes. The shared nodes are frozen, and the view never hands them out:
+	the first time that nodes are taken from it (by indexing or iterating it)
+	or it's changed in place, the nodes are copied into a regular list on its
+	owner, which the view then refers to. So each owner only gets its own
+	copies once they're used, and changes to them (including assigning their
+	fields) don't affect the other owners. Serializing, fingerprinting and
+	comparing the owner read the shared nodes without copying them (see
+	PeekNodes)."""
+
+	__slots__ = ('_owner', '_attrname', '_nodes')
+
+	def __init__(self, owner, attrname, nodes):
+		self._owner = owner
+		self._attrname = attrname
+		self._nodes = nodes
+
+	def _Unshare(self):
+		if self._nodes.__class__ is tuple:
+			if self._owner._isfrozen:
+				# the nodes of frozen nodes stay shared
+				_FrozenSetAttr(self._owner, self._attrname, None)
+			# copies of frozen nodes are regular nodes
+			setattr(self._owner, self._attrname, [copy.copy(node) for node in self._nodes])
+			self._nodes = getattr(self._owner, self._attrname)
+		return self._nodes
+
+	def _Take(self):
+		# the nodes to hand out, which are the owner's own copies unless the
+		# owner is frozen as well
+		if self._nodes.__class__ is tuple and self._owner._isfrozen:
+			return self._nodes
+		return self._Unshare()
+
+	def __reduce_ex__(self, protocol):
+		if self._nodes.__class__ is tuple:
+			# the owner is rebound when the owning node's state is restored
+			return _RestoreSharedNodeList, (self._attrname, self._nodes)
+		return list, (list(self._nodes),)
+
+	def __len__(self):
+		return len(self._nodes)
+
+	def __iter__(self):
+		return iter(self._Take())
+
+	def __reversed__(self):
+		return reversed(self._Take())
+
+	def __contains__(self, item):
+		return item in self._nodes
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return list(self._Take()[index])
+		return self._Take()[index]
+
+	def index(self, *args):
+		return self._nodes.index(*args)
+
+	def count(self, item):
+		return self._nodes.count(item)
+
+	def copy(self):
+		return list(self._Take())
+
+	def __add__(self, other):
+		return list(self._Take()) + list(other)
+
+	def __radd__(self, other):
+		return list(other) + list(self._Take())
+
+	def __eq__(self, other):
+		if isinstance(other, (list, tuple, _SharedNodeList)):
+			other = PeekNodes(other)
+			return len(self._nodes) == len(other) and all(a == b for a, b in zip(self._nodes, other))
+		return NotImplemented
+
+	def __ne__(self, other):
+		result = self.__eq__(other)
+		return result if result is NotImplemented else not result
+
+	__hash__ = None
+
+	def __repr__(self):
+		return repr(list(self._nodes))
+
+def PeekNodes(nodes):
+	"""Gets the nodes of a list field for reading, without copying them if
+	they're shared (see ShareNodeList). The result may contain frozen nodes,
+	so it must not be modified."""
+	if nodes.__class__ is _SharedNodeList:
+		return nodes._nodes
+	return nodes
+
+def _CopyOnWrite(name):
+	def _Method(self, *args, **kwargs):
+		return getattr(self._Unshare(), name)(*args, **kwargs)
+	_Method.__name__ = name
+	return _Method
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', 'append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse'):
+	setattr(_SharedNodeList, _name, _CopyOnWrite(_name))
+del _name
+
+def _RestoreSharedNodeList(attrname, nodes):
+	# copied and unpickled nodes start out unfrozen
+	FreezeNodes(nodes)
+	return _SharedNodeList(None, attrname, nodes)
+
+def ShareNodeList(node, attrname, nodes):
+	"""Assigns a tuple of nodes to a list field of a node without copying it,
+	so that the same nodes can be used by any number of nodes. The nodes can
+	also be another node's shared list. They are frozen (see FreezeNodes), and
+	each node gets its own copies of them once they're used. See
+	_SharedNodeList.
+
+	Assigning one node's shared list to another node directly only rebinds
+	it to the new node if that node is tracked, so this should be used to
+	share it with nodes that are still being built."""
+	if nodes.__class__ is _SharedNodeList:
+		nodes = nodes._nodes
+	if nodes.__class__ is not tuple:
+		nodes = tuple(nodes)
+	FreezeNodes(nodes)
+	setattr(node, attrname, _SharedNodeList(node, attrname, nodes))
+
+def FreezeNodes(nodes):
+	"""Makes nodes (and their descendants) read-only, so that they can safely
+	be shared between schemas. Assigning a field of a frozen node raises an
+	AttributeError, and its lists of child nodes become shared tuples.
+	Copies of frozen nodes are regular nodes."""
+	for node in nodes:
+		if not node._isfrozen:
+			_Freeze(node)
+
+def _Freeze(node):
+	_Track(node)
+	for name in node._fields:
+		if name in _NodeListAttrs:
+			children = getattr(node, name, None)
+			if children is None:
+				continue
+			children = tuple(PeekNodes(children))
+			FreezeNodes(children)
+			_objsetattr(node, name, _SharedNodeList(node, name, children))
+	node.__class__ = node._frozenclass
+
+class _ParentRefs(list):
+	"""Weak references to the parents of a node that has more than one. Dead
+	references are pruned whenever the list has doubled in size since it was
+	last pruned."""
+
+	__slots__ = ('_limit',)
+
+def _AddParent(node, parent, isnew=False):
+	# Nodes are usually held by a single parent, but processing can share them
+	# between schemas (and overlays register with their masters), in which case
+	# all of the parents are kept in a _ParentRefs list. Parents are only
+	# weakly referenced, so that a shared node doesn't keep the schemas that it
+	# was used in alive. Parents aren't removed when a node is removed from a
+	# list, which only means that the old parent's cache may get discarded
+	# unnecessarily while it lives. isnew skips checking whether the parent is
+	# already registered.
+	if not isinstance(node, _BaseSchemaNode):
+		return
+	current = getattr(node, '_parent', None)
+	if current is None:
+		_objsetattr(node, '_parent', weakref.ref(parent))
+	elif current.__class__ is weakref.ref:
+		existing = current()
+		if existing is None:
+			_objsetattr(node, '_parent', weakref.ref(parent))
+		elif existing is not parent:
+			parents = _ParentRefs((current, weakref.ref(parent)))
+			parents._limit = 8
+			_objsetattr(node, '_parent', parents)
+	else:
+		if not isnew and any(ref() is parent for ref in current):
+			return
+		current.append(weakref.ref(parent))
+		if len(current) >= current._limit:
+			current[:] = [ref for ref in current if ref() is not None]
+			current._limit = max(8, 2 * len(current))
+
+def _GetParents(node):
+	parent = getattr(node, '_parent', None)
+	if parent is None:
+		return []
+	if parent.__class__ is weakref.ref:
+		parent = parent()
+		return [] if parent is None else [parent]
+	parents = [ref() for ref in parent]
+	return [p for p in parents if p is not None]
+
+def _InvalidateStructure(node):
+	"""Discards the lookup tables that depend on a node's key, path or lists
+	of child nodes: the key tables of the node and its parents, and the
+	SchemaIndex of any AppSchema that contains it. Indexes of other schemas,
+	and the key tables of unrelated parts of the same schema, stay valid."""
+	parents = _GetParents(node)
+	_objsetattr(node, '_keyindex', None)
+	for parent in parents:
+		_objsetattr(parent, '_keyindex', None)
+	nodes = [node] + parents
+	seen = set()
+	while nodes:
+		node = nodes.pop()
+		if id(node) in seen:
+			continue
+		seen.add(id(node))
+		if getattr(node, '_index', None) is not None:
+			_objsetattr(node, '_index', None)
+		nodes += _GetParents(node)
+
+def _TrackedSetAttr(self, name, value):
+	if name[0] == '_':
+		_objsetattr(self, name, value)
+		return
+	if name in _NodeListAttrs and getattr(value, '_owner', None) is not self:
+		if isinstance(value, list):
+			value = _NodeList(self, name, value)
+		elif value.__class__ is _SharedNodeList:
+			# the view is rebound, so that changes through it unshare the
+			# nodes onto this node rather than its previous owner
+			value = _SharedNodeList(self, name, value._nodes)
+	_objsetattr(self, name, value)
+	if name in _StructuralAttrs:
+		_InvalidateStructure(self)
+	self.MarkChanged()
+
+def _FrozenSetAttr(self, name, value):
+	if name[0] == '_':
+		_objsetattr(self, name, value)
+		return
+	raise AttributeError('%s is shared and read-only, so it must be copied before it is modified' % self._nodeclass.__name__)
+
+def _Track(node):
+	"""Switches a node to the tracked version of its class, which reports
+	changes to its fields. Nodes are only tracked once something depends on
+	them staying the same (a SchemaIndex or cached JSON), so that building
+	schemas doesn't pay for change tracking."""
+	if node._istracked:
+		return
+	for name in node._fields:
+		if name in _NodeListAttrs:
+			nodes = getattr(node, name, None)
+			if isinstance(nodes, list) and getattr(nodes, '_owner', None) is not node:
+				_objsetattr(node, name, _NodeList(node, name, nodes))
+	_objsetattr(node, '_jsoncache', None)
+	_objsetattr(node, '_jsontext', None)
+	_objsetattr(node, '_fingerprint', None)
+	node.__class__ = node._trackedclass
 
 class _BaseSchemaNode:
+	"""Base class for schema nodes. Nodes store their fields in __slots__ to
+	keep large schemas compact, and each subclass gets a _fields tuple with
+	the names of its public fields, which are used for equality, copying and
+	pickling.
+	
+	Each subclass also gets a tracked version, which a node is switched to
+	when it's indexed, serialized or fingerprinted. Tracked nodes cache their
+	JsonDict and Fingerprint and discard the caches (along with those of their
+	ancestors) when any of their fields are assigned or their child lists are
+	modified."""
+	
+	__slots__ = ('_keyindex', '_parent', '_jsoncache', '_jsontext', '_fingerprint', '__weakref__')
+	_fields = ()
+	_istracked = False
+	_isfrozen = False
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		if cls.__dict__.get('_istracked'):
+			return
+		cls._fields = tuple(
+			name
+			for klass in reversed(cls.__mro__)
+			for name in klass.__dict__.get('__slots__', ())
+			if not name.startswith('_'))
+		cls._nodelistindices = tuple(
+			i
+			for i, name in enumerate(cls._fields)
+			if name in _NodeListAttrs)
+		cls._nodeclass = cls
+		cls._trackedclass = type(cls.__name__, (cls,), {
+			'__slots__': (),
+			'__module__': cls.__module__,
+			'__qualname__': cls.__qualname__,
+			'__setattr__': _TrackedSetAttr,
+			'_istracked': True,
+		})
+		cls._frozenclass = type(cls.__name__, (cls._trackedclass,), {
+			'__slots__': (),
+			'__module__': cls.__module__,
+			'__qualname__': cls.__qualname__,
+			'__setattr__': _FrozenSetAttr,
+			'_istracked': True,
+			'_isfrozen': True,
+		})
+
+	def __getstate__(self):
+		return _PublicAttrs(self)
+
+	def __setstate__(self, state):
+		for name, value in state.items():
+			if value.__class__ is _SharedNodeList:
+				value = _SharedNodeList(self, name, value._nodes)
+			_objsetattr(self, name, value)
+
+	def __reduce_ex__(self, protocol):
+		# copies and unpickled nodes always start out untracked
+		return _NewNode, (self._nodeclass,), self.__getstate__()
+
+	def _GetKeyIndex(self, attrname):
+		if not self._istracked:
+			return None
+		keyindex = getattr(self, '_keyindex', None)
+		if keyindex is None:
+			return None
+		return keyindex.get(attrname)
+
+	def MarkChanged(self):
+		"""Discards the cached JSON and fingerprint of this node and its
+		ancestors. Assigning a field or modifying a list of child nodes does
+		this automatically, but it needs to be called after modifying other
+		fields in place, such as the tags list or properties dict."""
+		if not self._istracked:
+			return
+		nodes = [self]
+		while nodes:
+			node = nodes.pop()
+			if node is not self and node._jsoncache is None and node._jsontext is None and node._fingerprint is None:
+				# the ancestors of an uncached node are never cached
+				continue
+			_objsetattr(node, '_jsoncache', None)
+			_objsetattr(node, '_jsontext', None)
+			_objsetattr(node, '_fingerprint', None)
+			nodes += _GetParents(node)
+
 	@property
 	def JsonDict(self):
+		"""A dict of the node's fields in JSON form. The JSON is cached, but
+		each access returns a new copy of it, so it can be modified freely."""
+		return _CopyJsonValue(self._GetJsonDict())
+
+	def _GetJsonDict(self):
+		# the cached dict, which is shared with the cached dicts of the node's
+		# ancestors, so it must not be modified
+		if not self._istracked:
+			_Track(self)
+		jsondict = self._jsoncache
+		if jsondict is None:
+			jsondict = self._BuildJsonDict()
+			_objsetattr(self, '_jsoncache', jsondict)
+		return jsondict
+
+	def _BuildJsonDict(self):
 		raise NotImplementedError()
 
+	def Fingerprint(self):
+		"""A 16 byte digest of the node's fields, including all of its
+		descendants. Nodes that are equal have the same fingerprint, so
+		comparing fingerprints can skip whole subtrees that haven't changed.
+		Sets and dicts are sorted before hashing, so fingerprints don't depend
+		on insertion order or Python's hash randomization and are the same
+		across processes. This is cached in the same way as JsonDict."""
+		if not self._istracked:
+			_Track(self)
+		fingerprint = self._fingerprint
+		if fingerprint is None:
+			values = [getattr(self, name, None) for name in self._fields]
+			for i in self._nodelistindices:
+				nodes = values[i]
+				if nodes:
+					values[i] = [node.Fingerprint() for node in PeekNodes(nodes)]
+			for i, value in enumerate(values):
+				if value.__class__ in _ContainerTypes:
+					values[i] = _CanonicalValue(value)
+			values.append(self._nodeclass.__name__)
+			fingerprint = hashlib.blake2b(repr(values).encode(), digest_size=16).digest()
+			_objsetattr(self, '_fingerprint', fingerprint)
+		return fingerprint
+
 	def ToJson(self, **kwargs):
 		dumpargs = {'sort_keys': True}
 		dumpargs.update(kwargs)
-		return json.dumps(self.JsonDict, **dumpargs)
+		jsondict = self._GetJsonDict()
+		if self._jsontext is not None and self._jsontext[0] == dumpargs:
+			return self._jsontext[1]
+		text = json.dumps(jsondict, **dumpargs)
+		_objsetattr(self, '_jsontext', (dumpargs, text))
+		return text
 
 	def __repr__(self):
-		return '%s(%r)' % (self.__class__.__name__, self.JsonDict)
+		return '%s(%r)' % (self._nodeclass.__name__, self._GetJsonDict())
 
 	def __eq__(self, other):
-		if not isinstance(other, self.__class__):
+		if not isinstance(other, self._nodeclass):
 			return False
-		return self.__dict__ == other.__dict__
+		for name in self._fields:
+			if getattr(self, name, None) != getattr(other, name, None):
+				return False
+		return True
+
+_ContainerTypes = frozenset([list, tuple, dict, set, frozenset])
+
+def _CanonicalValue(value):
+	# sets and dicts are sorted, so that the repr of the result doesn't depend
+	# on insertion order or on hash randomization
+	cls = value.__class__
+	if cls is dict:
+		return ('dict', sorted(((k, _CanonicalValue(v)) for k, v in value.items()), key=repr))
+	if cls is set or cls is frozenset:
+		return ('set', sorted((_CanonicalValue(v) for v in value), key=repr))
+	if cls is list:
+		return [_CanonicalValue(v) for v in value]
+	if cls is tuple:
+		return tuple(_CanonicalValue(v) for v in value)
+	return value
+
+def _NewNode(cls):
+	return cls.__new__(cls)
+
+def _PublicAttrs(node):
+	return {
+		name: getattr(node, name, None)
+		for name in node._fields
+	}
 
 class ParamOption(_BaseSchemaNode):
 	"""A selectable option for a menu parameter or a string parameter that
 	provides a set of suggested options."""
 	
+	__slots__ = ('key', 'label')
+
 	def __init__(self, key, label):
 		self.key = key
 		self.label = label
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return {'key': self.key, 'label': self.label}
 
 class OptionList(_BaseSchemaNode):
@@ -56,6 +582,8 @@ class OptionList(_BaseSchemaNode):
 	can reference as an alternative to specifying options directly in the
 	parameter schema."""
 	
+	__slots__ = ('key', 'label', 'options')
+
 	def __init__(self,
 							 key,
 							 label=None,
@@ -64,8 +592,7 @@ class OptionList(_BaseSchemaNode):
 		self.label = label
 		self.options = options or []
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return CleanDict({
 			'key': self.key,
 			'label': self.label,
@@ -75,6 +602,18 @@ class OptionList(_BaseSchemaNode):
 class ParamPartSpec(_BaseSchemaNode):
 	"""A part of a multi-part ParamSpec (ivec or fvec)."""
 	
+	__slots__ = (
+		'key',
+		'path',
+		'label',
+		'minlimit',
+		'maxlimit',
+		'minnorm',
+		'maxnorm',
+		'defaultval',
+		'value',
+	)
+
 	def __init__(self,
 	             key,
 	             path=None,
@@ -95,8 +634,7 @@ class ParamPartSpec(_BaseSchemaNode):
 		self.defaultval = defaultval
 		self.value = value
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return CleanDict({
 			'key': self.key,
 			'path': self.path,
@@ -113,6 +651,32 @@ class ParamSpec(_BaseSchemaNode):
 	"""Defines a controllable parameter of a ModuleSpec. The parameter's
 	ParamType defines which fields of the ParamSpec are used."""
 	
+	__slots__ = (
+		'key',
+		'label',
+		'ptype',
+		'path',
+		'othertype',
+		'minlimit',
+		'maxlimit',
+		'minnorm',
+		'maxnorm',
+		'defaultval',
+		'value',
+		'valueindex',
+		'parts',
+		'style',
+		'group',
+		'options',
+		'optionlist',
+		'tags',
+		'help',
+		'offhelp',
+		'buttontext',
+		'buttonofftext',
+		'properties',
+	)
+
 	def __init__(
 			self,
 			key,
@@ -201,8 +765,7 @@ class ParamSpec(_BaseSchemaNode):
 		"""An optional dict of arbitrary additional attributes. This is
 		typically used for unrecognized fields when parsing from JSON."""
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return MergeDicts(
 			CleanDict(self.properties),
 			CleanDict({
@@ -230,15 +793,88 @@ class ParamSpec(_BaseSchemaNode):
 				'tags': _TagsToJsList(self.tags),
 			}))
 
+class _OverlayMixin:
+	"""Falls back to the master node for any public fields that haven't been
+	assigned. Overlays report their master's class as their _nodeclass, so
+	they compare equal to, serialize the same as, and are copied or pickled
+	as fully materialized nodes of that class."""
+
+	__slots__ = ()
+
+	def __getattr__(self, name):
+		if name[0] == '_':
+			raise AttributeError(name)
+		return getattr(self._master, name)
+
+# _copyfields are the fields that can hold mutable values, which overlays
+# copy rather than share
+class _ParamPartOverlay(_OverlayMixin, ParamPartSpec):
+	__slots__ = ('_master',)
+	_copyfields = ('defaultval', 'value')
+
+class _ParamOverlay(_OverlayMixin, ParamSpec):
+	__slots__ = ('_master',)
+	_copyfields = ('defaultval', 'value', 'parts', 'options', 'tags', 'properties')
+
+_ParamPartOverlay._nodeclass = ParamPartSpec
+_ParamOverlay._nodeclass = ParamSpec
+
+_OverlayClasses = {
+	ParamPartSpec: _ParamPartOverlay,
+	ParamSpec: _ParamOverlay,
+}
+
+def CreateOverlay(master, **fields):
+	"""Creates a lightweight version of a ParamSpec or ParamPartSpec which
+	shares all of the master's fields apart from the specified ones, so that
+	many instances of a node (such as the params of module type instances)
+	don't each need a full copy. Changes to the master are seen by its
+	overlays, and discard their cached JSON and fingerprints.
+
+	Mutable fields (such as tags, properties and vector values) are the
+	exception: each overlay gets its own copy of them when it's created, so
+	that modifying them in place only affects that overlay."""
+	cls = _OverlayClasses[master._nodeclass]
+	overlay = cls.__new__(cls)
+	_objsetattr(overlay, '_master', master)
+	_objsetattr(overlay, '_jsoncache', None)
+	_objsetattr(overlay, '_jsontext', None)
+	_objsetattr(overlay, '_fingerprint', None)
+	for name in cls._copyfields:
+		value = getattr(master, name, None)
+		if value is None or name in fields:
+			continue
+		if value.__class__ is _SharedNodeList:
+			_objsetattr(overlay, name, _SharedNodeList(overlay, name, value._nodes))
+		elif value and isinstance(value, (list, dict, set)):
+			if name in _NodeListAttrs:
+				value = copy.deepcopy(value)
+			elif isinstance(value, set):
+				value = set(value)
+			else:
+				value = _CopyJsonValue(value)
+			_objsetattr(overlay, name, value)
+	for name, value in fields.items():
+		_objsetattr(overlay, name, value)
+	# the overlay is registered as a parent of its master, so that changes to
+	# the master are reported to it
+	_Track(master)
+	_AddParent(master, overlay, isnew=True)
+	return overlay
+
 class _BaseParentSchemaNode(_BaseSchemaNode):
+	__slots__ = ('children',)
+
 	def __init__(self, children=None):
 		self.children = children or []
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		raise NotImplementedError()
 
 	def GetChild(self, key):
+		childrenbykey = self._GetKeyIndex('children')
+		if childrenbykey is not None:
+			return childrenbykey.get(key)
 		return GetByKey(self.children, key)
 
 	def EvaluatePath(self, path):
@@ -253,11 +889,38 @@ class _BaseParentSchemaNode(_BaseSchemaNode):
 		else:
 			return self.GetChild(path)
 
+	def WalkModules(self, postorder=False, prune=None):
+		"""Lazily iterates over all of the modules below this node, yielding a
+		(module, parent, depth) tuple for each one, where depth is 1 for the
+		direct children of this node. Modules are yielded before their children
+		by default, or after them if postorder is True. If prune is specified,
+		it is called with each module and the module's children are skipped if
+		it returns True. The traversal does not use recursion, so it can handle
+		arbitrarily deep trees."""
+		stack = [(self, iter(self.children or ()), 1)]
+		while stack:
+			parent, children, depth = stack[-1]
+			child = next(children, None)
+			if child is None:
+				stack.pop()
+				if postorder and stack:
+					yield parent, stack[-1][0], depth - 1
+				continue
+			if not postorder:
+				yield child, parent, depth
+			if prune is not None and prune(child):
+				if postorder:
+					yield child, parent, depth
+				continue
+			stack.append((child, iter(child.children or ()), depth + 1))
+
 class ModuleTypeSpec(_BaseSchemaNode):
 	"""Defines a type of module which is included in an AppSchema and can be
 	referenced by a ModuleSpec as an alternative to directly including full
 	schema information about its parameters."""
 	
+	__slots__ = ('key', 'label', 'params', 'paramgroups')
+
 	def __init__(
 			self,
 			key,
@@ -269,8 +932,7 @@ class ModuleTypeSpec(_BaseSchemaNode):
 		self.params = params or []
 		self.paramgroups = paramgroups or []
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return CleanDict({
 			'key': self.key,
 			'label': self.label,
@@ -279,6 +941,9 @@ class ModuleTypeSpec(_BaseSchemaNode):
 		})
 
 	def GetParam(self, key):
+		paramsbykey = self._GetKeyIndex('params')
+		if paramsbykey is not None:
+			return paramsbykey.get(key)
 		return GetByKey(self.params, key)
 
 class ModuleSpec(_BaseParentSchemaNode):
@@ -288,6 +953,18 @@ class ModuleSpec(_BaseParentSchemaNode):
 	ModuleSpec or it can refer to a named ModuleTypeSpec defined elsewhere in
 	the containing AppSchema."""
 	
+	__slots__ = (
+		'key',
+		'label',
+		'path',
+		'moduletype',
+		'group',
+		'tags',
+		'params',
+		'paramgroups',
+		'childgroups',
+	)
+
 	def __init__(
 			self,
 			key,
@@ -312,8 +989,7 @@ class ModuleSpec(_BaseParentSchemaNode):
 		self.paramgroups = paramgroups or []
 		self.childgroups = childgroups or []
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return CleanDict({
 			'key': self.key,
 			'label': self.label,
@@ -328,6 +1004,9 @@ class ModuleSpec(_BaseParentSchemaNode):
 		})
 
 	def GetParam(self, key):
+		paramsbykey = self._GetKeyIndex('params')
+		if paramsbykey is not None:
+			return paramsbykey.get(key)
 		return GetByKey(self.params, key)
 
 class ConnectionInfo(_BaseSchemaNode):
@@ -336,6 +1015,8 @@ class ConnectionInfo(_BaseSchemaNode):
 	its own ConnectionInfo. So an OSC input port would be defined in a separate
 	ConnectionInfo than an OSC output port."""
 	
+	__slots__ = ('conntype', 'host', 'port')
+
 	def __init__(self,
 	             conntype=None,
 	             host=None,
@@ -344,8 +1025,7 @@ class ConnectionInfo(_BaseSchemaNode):
 		self.host = host
 		self.port = port
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return CleanDict({
 			'type': self.conntype,
 			'host': self.host,
@@ -356,6 +1036,9 @@ class GroupInfo(_BaseSchemaNode):
 	"""Defines metadata about a grouping of elements. Groups can either apply
 	to parameters of ModuleSpec or to child modules in a ModuleSpec or
 	AppSchema."""
+	
+	__slots__ = ('key', 'label', 'tags')
+
 	def __init__(
 		self,
 		key,
@@ -365,8 +1048,7 @@ class GroupInfo(_BaseSchemaNode):
 		self.label = label
 		self.tags = tags
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return CleanDict({
 			'key': self.key,
 			'label': self.label,
@@ -378,6 +1060,21 @@ class AppSchema(_BaseParentSchemaNode):
 	set of hierarchical modules. The AppSchema also contains general metadata
 	about the application as a whole, such as how to communicate with it and how
 	to represent it in a controller application."""
+	
+	__slots__ = (
+		'key',
+		'path',
+		'label',
+		'tags',
+		'description',
+		'connections',
+		'childgroups',
+		'optionlists',
+		'moduletypes',
+		'indexpaths',
+		'_index',
+	)
+
 	def __init__(
 			self,
 			key,
@@ -388,7 +1085,8 @@ class AppSchema(_BaseParentSchemaNode):
 			childgroups=None,
 			optionlists=None,
 			connections=None,
-			moduletypes=None):
+			moduletypes=None,
+			indexpaths=False):
 		super().__init__(children=children)
 		self.key = key
 		self.path = '/' + key
@@ -409,9 +1107,14 @@ class AppSchema(_BaseParentSchemaNode):
 		within the AppSchema. Note that this is a list rather than a dict, but
 		that the ModuleTypeSpecs in the list should have unique values in their
 		key fields."""
+		
+		self.indexpaths = indexpaths
+		"""Whether path and key lookups should use a SchemaIndex, which is built
+		the first time that it's needed and rebuilt after the structure of the
+		schema changes. This trades some memory for constant-time lookups in
+		large schemas."""
 
-	@property
-	def JsonDict(self):
+	def _BuildJsonDict(self):
 		return CleanDict({
 			'key': self.key,
 			'path': self.path,
@@ -425,6 +1128,99 @@ class AppSchema(_BaseParentSchemaNode):
 			'moduleTypes': _NodeListToJson(self.moduletypes),
 		})
 
+	def GetIndex(self):
+		"""Gets the SchemaIndex for this schema, building it if it hasn't been
+		built yet or if the schema's structure has changed since it was
+		built."""
+		index = getattr(self, '_index', None)
+		if index is None:
+			index = self._index = SchemaIndex(self)
+		return index
+
+	def EvaluatePath(self, path):
+		if not self.indexpaths:
+			return super().EvaluatePath(path)
+		if not path:
+			return None
+		return self.GetIndex().modulesbykeypath.get(path)
+
+	def FindByPath(self, path):
+		"""Finds the ModuleSpec, ParamSpec or ParamPartSpec whose path field
+		matches the specified path. Unlike EvaluatePath, this uses the full
+		path of the node rather than the sequence of keys leading to it."""
+		if not path:
+			return None
+		if self.indexpaths:
+			return self.GetIndex().nodesbypath.get(path)
+		return _FindByPath(self.children, path)
+
+def _FindByPath(modules, path):
+	if not modules:
+		return None
+	for module in modules:
+		if module.path == path:
+			return module
+		for param in module.params or []:
+			if param.path == path:
+				return param
+			for part in param.parts or []:
+				if part.path == path:
+					return part
+		node = _FindByPath(module.children, path)
+		if node is not None:
+			return node
+	return None
+
+class SchemaIndex:
+	"""Lookup tables for the nodes of an AppSchema. The tables map key paths
+	(as used by EvaluatePath) to ModuleSpecs, full paths to ModuleSpecs,
+	ParamSpecs and ParamPartSpecs, and each parent's keys to its child
+	modules and params. Where a key or path is used more than once, the
+	first node in schema order wins, matching the linear lookups."""
+	
+	def __init__(self, appschema):
+		self.modulesbykeypath = {}
+		self.nodesbypath = {}
+		_IndexNodeKeys(appschema)
+		keypathprefixes = {id(appschema): ''}
+		for module, parent, _ in appschema.WalkModules():
+			_IndexNodeKeys(module)
+			prefix = keypathprefixes.get(id(parent))
+			if prefix is not None:
+				keypath = prefix + module.key
+				if keypath not in self.modulesbykeypath:
+					self.modulesbykeypath[keypath] = module
+					keypathprefixes[id(module)] = keypath + '/'
+			self._AddPath(module)
+			for param in module.params or []:
+				_Track(param)
+				self._AddPath(param)
+				for part in param.parts or []:
+					_Track(part)
+					self._AddPath(part)
+		for modtype in appschema.moduletypes or []:
+			_IndexNodeKeys(modtype)
+			for param in modtype.params or []:
+				_Track(param)
+
+	def _AddPath(self, node):
+		if node.path and node.path not in self.nodesbypath:
+			self.nodesbypath[node.path] = node
+
+def _IndexNodeKeys(node):
+	_Track(node)
+	tables = {}
+	for attrname in ('children', 'params'):
+		nodes = getattr(node, attrname, None)
+		if nodes is None:
+			continue
+		table = {}
+		for child in nodes:
+			if child.key not in table:
+				table[child.key] = child
+		tables[attrname] = table
+	node._keyindex = tables
+
 def _TagsToJsList(tags):
 	if not tags:
 		return None
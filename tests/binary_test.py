@@ -0,0 +1,77 @@
+import json
+import unittest
+from tctrl.binary import *
+from tctrl.parsing import ReadAppFromObj
+from tctrl.schema import *
+
+def _BuildSchema():
+	return ReadAppFromObj({
+		'key': 'test',
+		'label': 'Test',
+		'tags': ['a', 'b'],
+		'connections': [{'type': 'osc', 'host': 'localhost', 'port': 9000}],
+		'optionLists': [
+			{'key': 'colors', 'options': ['red', {'key': 'green', 'label': 'Green'}]},
+		],
+		'moduleTypes': [
+			{'key': 'fx', 'params': [{'key': 'amt', 'type': 'float', 'default': 0.1}]},
+		],
+		'children': [
+			{
+				'key': 'foo1',
+				'params': [
+					{'key': 'x', 'type': 'float', 'minNorm': 0, 'maxNorm': 1.5, 'default': 2},
+					{'key': 'n', 'type': 'int', 'minLimit': -3000000000, 'maxLimit': 2 ** 62, 'default': -1},
+					{'key': 'v', 'type': 'fvec', 'default': [0.1, 2], 'parts': [{'key': 'v1'}, {'key': 'v2', 'label': 'V\0two'}]},
+					{'key': 'c', 'type': 'menu', 'optionList': 'colors', 'properties': {'k': [1, 'x', None], 'z': {'q': True}}},
+				],
+				'children': [
+					{'key': 'bar', 'params': [{'key': 'on', 'type': 'bool', 'default': True}]},
+					{'key': 'baz', 'moduleType': 'fx', 'children': [{'key': 'deep'}]},
+				],
+			},
+			{'key': 'foo2', 'label': 'Foö 2', 'tags': []},
+		],
+	})
+
+class BinaryFormatTest(unittest.TestCase):
+
+	def test_round_trip(self):
+		appschema = _BuildSchema()
+		loaded = ReadAppFromBinary(WriteAppToBinary(appschema))
+		self.assertEqual(loaded, ReadAppFromObj(json.loads(appschema.ToJson())))
+		self.assertEqual(loaded.ToJson(), appschema.ToJson())
+		self.assertEqual(loaded.EvaluatePath('foo1/baz/deep').key, 'deep')
+
+	def test_empty_app(self):
+		appschema = AppSchema('empty')
+		self.assertEqual(ReadAppFromBinary(WriteAppToBinary(appschema)).ToJson(), appschema.ToJson())
+
+	def test_modules(self):
+		modules = _BuildSchema().children
+		self.assertEqual(ReadModulesFromBinary(WriteModulesToBinary(modules)), modules)
+		self.assertEqual(ReadModulesFromBinary(WriteModulesToBinary([])), [])
+
+	def test_unknown_fields(self):
+		appschema = ReadAppFromObj({
+			'key': 'test',
+			'tags': ['a'],
+			'children': [{'key': 'foo', 'params': [{'key': 'x', 'type': 'float', 'tags': ['b']}]}],
+		})
+		data = WriteAppToBinary(appschema)
+		self.assertEqual(data.count(b'\0tags\0'), 1)
+		# unknown fields are skipped, and fields missing from the file are None
+		loaded = ReadAppFromBinary(data.replace(b'\0tags\0', b'\0tagz\0'))
+		appschema.tags = None
+		appschema.children[0].params[0].tags = None
+		self.assertEqual(loaded, appschema)
+
+	def test_invalid_data(self):
+		data = WriteAppToBinary(_BuildSchema())
+		with self.assertRaises(BinaryFormatException):
+			ReadAppFromBinary(b'JSON' + data[4:])
+		with self.assertRaises(BinaryFormatException):
+			ReadAppFromBinary(data[:len(data) // 2])
+
+if __name__ == '__main__':
+	unittest.main()
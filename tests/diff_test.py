@@ -0,0 +1,94 @@
+import copy
+import json
+import unittest
+from tctrl.diff import *
+from tctrl.parsing import ReadAppFromObj
+from tctrl.schema import *
+
+def _BuildSchema():
+	return ReadAppFromObj({
+		'key': 'test',
+		'label': 'Test',
+		'optionLists': [
+			{'key': 'colors', 'options': ['red', 'green']},
+		],
+		'moduleTypes': [
+			{'key': 'fx', 'params': [{'key': 'amt', 'type': 'float'}]},
+		],
+		'children': [
+			{
+				'key': 'foo1',
+				'params': [
+					{'key': 'x', 'type': 'float', 'minNorm': 0, 'maxNorm': 1},
+					{'key': 'v', 'type': 'fvec', 'parts': [{'key': 'v1'}, {'key': 'v2'}]},
+				],
+				'children': [
+					{'key': 'bar', 'params': [{'key': 'on', 'type': 'bool'}]},
+					{'key': 'baz', 'moduleType': 'fx'},
+				],
+			},
+			{'key': 'foo2', 'label': 'Foo 2'},
+		],
+	})
+
+class DiffTest(unittest.TestCase):
+
+	def _CheckPatch(self, old, new):
+		patch = DiffSchemas(old, new)
+		patch = ReadPatchFromObj(json.loads(patch.ToJson()))
+		patched = copy.deepcopy(old)
+		ApplyPatch(patched, patch)
+		self.assertEqual(patched.ToJson(), new.ToJson())
+		self.assertFalse(DiffSchemas(patched, new))
+		return patch
+
+	def test_unchanged(self):
+		self.assertFalse(DiffSchemas(_BuildSchema(), _BuildSchema()))
+
+	def test_changes(self):
+		old = _BuildSchema()
+		new = _BuildSchema()
+		foo1 = new.children[0]
+		foo1.params[0].maxnorm = 10
+		foo1.params[1].parts[1].label = 'Second'
+		foo1.label = 'Foo 1'
+		foo1.children[0].params.append(ParamSpec('s', ptype=ParamType.string, path='test/foo1/bar/s'))
+		del foo1.children[1]
+		new.children.reverse()
+		new.children.append(ModuleSpec('foo3', path='test/foo3', children=[ModuleSpec('sub', path='test/foo3/sub')]))
+		new.optionlists[0].options.append(ParamOption('blue', 'Blue'))
+		new.moduletypes[0].params[0].label = 'Amount'
+		new.description = 'Changed'
+		patch = self._CheckPatch(old, new)
+		counts = {}
+		for op in patch.ops:
+			counts[op['op']] = counts.get(op['op'], 0) + 1
+		self.assertEqual(counts, {'change': 6, 'add': 2, 'remove': 1, 'reorder': 1})
+
+	def test_unchanged_subtrees_skipped(self):
+		old = _BuildSchema()
+		new = _BuildSchema()
+		new.children[0].children[0].params[0].label = 'On'
+		patch = self._CheckPatch(old, new)
+		self.assertEqual(patch.ops, [{
+			'op': 'change',
+			'type': 'param',
+			'module': ['foo1', 'bar'],
+			'key': 'on',
+			'fields': {'label': 'On'},
+		}])
+
+	def test_duplicate_keys(self):
+		old = _BuildSchema()
+		new = _BuildSchema()
+		new.children.append(ModuleSpec('foo2', label='Another', path='test/foo2'))
+		patch = self._CheckPatch(old, new)
+		self.assertEqual([op['op'] for op in patch.ops], ['replace'])
+
+	def test_invalid_patch(self):
+		patch = SchemaPatch([{'op': 'remove', 'type': 'module', 'parent': ['nope'], 'key': 'x'}])
+		with self.assertRaises(PatchException):
+			ApplyPatch(_BuildSchema(), patch)
+
+if __name__ == '__main__':
+	unittest.main()
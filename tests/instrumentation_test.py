@@ -0,0 +1,68 @@
+import unittest
+from tctrl.instrumentation import *
+from tctrl.model import *
+from tctrl.processing import ProcessAppSchema
+from tctrl.schema import *
+
+def _BuildSchema():
+	return AppSchema(
+		'test',
+		optionlists=[OptionList('colors', options=[ParamOption('red', 'Red')])],
+		children=[
+			ModuleSpec(
+				'foo1',
+				path='test/foo1',
+				params=[
+					ParamSpec('f', ptype=ParamType.float, path='test/foo1/f', group='g'),
+					ParamSpec('c', ptype=ParamType.menu, path='test/foo1/c', optionlist='colors'),
+				]),
+		])
+
+class InstrumentationTest(unittest.TestCase):
+
+	def tearDown(self):
+		DisableInstrumentation()
+
+	def test_histogram(self):
+		hist = LatencyHistogram()
+		self.assertIsNone(hist.Percentile(0.5))
+		for seconds in (0.0000005, 0.000003, 0.000003, 0.002):
+			hist.Add(seconds)
+		self.assertEqual(hist.count, 4)
+		self.assertEqual(hist.Percentile(0.5), 0.000004)
+		self.assertEqual(hist.Percentile(1), 0.002)
+		self.assertEqual(hist.JsonDict['buckets'], [[1, 1], [4, 2], [2048, 1]])
+
+	def test_processing_stages(self):
+		ProcessAppSchema(_BuildSchema(), embedlists=True)
+		self.assertIsNone(GetStats())
+		events = []
+		EnableInstrumentation(profilehook=lambda *args: events.append(args[:2]))
+		ProcessAppSchema(_BuildSchema(), embedlists=True, generateparamgroups=True)
+		stages = GetStats()['stages']
+		self.assertEqual(set(stages), {'copy', 'embedLists', 'generateParamGroups', 'processAppSchema'})
+		self.assertEqual(stages['embedLists']['count'], 1)
+		self.assertIn(('stage', 'processAppSchema'), events)
+		ResetStats()
+		self.assertEqual(GetStats()['stages'], {})
+
+	def test_accessor(self):
+		accessor = ArrayAccessor()
+		app = AppModel(_BuildSchema(), accessor=accessor)
+		instrumentation = Instrumentation()
+		InstrumentAccessor(accessor, instrumentation)
+		self.assertIsInstance(accessor, ArrayAccessor)
+		app.children['foo1'].params['f'].value = 0.5
+		app.children['foo1'].params['c'].value = 'red'
+		self.assertEqual(app.children['foo1'].params['f'].value, 0.5)
+		setparams = instrumentation.GetStats()['setParam']
+		self.assertEqual(setparams['total']['count'], 2)
+		self.assertEqual(setparams['byType']['float']['count'], 1)
+		self.assertEqual(setparams['byModule']['/test/foo1']['count'], 2)
+		UninstrumentAccessor(accessor)
+		self.assertIs(accessor.__class__, ArrayAccessor)
+		app.children['foo1'].params['f'].value = 0.25
+		self.assertEqual(instrumentation.GetStats()['setParam']['total']['count'], 2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+from tctrl.model import *
+from tctrl.schema import *
+
+def _BuildSchema():
+	return AppSchema(
+		'test',
+		children=[
+			ModuleSpec(
+				'foo1',
+				params=[
+					ParamSpec('f', ptype=ParamType.float),
+					ParamSpec('i', ptype=ParamType.int),
+					ParamSpec('b', ptype=ParamType.bool),
+					ParamSpec('s', ptype=ParamType.string),
+				],
+				children=[
+					ModuleSpec(
+						'bar',
+						params=[
+							ParamSpec('v', ptype=ParamType.fvec),
+						]),
+				]),
+		],
+	)
+
+class ArrayAccessorTest(unittest.TestCase):
+
+	def test_slots(self):
+		app = AppModel(_BuildSchema(), accessor=ArrayAccessor())
+		foo1 = app.children['foo1']
+		self.assertEqual(app.paramcount, 5)
+		self.assertEqual(
+			sorted(p.slot for p in list(foo1.params.values()) + list(foo1.children['bar'].params.values())),
+			list(range(5)))
+
+	def test_values(self):
+		accessor = ArrayAccessor()
+		app = AppModel(_BuildSchema(), accessor=accessor)
+		params = app.children['foo1'].params
+		self.assertIsNone(params['f'].value)
+		params['f'].value = 0.25
+		params['i'].value = 3
+		params['b'].value = True
+		params['s'].value = 'abc'
+		self.assertEqual(params['f'].value, 0.25)
+		self.assertIs(type(params['i'].value), int)
+		self.assertEqual(params['i'].value, 3)
+		self.assertIs(params['b'].value, True)
+		self.assertEqual(params['s'].value, 'abc')
+		params['f'].value = None
+		self.assertIsNone(params['f'].value)
+
+	def test_bulk_and_snapshot(self):
+		accessor = ArrayAccessor()
+		app = AppModel(_BuildSchema(), accessor=accessor)
+		params = app.children['foo1'].params
+		vec = app.children['foo1'].children['bar'].params['v']
+		accessor.SetMany([(params['f'], 0.5), (vec, [1.0, 2.0])])
+		snapshot = accessor.Snapshot()
+		before = accessor.GetAll()
+		accessor.SetMany([(params['f'], 0.75), (params['i'], 4), (vec, [3.0])])
+		self.assertNotEqual(accessor.GetAll(), before)
+		accessor.Restore(snapshot)
+		self.assertEqual(accessor.GetAll(), before)
+		self.assertEqual(params['f'].value, 0.5)
+		self.assertIsNone(params['i'].value)
+
+	def test_storage(self):
+		accessor = ArrayAccessor()
+		app = AppModel(_BuildSchema(), accessor=accessor)
+		params = app.children['foo1'].params
+		vec = app.children['foo1'].children['bar'].params['v']
+		vec.value = [1.0, 2.0, 3.0]
+		params['i'].value = 2 ** 53
+		params['f'].value = 0.5
+		# numeric values are in the buffer, and vectors are kept by slot
+		self.assertEqual(accessor.numericvals[params['f'].slot], 0.5)
+		self.assertEqual(accessor.numericvals[params['i'].slot], 2.0 ** 53)
+		self.assertEqual(params['i'].value, 2 ** 53)
+		self.assertEqual(accessor._othervals, {vec.slot: [1.0, 2.0, 3.0]})
+		snapshot = accessor.Snapshot()
+		vec.value = [4.0]
+		self.assertEqual(snapshot.othervals[vec.slot], [1.0, 2.0, 3.0])
+		self.assertEqual(accessor.paramVals, {})
+
+class LazyModelTest(unittest.TestCase):
+
+	def test_lazy(self):
+		accessor = ArrayAccessor()
+		app = AppModel(_BuildSchema(), accessor=accessor, lazy=True)
+		self.assertEqual(app.paramcount, 0)
+		self.assertEqual(list(app.children), ['foo1'])
+		foo1 = app.children['foo1']
+		self.assertIs(app.children['foo1'], foo1)
+		self.assertEqual(foo1.path, '/test/foo1')
+		self.assertEqual(app.paramcount, 0)
+		param = foo1.params['s']
+		self.assertEqual(param.path, '/test/foo1/s')
+		self.assertEqual(param.slot, 0)
+		self.assertEqual(app.paramcount, 1)
+		param.value = 'abc'
+		self.assertEqual(foo1.params['s'].value, 'abc')
+		self.assertEqual(len(foo1.params), 4)
+		self.assertIn('bar', foo1.children)
+		self.assertNotIn('nope', foo1.children)
+		with self.assertRaises(KeyError):
+			foo1.params['nope']
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+import struct
+import unittest
+from tctrl.osc import *
+from tctrl.schema import ParamType
+
+class OscEncodingTest(unittest.TestCase):
+
+	def test_strings(self):
+		self.assertEqual(EncodeOscString('abc'), b'abc\0')
+		self.assertEqual(EncodeOscString('abcd'), b'abcd\0\0\0\0')
+
+	def test_scalars(self):
+		self.assertEqual(
+			OscParamEncoder('/a/x', ParamType.float).Encode(0.5),
+			b'/a/x\0\0\0\0,f\0\0' + struct.pack('>f', 0.5))
+		self.assertEqual(
+			OscParamEncoder('/a/x', ParamType.int).Encode(3),
+			b'/a/x\0\0\0\0,i\0\0' + struct.pack('>i', 3))
+		self.assertEqual(
+			OscParamEncoder('/a/x', ParamType.bool).Encode(False),
+			b'/a/x\0\0\0\0,F\0\0')
+		self.assertEqual(
+			OscParamEncoder('/a/x', ParamType.menu).Encode('foo'),
+			b'/a/x\0\0\0\0,s\0\0foo\0')
+		self.assertEqual(
+			OscParamEncoder('/a/x', ParamType.trigger).Encode(None),
+			b'/a/x\0\0\0\0,i\0\0' + struct.pack('>i', 1))
+		self.assertIsNone(OscParamEncoder('/a/x', ParamType.other).Encode(1))
+
+	def test_vectors(self):
+		encoder = OscParamEncoder('/a/v', ParamType.ivec, length=3)
+		self.assertEqual(
+			encoder.Encode([1, 2]),
+			b'/a/v\0\0\0\0,iii\0\0\0\0' + struct.pack('>iii', 1, 2, 2))
+		encoder = OscParamEncoder('/a/v', ParamType.fvec)
+		self.assertEqual(
+			encoder.Encode([1.0, 2.0]),
+			b'/a/v\0\0\0\0,ff\0' + struct.pack('>ff', 1.0, 2.0))
+
+	def test_bundle(self):
+		message = OscParamEncoder('/a/x', ParamType.int).Encode(3)
+		self.assertEqual(
+			EncodeOscBundle([message]),
+			b'#bundle\0' + struct.pack('>Qi', 1, len(message)) + message)
+
+class OscDecodingTest(unittest.TestCase):
+
+	def test_round_trip(self):
+		cases = [
+			(ParamType.float, None, 0.5, [0.5]),
+			(ParamType.int, None, -3, [-3]),
+			(ParamType.bool, None, True, [True]),
+			(ParamType.string, None, 'abcd', ['abcd']),
+			(ParamType.ivec, 3, [1, 2, 3], [1, 2, 3]),
+			(ParamType.trigger, None, None, [1]),
+		]
+		for ptype, length, value, args in cases:
+			message = OscParamEncoder('/a/x', ptype, length=length).Encode(value)
+			self.assertEqual(DecodeOscMessage(message), ('/a/x', args))
+
+	def test_bundle(self):
+		first = OscParamEncoder('/a/x', ParamType.int).Encode(3)
+		second = OscParamEncoder('/a/yy', ParamType.string).Encode('s')
+		self.assertEqual(
+			DecodeOscPacket(EncodeOscBundle([first, EncodeOscBundle([second])])),
+			[('/a/x', [3]), ('/a/yy', ['s'])])
+
+	def test_malformed(self):
+		with self.assertRaises(ValueError):
+			DecodeOscMessage(b'/a/x\0\0\0\0,q\0\0')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor
+import unittest
+from tctrl.parallel import *
+from tctrl.parsing import ReadAppFromObj, ParseException
+
+def _BuildObj(modulecount):
+	return {
+		'key': 'test',
+		'moduleTypes': [{'key': 'fx', 'params': [{'key': 'amt', 'type': 'float'}]}],
+		'children': [
+			{
+				'key': 'mod%d' % i,
+				'params': [
+					{'key': 'x', 'type': 'float', 'minNorm': 0, 'maxNorm': 1.5, 'default': 0.1},
+					{'key': 'v', 'type': 'ivec', 'default': [1, 2], 'parts': [{'key': 'v1'}, {'key': 'v2'}]},
+					{'key': 'm', 'type': 'menu', 'options': ['a', {'key': 'b', 'label': 'B'}], 'tags': ['t']},
+				],
+				'children': [{'key': 'sub', 'moduleType': 'fx', 'params': [{'key': 'on', 'type': 'bool'}]}],
+			}
+			for i in range(modulecount)
+		],
+	}
+
+class _NoExecutor:
+	def submit(self, *args):
+		raise AssertionError('Small schemas should be read serially')
+
+class ParallelParseTest(unittest.TestCase):
+
+	def test_equal_to_serial(self):
+		obj = _BuildObj(20)
+		with ProcessPoolExecutor(max_workers=2) as pool:
+			appschema = ReadAppFromObjParallel(obj, maxworkers=2, minparams=0, executor=pool)
+			self.assertEqual(appschema, ReadAppFromObj(obj))
+			self.assertEqual(appschema.ToJson(), ReadAppFromObj(obj).ToJson())
+			del obj['children'][5]['key']
+			with self.assertRaises(ParseException):
+				ReadAppFromObjParallel(obj, maxworkers=2, minparams=0, executor=pool)
+
+	def test_threshold(self):
+		obj = _BuildObj(5)
+		appschema = ReadAppFromObjParallel(obj, minparams=100, executor=_NoExecutor())
+		self.assertEqual(appschema, ReadAppFromObj(obj))
+
+if __name__ == '__main__':
+	unittest.main()
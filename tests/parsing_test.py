@@ -0,0 +1,77 @@
+import io
+import json
+import unittest
+from tctrl.parsing import *
+
+_AppObj = {
+	'key': 'app',
+	'label': 'App',
+	'connections': [{'type': 'osc', 'host': 'localhost', 'port': 9000}],
+	'optionLists': [{'key': 'stuff', 'options': ['abc', {'key': 'def', 'label': 'DEF'}]}],
+	'moduleTypes': [
+		{'key': 'mt', 'params': [{'key': 'p', 'type': 'float', 'minNorm': -1.5e3}]},
+	],
+	'children': [
+		{
+			'params': [
+				{
+					'type': 'fvec',
+					'key': 'v',
+					'parts': [{'key': 'x', 'value': 1.25}, {'key': 'y'}],
+					'custom': {'nested': [1, None, True]},
+				},
+				{'key': 'm', 'type': 'menu', 'optionList': 'stuff', 'label': 'Ménu "1"'},
+			],
+			'children': [{'key': 'sub', 'moduleType': 'mt'}],
+			'key': 'mod',
+			'childGroups': [{'key': 'grp'}],
+		},
+		{'key': 'mod2'},
+	],
+}
+
+class StreamingReaderTest(unittest.TestCase):
+
+	def test_matches_obj_reader(self):
+		text = json.dumps(_AppObj, indent=2)
+		expected = ReadAppFromObj(_AppObj)
+		for chunksize in (1, 3, 16, 65536):
+			self.assertEqual(
+				ReadAppFromStream(io.StringIO(text), chunksize=chunksize),
+				expected)
+			self.assertEqual(
+				ReadAppFromStream(io.BytesIO(text.encode('utf-8')), chunksize=chunksize),
+				expected)
+
+	def test_option_list(self):
+		appschema = ReadAppFromObj(_AppObj)
+		param = appschema.children[0].params[1]
+		self.assertEqual(param.optionlist, 'stuff')
+		self.assertNotIn('optionList', param.properties)
+		self.assertEqual(ReadAppFromObj(json.loads(appschema.ToJson())), appschema)
+
+	def test_error_positions(self):
+		cases = [
+			('{"key": "a",\n "x": [1,]}', 2, 10),
+			('{"key": "a"\n "b": 1}', 2, 2),
+			('{"children": [{"label": "x"}], "key": "a"}', 1, 28),
+			('{"key": "a", "children": [1]}', 1, 27),
+			('{"key": "a"', 1, 9),
+			# valid JSON with the wrong kind of value
+			('{"key": "a", "children": "abc"}', 1, 26),
+			('{"key": "a", "children": {"key": "m"}}', 1, 26),
+			('{"key": "a", "children": [{"key": "m",\n "params": 5}]}', 2, 12),
+			('{"key": "a", "children": [{"key": "m", "params": [{"key": "p", "type": "float", "parts": 5}]}]}', 1, 91),
+			('{"key": "a", "children": [{"key": "m", "paramGroups": 3}]}', 1, 56),
+			('{"key": 5}', 1, 10),
+		]
+		for text, line, column in cases:
+			with self.assertRaises(ParseException) as context:
+				ReadAppFromStream(io.StringIO(text), chunksize=4)
+			self.assertEqual(
+				(context.exception.line, context.exception.column),
+				(line, column),
+				text)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,118 @@
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from tctrl.model import *
+from tctrl.presets import PresetStore, PresetFileException
+from tctrl.ranges import numpy
+from tctrl.schema import *
+
+def _BuildSchema(extra=False):
+	params = [
+		ParamSpec('f', ptype=ParamType.float),
+		ParamSpec('i', ptype=ParamType.int),
+		ParamSpec('b', ptype=ParamType.bool),
+		ParamSpec('s', ptype=ParamType.string),
+		ParamSpec('t', ptype=ParamType.trigger),
+		ParamSpec(
+			'v',
+			ptype=ParamType.fvec,
+			parts=[ParamPartSpec('vx'), ParamPartSpec('vy')]),
+	]
+	if extra:
+		params.insert(0, ParamSpec('new', ptype=ParamType.float))
+	return AppSchema('test', children=[ModuleSpec('foo1', params=params)])
+
+class _BatchRecorder(ArrayAccessor):
+	def __init__(self):
+		super().__init__()
+		self.batches = []
+
+	def SetMany(self, items):
+		self.batches.append(sorted((param.key, value) for param, value in items))
+		super().SetMany(items)
+
+class PresetStoreTest(unittest.TestCase):
+
+	def _CheckPresets(self, usenumpy):
+		accessor = _BatchRecorder()
+		app = AppModel(_BuildSchema(), accessor=accessor)
+		params = app.children['foo1'].params
+		store = PresetStore(app, usenumpy=usenumpy)
+		params['f'].value = 0.0
+		params['i'].value = 0
+		params['s'].value = 'a'
+		params['v'].value = [0.0, 1.0]
+		store.Capture('one')
+		params['f'].value = 1.0
+		params['i'].value = 10
+		params['b'].value = True
+		params['s'].value = 'b'
+		params['v'].value = [2.0, 1.0]
+		store.Capture('two')
+
+		accessor.batches.clear()
+		self.assertEqual(store.Recall('two'), 0)
+		self.assertEqual(accessor.batches, [])
+		params['f'].value = 0.5
+		accessor.batches.clear()
+		self.assertEqual(store.Recall('one'), 4)
+		self.assertEqual(accessor.batches, [[('f', 0.0), ('i', 0), ('s', 'a'), ('v', [0.0, 1.0])]])
+		# b had no value in the first preset, so it's left alone
+		self.assertIs(params['b'].value, True)
+
+		morphed = store.Morph('one', 'two', 0.25)
+		self.assertEqual(store.Recall(morphed), 3)
+		self.assertEqual(accessor.batches[-1], [('f', 0.25), ('i', 2), ('v', [0.5, 1.0])])
+		self.assertIs(type(params['i'].value), int)
+
+		with tempfile.TemporaryDirectory() as tmpdir:
+			filepath = os.path.join(tmpdir, 'presets.tcp')
+			store.SaveFile(filepath)
+			# values are matched to params by path when the schema changes
+			app2 = AppModel(_BuildSchema(extra=True), accessor=ArrayAccessor())
+			store2 = PresetStore(app2, usenumpy=usenumpy)
+			loaded = store2.LoadFile(filepath)
+			self.assertEqual([preset.name for preset in loaded], ['one', 'two'])
+			params2 = app2.children['foo1'].params
+			params2['new'].value = 7.0
+			store2.Recall('two')
+			self.assertEqual(
+				[params2[key].value for key in ['new', 'f', 'i', 'b', 's', 'v']],
+				[7.0, 1.0, 10, True, 'b', [2.0, 1.0]])
+			with open(filepath, 'wb') as f:
+				f.write(b'junk')
+			with self.assertRaises(PresetFileException):
+				store2.LoadFile(filepath)
+
+	def test_corrupt_files(self):
+		app = AppModel(_BuildSchema(), accessor=ArrayAccessor())
+		app.presets.Capture('one')
+		self.assertIs(app.presets, app.presets)
+		data = app.presets.ToBytes()
+		def _Pack(payload):
+			return data[:5] + zlib.compress(payload)
+		header = b'{"entries": [], "presets": [{}]}'
+		for corrupt in [
+				b'TCPR',
+				data[:5] + zlib.compress(b'\x01'),
+				_Pack(struct.pack('<I', 4) + b'{"a"'),
+				_Pack(struct.pack('<I', 2) + b'\xff\xfe'),
+				_Pack(struct.pack('<I', 2) + b'[]'),
+				_Pack(struct.pack('<I', len(header)) + header),
+				data[:-1],
+				# value data which isn't a whole number of float64s
+				_Pack(zlib.decompress(data[5:])[:-3])]:
+			with self.assertRaises(PresetFileException):
+				PresetStore(app).FromBytes(corrupt)
+
+	def test_python(self):
+		self._CheckPresets(usenumpy=False)
+
+	@unittest.skipIf(numpy is None, 'numpy is not available')
+	def test_numpy(self):
+		self._CheckPresets(usenumpy=True)
+
+if __name__ == '__main__':
+	unittest.main()
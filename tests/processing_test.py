@@ -1,6 +1,8 @@
 import unittest
+import copy
+import gc
 from tctrl.schema import *
-from tctrl.processing import ProcessAppSchema
+from tctrl.processing import ProcessAppSchema, ProcessingCache
 
 stuff_list = OptionList(
 	'stuff',
@@ -141,5 +143,273 @@ class ProcessingTest(unittest.TestCase):
 			ProcessAppSchema(inputschema, embedlists=True),
 			expected)
 
+	def test_embedlists_shared(self):
+		inputschema = AppSchema(
+			'test',
+			optionlists=[stuff_list],
+			children=[
+				ModuleSpec(
+					'foo1',
+					params=[
+						ParamSpec('stuff1', ptype=ParamType.menu, optionlist='stuff'),
+						ParamSpec('stuff2', ptype=ParamType.menu, optionlist='stuff'),
+					]
+				),
+			],
+		)
+		result = ProcessAppSchema(inputschema, embedlists=True)
+		param1, param2 = result.children[0].params
+		self.assertEqual(param1.options, stuff_list.options)
+		self.assertEqual(stuff_list.options, param2.options)
+		self.assertIs(PeekNodes(param1.options), PeekNodes(param2.options))
+		self.assertIsNot(PeekNodes(param1.options)[0], stuff_list.options[0])
+		self.assertEqual(copy.deepcopy(result), result)
+		# serializing doesn't copy them
+		result.ToJson()
+		self.assertIs(PeekNodes(param1.options), PeekNodes(param2.options))
+
+		# editing one param's options copies them first
+		text = result.ToJson()
+		param1.options.append(ParamOption('new', 'New'))
+		param1.options[0] = ParamOption('abc', 'Changed')
+		self.assertEqual(len(param1.options), 4)
+		self.assertEqual(param2.options, stuff_list.options)
+		self.assertNotEqual(result.ToJson(), text)
+		self.assertIn('Changed', result.ToJson())
+		self.assertEqual(copy.copy(param2).options, stuff_list.options)
+
+		# the shared nodes are read-only, but a param's options can be edited,
+		# since they're copied when they're taken from the list
+		with self.assertRaises(AttributeError):
+			PeekNodes(param2.options)[0].label = 'X'
+		param1.options[1].label = 'Copied'
+		self.assertIn('Copied', result.ToJson())
+		self.assertEqual(param2.options, stuff_list.options)
+		self.assertEqual([o.key for o in [ParamOption('a', 'A')] + param1.options], ['a', 'abc', 'def', 'xyz', 'new'])
+
+		# assigning a shared list to another param rebinds it
+		param1.options = param2.options
+		param1.options.append(ParamOption('new', 'New'))
+		self.assertEqual(len(param1.options), 4)
+		self.assertEqual(param2.options, stuff_list.options)
+		param3 = ParamSpec('stuff3', ptype=ParamType.menu)
+		ShareNodeList(param3, 'options', param2.options)
+		param3.options.append(ParamOption('new', 'New'))
+		self.assertEqual(param2.options, stuff_list.options)
+
+		# copies and unpickled shared lists are still frozen
+		copied = copy.deepcopy(result).children[0].params[1]
+		with self.assertRaises(AttributeError):
+			PeekNodes(copied.options)[0].label = 'X'
+
+	def test_embedlists_edit_option(self):
+		inputschema = AppSchema(
+			'test',
+			optionlists=[stuff_list],
+			children=[
+				ModuleSpec(
+					'foo1',
+					params=[
+						ParamSpec('stuff%d' % i, ptype=ParamType.menu, optionlist='stuff')
+						for i in range(3)
+					]
+				),
+			],
+		)
+		result = ProcessAppSchema(inputschema, embedlists=True)
+		param1, param2, param3 = result.children[0].params
+		text = param2.ToJson()
+		option = param1.options[0]
+		option.label = 'Changed'
+		self.assertIs(param1.options[0], option)
+		self.assertEqual(param1.options[0].label, 'Changed')
+		self.assertIn('Changed', param1.ToJson())
+		# the other params still share the original options
+		self.assertEqual(param2.ToJson(), text)
+		self.assertEqual(param3.options, stuff_list.options)
+		self.assertIs(PeekNodes(param2.options), PeekNodes(param3.options))
+		self.assertEqual(stuff_list.options[0].label, 'ABC')
+		# and editing another param's options copies them for it alone
+		for option in param3.options:
+			option.label = option.label.lower()
+		self.assertEqual([o.label for o in param3.options], ['abc', 'def', 'xyz'])
+		self.assertEqual(param2.ToJson(), text)
+
+	def test_sharenodes(self):
+		def _BuildSchema():
+			return AppSchema(
+				'test',
+				optionlists=[stuff_list],
+				children=[
+					ModuleSpec(
+						'foo1',
+						label='Foo 1',
+						params=[
+							ParamSpec(
+								'stuff1',
+								ptype=ParamType.menu,
+								optionlist='stuff',
+								group='grp',
+							),
+							ParamSpec(
+								'nonmenu',
+								ptype=ParamType.float,
+							),
+						]
+					),
+					ModuleSpec(
+						'foo2',
+						label='Foo 2',
+						params=[
+							ParamSpec(
+								'nonmenu',
+								ptype=ParamType.float,
+							),
+						]
+					),
+				],
+			)
+		inputschema = _BuildSchema()
+		options = dict(embedlists=True, generateparamgroups=True)
+		shared = ProcessAppSchema(inputschema, sharenodes=True, **options)
+
+		self.assertEqual(shared, ProcessAppSchema(inputschema, **options))
+		self.assertEqual(inputschema, _BuildSchema())
+		self.assertIsNot(shared, inputschema)
+		self.assertIsNot(shared.children[0], inputschema.children[0])
+		self.assertIsNot(shared.children[0].params[0], inputschema.children[0].params[0])
+		self.assertIs(shared.children[0].params[1], inputschema.children[0].params[1])
+		self.assertIs(shared.children[1], inputschema.children[1])
+
+	def test_embedmoduletypes(self):
+		inputschema = AppSchema(
+			'test',
+			moduletypes=[
+				ModuleTypeSpec(
+					'fx',
+					params=[
+						ParamSpec('amt', ptype=ParamType.float, minnorm=0, maxnorm=1, tags=['a']),
+						ParamSpec(
+							'v',
+							ptype=ParamType.fvec,
+							parts=[ParamPartSpec('vx', label='X'), ParamPartSpec('vy')]),
+					],
+					paramgroups=[GroupInfo('grp')],
+				),
+			],
+			children=[
+				ModuleSpec('fx1', path='/test/fx1', moduletype='fx'),
+				ModuleSpec('fx2', path='/test/fx2', moduletype='fx'),
+			],
+		)
+		def _Expected(path):
+			return [
+				ParamSpec('amt', ptype=ParamType.float, path=path + ':amt', minnorm=0, maxnorm=1, tags=['a']),
+				ParamSpec(
+					'v',
+					ptype=ParamType.fvec,
+					path=path + ':v',
+					parts=[
+						ParamPartSpec('vx', path=path + ':vv', label='X'),
+						ParamPartSpec('vy', path=path + ':vv'),
+					]),
+			]
+		result = ProcessAppSchema(inputschema, embedmoduletypes=True, sharenodes=True)
+		fx1, fx2 = result.children
+		self.assertEqual(fx1.params, _Expected('/test/fx1'))
+		self.assertEqual(fx2.params, _Expected('/test/fx2'))
+		self.assertEqual(
+			fx1.ToJson(),
+			ModuleSpec('fx1', path='/test/fx1', moduletype='fx', params=_Expected('/test/fx1'), paramgroups=[GroupInfo('grp')]).ToJson())
+		# the instances share the module type's params rather than copying them,
+		# apart from mutable fields
+		self.assertIs(fx1.params[0]._master, fx2.params[0]._master)
+		self.assertIsNot(fx1.params[0].tags, fx2.params[0].tags)
+		result.ToJson()
+		fx1.params[0].tags.append('b')
+		fx1.params[0].MarkChanged()
+		self.assertEqual(fx2.params[0].tags, ['a'])
+		self.assertIn('"b"', fx1.ToJson())
+		self.assertNotIn('"b"', fx2.ToJson())
+		self.assertEqual(fx1.params[1].parts[0].label, 'X')
+		self.assertEqual(_Expected('/test/fx2')[0], fx2.params[0])
+		# changes to the shared module type are seen by the instances
+		result.ToJson()
+		inputschema.moduletypes[0].params[0].label = 'Amount'
+		self.assertEqual(fx2.params[0].label, 'Amount')
+		self.assertIn('Amount', result.ToJson())
+
+	def test_embedmoduletypes_groups(self):
+		inputschema = AppSchema(
+			'test',
+			moduletypes=[
+				ModuleTypeSpec(
+					'fx',
+					params=[ParamSpec('amt', ptype=ParamType.float, group='other')],
+					paramgroups=[GroupInfo('grp', label='Group')]),
+			],
+			children=[ModuleSpec('fx%d' % i, path='/test/fx%d' % i, moduletype='fx') for i in range(3)],
+		)
+		for sharenodes in (False, True):
+			for generateparamgroups in (False, True):
+				result = ProcessAppSchema(
+					inputschema,
+					embedmoduletypes=True,
+					generateparamgroups=generateparamgroups,
+					sharenodes=sharenodes)
+				fx0, fx1, fx2 = result.children
+				text = fx1.ToJson()
+				fx0.paramgroups[0].label = 'CHANGED'
+				self.assertIn('CHANGED', fx0.ToJson())
+				self.assertEqual(fx1.paramgroups[0].label, 'Group')
+				self.assertEqual(fx2.ToJson(), text.replace('fx1', 'fx2'))
+				self.assertEqual(inputschema.moduletypes[0].paramgroups[0].label, 'Group')
+				self.assertEqual(
+					[g.key for g in fx2.paramgroups],
+					['grp', 'other'] if generateparamgroups else ['grp'])
+
+	def test_embedmoduletypes_released(self):
+		inputschema = AppSchema(
+			'test',
+			moduletypes=[ModuleTypeSpec('fx', params=[ParamSpec('amt', ptype=ParamType.float)])],
+			children=[ModuleSpec('fx%d' % i, path='/test/fx%d' % i, moduletype='fx') for i in range(5)],
+		)
+		master = inputschema.moduletypes[0].params[0]
+		for _ in range(3):
+			ProcessAppSchema(inputschema, embedmoduletypes=True, sharenodes=True).ToJson()
+		gc.collect()
+		self.assertEqual([ref() for ref in master._parent if ref() is not None], [])
+		# changes to the master only reach the overlays that are still alive
+		result = ProcessAppSchema(inputschema, embedmoduletypes=True, sharenodes=True)
+		result.ToJson()
+		master.label = 'Amount'
+		self.assertIn('Amount', result.ToJson())
+
+	def test_cache(self):
+		def _BuildSchema():
+			return AppSchema(
+				'test',
+				optionlists=[OptionList('things', options=[ParamOption('a', 'A')])],
+				children=[
+					ModuleSpec(
+						'foo1',
+						params=[
+							ParamSpec('things1', ptype=ParamType.menu, optionlist='things'),
+						]
+					),
+				],
+			)
+		cache = ProcessingCache(maxsize=2)
+		result = cache.Process(_BuildSchema(), embedlists=True)
+		self.assertEqual(result, ProcessAppSchema(_BuildSchema(), embedlists=True))
+		self.assertIs(cache.Process(_BuildSchema(), embedlists=True), result)
+		self.assertIs(cache.Process(_BuildSchema(), embedlists=True, striplists=True), result)
+		self.assertIsNot(cache.Process(_BuildSchema()), result)
+		changed = _BuildSchema()
+		changed.children[0].label = 'Changed'
+		self.assertEqual(cache.Process(changed, embedlists=True).children[0].label, 'Changed')
+		self.assertEqual((cache.hits, cache.misses, cache.evictions, len(cache)), (2, 3, 1, 2))
+		self.assertIsNot(cache.Process(_BuildSchema(), embedlists=True), result)
+
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,130 @@
+import time
+import unittest
+from tctrl.model import *
+from tctrl.ramps import RampEngine, Curve
+from tctrl.ranges import numpy
+from tctrl.schema import *
+
+def _BuildSchema():
+	return AppSchema(
+		'test',
+		children=[
+			ModuleSpec(
+				'foo1',
+				params=[
+					ParamSpec('f', ptype=ParamType.float),
+					ParamSpec('g', ptype=ParamType.float),
+					ParamSpec('i', ptype=ParamType.int),
+					ParamSpec('s', ptype=ParamType.string),
+					ParamSpec(
+						'v',
+						ptype=ParamType.fvec,
+						parts=[ParamPartSpec('vx'), ParamPartSpec('vy')]),
+				]),
+		],
+	)
+
+class _BatchRecorder(Accessor):
+	def __init__(self):
+		super().__init__()
+		self.batches = []
+
+	def SetMany(self, items):
+		self.batches.append([(param.key, value) for param, value in items])
+		super().SetMany(items)
+
+class RampEngineTest(unittest.TestCase):
+
+	def _CheckRamps(self, usenumpy):
+		accessor = _BatchRecorder()
+		app = AppModel(_BuildSchema(), accessor=accessor)
+		params = app.children['foo1'].params
+		engine = RampEngine(app, usenumpy=usenumpy)
+		params['f'].value = 0.0
+		params['v'].value = [1.0, 2.0]
+		accessor.batches.clear()
+		engine.Ramp(params['f'], 1.0, 2.0, now=10.0)
+		engine.Ramp(params['g'], 4.0, 2.0, curve=Curve.easein, start=0.0, now=10.0)
+		engine.Ramp(params['i'], 10, 1.0, start=0, now=10.0)
+		engine.Ramp(params['v'], [3.0, 2.0], 1.0, now=10.0)
+		with self.assertRaises(ValueError):
+			engine.Ramp(params['s'], 'x', 1.0)
+		self.assertEqual(engine.activecount, 5)
+
+		self.assertEqual(engine.Tick(11.0), 5)
+		self.assertEqual(accessor.batches, [[('f', 0.5), ('g', 1.0), ('i', 10), ('v', [3.0, 2.0])]])
+		self.assertIs(type(params['i'].value), int)
+		self.assertEqual(engine.activecount, 2)
+
+		# unchanged values aren't sent again, and new ramps replace old ones
+		engine.Ramp(params['g'], 4.0, 1.0, start=2.0, now=11.0)
+		self.assertEqual(engine.Tick(11.0), 2)
+		self.assertEqual(accessor.batches[-1], [('g', 2.0)])
+		engine.Cancel(params['f'])
+		self.assertEqual(engine.Tick(11.5), 1)
+		self.assertEqual(accessor.batches[-1], [('g', 3.0)])
+		self.assertEqual(engine.Tick(13.0), 1)
+		self.assertEqual(engine.Tick(14.0), 0)
+		self.assertEqual(params['f'].value, 0.5)
+		self.assertEqual(params['g'].value, 4.0)
+		self.assertEqual(len(accessor.batches), 4)
+
+	def _CheckEndValues(self, usenumpy):
+		app = AppModel(_BuildSchema())
+		param = app.children['foo1'].params['f']
+		engine = RampEngine(app, usenumpy=usenumpy)
+		# a + (b - a) * 1.0 isn't exactly b for these
+		for start, end in [(3.3, 0.7), (-0.1, 0.3), (1e16, 1.0)]:
+			for curve in Curve:
+				engine.Ramp(param, end, 1.0, curve=curve, start=start, now=0.0)
+				engine.Tick(2.0)
+				self.assertEqual(param.value, end)
+
+	def test_python(self):
+		self._CheckRamps(usenumpy=False)
+		self._CheckEndValues(usenumpy=False)
+
+	@unittest.skipIf(numpy is None, 'numpy is not available')
+	def test_numpy(self):
+		self._CheckRamps(usenumpy=True)
+		self._CheckEndValues(usenumpy=True)
+
+	def test_thread(self):
+		app = AppModel(_BuildSchema())
+		param = app.children['foo1'].params['f']
+		engine = RampEngine(app, rate=200.0)
+		engine.Ramp(param, 1.0, 0.05, start=0.0)
+		engine.Start()
+		deadline = time.monotonic() + 5
+		while engine.activecount and time.monotonic() < deadline:
+			time.sleep(0.01)
+		engine.Stop()
+		self.assertEqual(param.value, 1.0)
+		stats = engine.GetStats()
+		self.assertGreater(stats['ticks'], 1)
+		self.assertEqual(stats['jitter']['count'], stats['ticks'])
+		self.assertIsNotNone(stats['cpuSecondsPerRampTick'])
+
+	def test_thread_errors(self):
+		class _FailingAccessor(Accessor):
+			failures = 2
+			def SetMany(self, items):
+				if self.failures:
+					self.failures -= 1
+					raise ValueError('send failed')
+				super().SetMany(items)
+		app = AppModel(_BuildSchema(), accessor=_FailingAccessor())
+		param = app.children['foo1'].params['f']
+		engine = RampEngine(app, rate=200.0)
+		engine.Ramp(param, 1.0, 0.2, start=0.0)
+		engine.Start()
+		deadline = time.monotonic() + 5
+		while engine.activecount and time.monotonic() < deadline:
+			time.sleep(0.01)
+		engine.Stop()
+		self.assertEqual(param.value, 1.0)
+		self.assertEqual(engine.GetStats()['errors'], 2)
+		self.assertIsInstance(engine.lasterror, ValueError)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,107 @@
+import math
+import unittest
+from tctrl.model import *
+from tctrl.ranges import RangeTable, numpy
+from tctrl.schema import *
+
+def _BuildSchema():
+	return AppSchema(
+		'test',
+		children=[
+			ModuleSpec(
+				'foo1',
+				params=[
+					ParamSpec('f', ptype=ParamType.float, minnorm=-1, maxnorm=1, minlimit=-2, maxlimit=2),
+					ParamSpec('i', ptype=ParamType.int, minnorm=0, maxnorm=10),
+					ParamSpec('s', ptype=ParamType.string),
+					ParamSpec('flat', ptype=ParamType.float, minnorm=3, maxnorm=3),
+				],
+				children=[
+					ModuleSpec(
+						'bar',
+						params=[
+							ParamSpec(
+								'v',
+								ptype=ParamType.fvec,
+								minnorm=0,
+								maxnorm=2,
+								parts=[ParamPartSpec('vx'), ParamPartSpec('vy', minnorm=10, maxnorm=20, maxlimit=15)]),
+							ParamSpec('nolength', ptype=ParamType.fvec),
+						]),
+				]),
+		],
+	)
+
+def _List(values):
+	return [None if math.isnan(v) else v for v in values]
+
+class RangeTableTest(unittest.TestCase):
+
+	def _CheckTable(self, usenumpy):
+		app = AppModel(_BuildSchema(), accessor=ArrayAccessor())
+		table = RangeTable(app, usenumpy=usenumpy)
+		foo1 = app.children['foo1']
+		vec = foo1.children['bar'].params['v']
+		self.assertEqual(len(table), 5)
+		self.assertEqual(table.IndexOf(foo1.params['i']), 1)
+		self.assertEqual(table.IndexOf(vec, 1), 4)
+		self.assertIsNone(table.IndexOf(foo1.params['s']))
+
+		self.assertEqual(_List(table.Normalize([0, 5, 3, 1, 15])), [0.5, 0.5, 0.0, 0.5, 0.5])
+		self.assertEqual(_List(table.Denormalize([0.5, 0.46, 0.5, 0.5, float('nan')])), [0.0, 5.0, 3.0, 1.0, None])
+		self.assertEqual(_List(table.Clamp([-5, 50, 3, 1, 16])), [-2, 50, 3, 1, 15])
+
+		accessor = app.accessor
+		foo1.params['f'].value = 0.5
+		vec.value = [1.5, 12.0]
+		self.assertEqual(_List(table.GetValues(accessor)), [0.5, None, None, 1.5, 12.0])
+		snapshot = accessor.Snapshot()
+		table.SetValues(accessor, table.Denormalize([1, 0.5, float('nan'), float('nan'), 0]))
+		self.assertEqual(foo1.params['f'].value, 1.0)
+		self.assertIs(type(foo1.params['i'].value), int)
+		self.assertEqual(foo1.params['i'].value, 5)
+		self.assertEqual(vec.value, [1.5, 10.0])
+		self.assertEqual(_List(table.GetSnapshotValues(snapshot)), [0.5, None, None, 1.5, 12.0])
+
+		# accessors that don't store values by slot are read param by param
+		app = AppModel(_BuildSchema())
+		table = RangeTable(app, usenumpy=usenumpy)
+		app.children['foo1'].children['bar'].params['v'].value = [1.0, 2.0]
+		self.assertEqual(_List(table.GetValues(app.accessor)), [None, None, None, 1.0, 2.0])
+
+	def test_missing_parts(self):
+		schema = AppSchema('test', children=[
+			ModuleSpec('foo1', params=[
+				ParamSpec(
+					'v',
+					ptype=ParamType.fvec,
+					defaultval=[0.0, 0.5, 0.25],
+					parts=[ParamPartSpec('vx'), ParamPartSpec('vy', value=2.0), ParamPartSpec('vz')]),
+				ParamSpec(
+					'w',
+					ptype=ParamType.ivec,
+					parts=[ParamPartSpec('wx'), ParamPartSpec('wy')]),
+			]),
+		])
+		app = AppModel(schema)
+		table = RangeTable(app, usenumpy=False)
+		params = app.children['foo1'].params
+		# parts without values are taken from the schema
+		self.assertEqual(table.GetEntryItems(app.accessor, [(0, 1.0)]), [(params['v'], [1.0, 2.0, 0.25])])
+		params['v'].value = [3.0, None]
+		self.assertEqual(table.GetEntryItems(app.accessor, [(2, 1.0)]), [(params['v'], [3.0, 2.0, 1.0])])
+		# vectors whose parts aren't all known are left out
+		self.assertEqual(table.GetEntryItems(app.accessor, [(3, 1.0)]), [])
+		self.assertEqual(
+			table.GetEntryItems(app.accessor, [(3, 1.0), (4, 2.0)]),
+			[(params['w'], [1, 2])])
+
+	def test_python(self):
+		self._CheckTable(usenumpy=False)
+
+	@unittest.skipIf(numpy is None, 'numpy is not available')
+	def test_numpy(self):
+		self._CheckTable(usenumpy=True)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,372 @@
+import asyncio
+import socket
+import time
+import unittest
+from tctrl.instrumentation import Instrumentation, InstrumentAccessor
+from tctrl.model import *
+from tctrl.osc import OscParamEncoder, EncodeOscBundle, DecodeOscPacket
+from tctrl.schema import *
+
+try:
+	from tctrl.remote import *
+except ImportError:
+	OscListener = None
+
+def _BuildSchema():
+	return AppSchema(
+		'test',
+		connections=[ConnectionInfo('oscout', 'localhost', 0)],
+		children=[
+			ModuleSpec(
+				'foo1',
+				params=[
+					ParamSpec('f', ptype=ParamType.float),
+					ParamSpec('b', ptype=ParamType.bool),
+					ParamSpec('t', ptype=ParamType.trigger),
+					ParamSpec(
+						'v',
+						ptype=ParamType.ivec,
+						parts=[ParamPartSpec('vx'), ParamPartSpec('vy')]),
+				],
+				children=[
+					ModuleSpec('bar', params=[ParamSpec('s', ptype=ParamType.string)]),
+				]),
+		],
+	)
+
+def _Encode(path, ptype, value, length=None):
+	return OscParamEncoder(path, ptype, length=length).Encode(value)
+
+@unittest.skipIf(OscListener is None, 'pythonosc is not installed')
+class OscListenerTest(unittest.TestCase):
+
+	def test_dispatch(self):
+		for lazy in (False, True):
+			app = AppModel(_BuildSchema(), accessor=ArrayAccessor(), lazy=lazy)
+			changes = []
+			listener = OscListener(app, onchange=lambda p, v: changes.append((p.path, v)))
+			self.assertEqual(listener.port, 0)
+			listener.HandleDatagram(EncodeOscBundle([
+				_Encode('/test/foo1/f', ParamType.float, 0.5),
+				_Encode('/test/foo1/b', ParamType.bool, True),
+				_Encode('/test/foo1/vy', ParamType.int, 4),
+				_Encode('/test/foo1/bar/s', ParamType.string, 'abc'),
+				_Encode('/test/foo1/t', ParamType.trigger, None),
+				_Encode('/test/nope', ParamType.int, 1),
+			]))
+			listener.HandleDatagram(b'garbage')
+			foo1 = app.children['foo1']
+			self.assertEqual(foo1.params['f'].value, 0.5)
+			self.assertIs(foo1.params['b'].value, True)
+			self.assertEqual(foo1.params['v'].value, [None, 4])
+			self.assertEqual(foo1.children['bar'].params['s'].value, 'abc')
+			self.assertEqual(changes[-1], ('/test/foo1/t', None))
+			self.assertEqual(
+				(listener.receivedcount, listener.unmatchedcount, listener.errorcount),
+				(5, 1, 1))
+			listener.HandleDatagram(_Encode('/test/foo1/v', ParamType.ivec, [1, 2], length=2))
+			self.assertEqual(foo1.params['v'].value, [1, 2])
+
+	def _Send(self, address, message):
+		with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+			sock.sendto(message, address)
+
+	def test_thread(self):
+		app = AppModel(_BuildSchema())
+		listener = OscListener(app, host='127.0.0.1')
+		listener.Start()
+		try:
+			self._Send(listener.localaddress, _Encode('/test/foo1/f', ParamType.float, 0.25))
+			deadline = time.monotonic() + 2
+			while listener.receivedcount < 1 and time.monotonic() < deadline:
+				time.sleep(0.01)
+		finally:
+			listener.Stop()
+		self.assertEqual(app.children['foo1'].params['f'].value, 0.25)
+
+	def test_async(self):
+		async def Run():
+			app = AppModel(_BuildSchema())
+			listener = OscListener(app, host='127.0.0.1')
+			await listener.StartAsync()
+			try:
+				self._Send(listener.localaddress, _Encode('/test/foo1/f', ParamType.float, 0.75))
+				for _ in range(200):
+					if listener.receivedcount:
+						break
+					await asyncio.sleep(0.01)
+			finally:
+				listener.Stop()
+			return app.children['foo1'].params['f'].value
+		self.assertEqual(asyncio.run(Run()), 0.75)
+
+@unittest.skipIf(OscListener is None, 'pythonosc is not installed')
+class SendPolicyTest(unittest.TestCase):
+
+	def test_unchanged(self):
+		policy = SendPolicy(epsilon=0.01)
+		self.assertTrue(policy.IsUnchanged(ParamType.float, 0.5, 0.505))
+		self.assertFalse(policy.IsUnchanged(ParamType.float, 0.5, 0.52))
+		self.assertFalse(policy.IsUnchanged(ParamType.float, None, 0.5))
+		self.assertTrue(policy.IsUnchanged(ParamType.fvec, [0.1, None], [0.105, None]))
+		self.assertFalse(policy.IsUnchanged(ParamType.fvec, [0.1, None], [0.1, 0.2]))
+		self.assertTrue(policy.IsUnchanged(ParamType.string, 'a', 'a'))
+		self.assertFalse(policy.IsUnchanged(ParamType.trigger, None, None))
+		self.assertEqual(policy.unchangedcount, 3)
+
+	def test_rate_limit(self):
+		policy = SendPolicy(maxrate=10)
+		self.assertTrue(policy.Admit('/a', b'1', now=0.0))
+		self.assertTrue(policy.Admit('/b', b'1', now=0.01))
+		self.assertFalse(policy.Admit('/a', b'2', now=0.02))
+		self.assertFalse(policy.Admit('/a', b'3', now=0.05))
+		self.assertEqual(policy.NextDue(), 0.1)
+		self.assertEqual(policy.TakeDue(now=0.09), [])
+		self.assertEqual(policy.TakeDue(now=0.1), [('/a', b'3')])
+		self.assertIsNone(policy.NextDue())
+		self.assertFalse(policy.Admit('/a', b'4', now=0.15))
+		self.assertTrue(policy.Admit('/b', b'2', now=0.15))
+		self.assertEqual(policy.ratelimitedcount, 1)
+		self.assertEqual(policy.suppressedcount, 1)
+
+	def test_accessor(self):
+		with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+			sock.bind(('127.0.0.1', 0))
+			sock.settimeout(2)
+			policy = SendPolicy(maxrate=20)
+			accessor = OscAccessor('127.0.0.1', sock.getsockname()[1], sendpolicy=policy)
+			app = AppModel(_BuildSchema(), accessor=accessor)
+			param = app.children['foo1'].params['f']
+			for value in (0.25, 0.25, 0.5, 0.75):
+				param.value = value
+			self.assertEqual(sock.recv(1024), _Encode('/test/foo1/f', ParamType.float, 0.25))
+			self.assertEqual(sock.recv(1024), _Encode('/test/foo1/f', ParamType.float, 0.75))
+			self.assertEqual((policy.unchangedcount, policy.ratelimitedcount), (1, 1))
+			accessor.Close()
+
+	def test_instrumented_sends(self):
+		with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+			sock.bind(('127.0.0.1', 0))
+			sock.settimeout(2)
+			accessor = OscAccessor('127.0.0.1', sock.getsockname()[1])
+			app = AppModel(_BuildSchema(), accessor=accessor)
+			instrumentation = Instrumentation()
+			InstrumentAccessor(accessor, instrumentation)
+			app.children['foo1'].params['f'].value = 0.5
+			message = _Encode('/test/foo1/f', ParamType.float, 0.5)
+			self.assertEqual(sock.recv(1024), message)
+			sends = instrumentation.GetStats()['send']
+			self.assertEqual(sends['byType']['float']['count'], 1)
+			self.assertEqual(sends['bytes'], len(message))
+
+	def test_instrumented_bundles(self):
+		with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+			sock.bind(('127.0.0.1', 0))
+			sock.settimeout(2)
+			accessor = OscAccessor('127.0.0.1', sock.getsockname()[1], batch=True, flushinterval=None)
+			app = AppModel(_BuildSchema(), accessor=accessor)
+			instrumentation = Instrumentation()
+			InstrumentAccessor(accessor, instrumentation)
+			params = app.children['foo1'].params
+			params['f'].value = 0.5
+			params['b'].value = True
+			# nothing has been sent yet
+			self.assertEqual(instrumentation.GetStats()['send']['total']['count'], 0)
+			accessor.Flush()
+			bundle = sock.recv(1024)
+			params['f'].value = 0.25
+			accessor.Flush()
+			message = sock.recv(1024)
+			sends = instrumentation.GetStats()['send']
+			self.assertEqual(sends['total']['count'], 2)
+			self.assertEqual(sends['byType']['bundle']['count'], 1)
+			self.assertEqual(sends['byType']['float']['count'], 1)
+			self.assertEqual(sends['bytes'], len(bundle) + len(message))
+
+@unittest.skipIf(OscListener is None, 'pythonosc is not installed')
+class OscAccessorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.bind(('127.0.0.1', 0))
+		self.sock.settimeout(2)
+		self.addCleanup(self.sock.close)
+
+	def _Create(self, **kwargs):
+		accessor = OscAccessor('127.0.0.1', self.sock.getsockname()[1], batch=True, **kwargs)
+		self.addCleanup(accessor.Close)
+		app = AppModel(_BuildSchema(), accessor=accessor)
+		return accessor, app.children['foo1']
+
+	def _Receive(self):
+		return DecodeOscPacket(self.sock.recv(65536))
+
+	def _CheckNothingSent(self):
+		self.sock.settimeout(0.05)
+		with self.assertRaises(socket.timeout):
+			self.sock.recv(65536)
+
+	def test_coalescing(self):
+		accessor, foo1 = self._Create(flushinterval=None)
+		for value in (0.25, 0.5, 0.75):
+			foo1.params['f'].value = value
+		foo1.params['b'].value = True
+		accessor.Flush()
+		self.assertEqual(self._Receive(), [('/test/foo1/f', [0.75]), ('/test/foo1/b', [True])])
+		self._CheckNothingSent()
+
+	def test_size_split(self):
+		fmessage = _Encode('/test/foo1/f', ParamType.float, 0.5)
+		bmessage = _Encode('/test/foo1/b', ParamType.bool, True)
+		# room for f and b, but not the trigger as well
+		accessor, foo1 = self._Create(
+			flushinterval=None,
+			maxbundlesize=16 + 4 + len(fmessage) + 4 + len(bmessage))
+		foo1.params['f'].value = 0.5
+		foo1.params['b'].value = True
+		foo1.params['t'].value = None
+		self.assertEqual(self._Receive(), [('/test/foo1/f', [0.5]), ('/test/foo1/b', [True])])
+		accessor.Flush()
+		self.assertEqual(self._Receive(), [('/test/foo1/t', [1])])
+		self._CheckNothingSent()
+
+	def test_oversize(self):
+		fmessage = _Encode('/test/foo1/f', ParamType.float, 0.5)
+		smessage = _Encode('/test/foo1/bar/s', ParamType.string, 'a')
+		accessor, foo1 = self._Create(
+			flushinterval=None,
+			maxbundlesize=16 + 4 + len(fmessage) + 4 + len(smessage))
+		foo1.params['f'].value = 0.5
+		foo1.children['bar'].params['s'].value = 'a'
+		# sent right away, replacing the pending value for the same path
+		foo1.children['bar'].params['s'].value = 'x' * 100
+		self.assertEqual(self._Receive(), [('/test/foo1/bar/s', ['x' * 100])])
+		self.assertEqual(accessor._pendingsize, 16 + 4 + len(fmessage))
+		accessor.Flush()
+		self.assertEqual(self._Receive(), [('/test/foo1/f', [0.5])])
+		self._CheckNothingSent()
+
+	def test_flush_timer(self):
+		accessor, foo1 = self._Create(flushinterval=0.01)
+		foo1.params['f'].value = 0.5
+		foo1.params['b'].value = True
+		self.assertEqual(self._Receive(), [('/test/foo1/f', [0.5]), ('/test/foo1/b', [True])])
+		thread = accessor._thread
+		foo1.params['f'].value = 0.25
+		self.assertEqual(self._Receive(), [('/test/foo1/f', [0.25])])
+		# the same thread sends every bundle
+		self.assertIs(accessor._thread, thread)
+		foo1.params['f'].value = 0.75
+		accessor.Close()
+		self.assertFalse(thread.is_alive())
+		self.assertEqual(self._Receive(), [('/test/foo1/f', [0.75])])
+		self.assertEqual(accessor.errors, 0)
+
+	def test_close(self):
+		accessor, foo1 = self._Create(flushinterval=10, sendpolicy=SendPolicy(maxrate=0.1))
+		foo1.params['f'].value = 0.25
+		# rate limited until long after the test ends
+		foo1.params['f'].value = 0.5
+		foo1.params['b'].value = True
+		accessor.Close()
+		# the rate limited value replaces the pending one in the last bundle
+		self.assertEqual(self._Receive(), [('/test/foo1/b', [True]), ('/test/foo1/f', [0.5])])
+		self._CheckNothingSent()
+
+		# without batching, the rate limited messages are sent by themselves
+		accessor = OscAccessor('127.0.0.1', self.sock.getsockname()[1], sendpolicy=SendPolicy(maxrate=0.1))
+		param = AppModel(_BuildSchema(), accessor=accessor).children['foo1'].params['f']
+		param.value = 0.25
+		param.value = 0.5
+		accessor.Close()
+		self.assertEqual(self._Receive(), [('/test/foo1/f', [0.25])])
+		self.assertEqual(self._Receive(), [('/test/foo1/f', [0.5])])
+		self._CheckNothingSent()
+
+@unittest.skipIf(OscListener is None, 'pythonosc is not installed')
+class AsyncOscAccessorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.bind(('127.0.0.1', 0))
+		self.sock.settimeout(2)
+		self.addCleanup(self.sock.close)
+
+	def _Create(self, **kwargs):
+		# created outside of any event loop, which is only bound by Start()
+		accessor = AsyncOscAccessor('127.0.0.1', self.sock.getsockname()[1], **kwargs)
+		app = AppModel(_BuildSchema(), accessor=accessor)
+		return accessor, app.children['foo1'].params
+
+	def _ReceiveAll(self):
+		self.sock.settimeout(0.05)
+		received = []
+		while True:
+			try:
+				received += DecodeOscPacket(self.sock.recv(65536))
+			except socket.timeout:
+				return received
+
+	def test_backpressure(self):
+		accessor, params = self._Create(maxqueue=2)
+		param = params['f']
+		async def Run():
+			self.assertIsNone(await accessor.SetParam(param, 0.0))
+			accessor.SetParam(param, 0.25)
+			waiters = [accessor.SetParam(param, 0.5), accessor.SetParam(param, 0.75)]
+			self.assertFalse(any(waiter.done() for waiter in waiters))
+			with self.assertRaises(asyncio.QueueFull):
+				accessor.SetParam(param, 1.0)
+			# rejected values aren't stored
+			self.assertEqual(accessor.GetParam(param), 0.75)
+			await accessor.Start()
+			await asyncio.wait_for(asyncio.gather(*waiters), 2)
+			await accessor.Close()
+		asyncio.run(Run())
+		self.assertEqual(
+			self._ReceiveAll(),
+			[('/test/foo1/f', [value]) for value in (0.0, 0.25, 0.5, 0.75)])
+
+	def test_coalesce(self):
+		accessor, params = self._Create(maxqueue=1, policy=QueuePolicy.coalesce)
+		async def Run():
+			accessor.SetParam(params['f'], 0.25)
+			accessor.SetParam(params['f'], 0.5)
+			first = accessor.SetParam(params['b'], True)
+			# replaces the waiting message rather than waiting behind it
+			second = accessor.SetParam(params['b'], False)
+			self.assertIs(first, second)
+			self.assertEqual(len(accessor._waiters), 1)
+			await accessor.Start()
+			await asyncio.wait_for(second, 2)
+			await accessor.Close()
+		asyncio.run(Run())
+		self.assertEqual(self._ReceiveAll(), [('/test/foo1/f', [0.5]), ('/test/foo1/b', [False])])
+
+	def test_shutdown(self):
+		accessor, params = self._Create(maxqueue=1)
+		async def Run():
+			await accessor.Start()
+			accessor.SetParam(params['f'], 0.25)
+			waiter = accessor.SetParam(params['f'], 0.5)
+			await accessor.Close()
+			self.assertTrue(waiter.done())
+			self.assertIsNone(accessor._transport)
+			with self.assertRaises(Exception):
+				accessor.SetParam(params['f'], 0.75)
+			self.assertEqual(accessor.GetParam(params['f']), 0.5)
+		asyncio.run(Run())
+		self.assertEqual(self._ReceiveAll(), [('/test/foo1/f', [0.25]), ('/test/foo1/f', [0.5])])
+
+		# without Start, nothing is sent and waiting messages are cancelled
+		accessor, params = self._Create(maxqueue=1)
+		async def RunUnstarted():
+			accessor.SetParam(params['f'], 0.25)
+			waiter = accessor.SetParam(params['f'], 0.5)
+			await accessor.Close()
+			self.assertTrue(waiter.cancelled())
+		asyncio.run(RunUnstarted())
+		self.assertEqual(self._ReceiveAll(), [])
+
+if __name__ == '__main__':
+	unittest.main()
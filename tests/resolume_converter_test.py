@@ -0,0 +1,70 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from tools.resolume_converter import ResolumeSoupConverter, ResolumeStreamConverter, BeautifulSoup
+
+_CompFilePath = os.path.join(os.path.dirname(__file__), '..', 'etc', 'TCTRL test composition.avc')
+
+def _ModuleTree(modules):
+	# the soup converter doesn't convert params, so only the modules are compared
+	return [
+		(module.key, module.path, module.label, module.moduletype, _ModuleTree(module.children))
+		for module in modules
+	]
+
+# a composition with audio effects as well as video effects
+_AudioComposition = '''<?xml version="1.0" encoding="utf-8"?>
+<composition>
+	<generalInfo name="audio test"/>
+	<composition>
+		<videoEngine><effects><effect name="Flip" fileName="flip"/></effects></videoEngine>
+		<audioEngine><effects><effect name="Delay" fileName="delay"/></effects></audioEngine>
+	</composition>
+	<layer layerIndex="0">
+		<settings><name value="one"/></settings>
+		<audioLayer><effects><effect name="Echo" fileName="echo"/></effects></audioLayer>
+		<videoLayer><effects><effect name="Blur" fileName="blur"/></effects></videoLayer>
+	</layer>
+</composition>
+'''
+
+class ResolumeConverterTest(unittest.TestCase):
+
+	def test_stream(self):
+		converter = ResolumeStreamConverter(_CompFilePath)
+		app = converter.ConvertToSchema()
+		self.assertEqual(
+			[module.path for module in app.children],
+			['/composition', '/layer1', '/layer2', '/layer3'])
+		self.assertEqual(
+			[module.path for module in app.children[0].children],
+			['/composition/video/effect1'])
+		outstream = io.StringIO()
+		ResolumeStreamConverter(_CompFilePath).WriteSchemaJson(outstream)
+		self.assertEqual(json.loads(outstream.getvalue()), json.loads(app.ToJson()))
+
+	@unittest.skipIf(BeautifulSoup is None, 'bs4 is not available')
+	def test_soup_matches_stream(self):
+		soupapp = ResolumeSoupConverter(_CompFilePath).ConvertToSchema()
+		streamapp = ResolumeStreamConverter(_CompFilePath).ConvertToSchema()
+		self.assertEqual((soupapp.key, soupapp.label), (streamapp.key, streamapp.label))
+		self.assertEqual(_ModuleTree(soupapp.children), _ModuleTree(streamapp.children))
+
+	def test_video_effects_only(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			filepath = os.path.join(tmpdir, 'audio.avc')
+			with open(filepath, 'w') as f:
+				f.write(_AudioComposition)
+			converters = [ResolumeStreamConverter]
+			if BeautifulSoup is not None:
+				converters.append(ResolumeSoupConverter)
+			for converter in converters:
+				app = converter(filepath).ConvertToSchema()
+				self.assertEqual(
+					[(effect.path, effect.label) for module in app.children for effect in module.children],
+					[('/composition/video/effect1', 'Flip'), ('/layer1/video/effect1', 'Blur')])
+
+if __name__ == '__main__':
+	unittest.main()
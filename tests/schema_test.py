@@ -0,0 +1,215 @@
+import copy
+import gc
+import json
+import os
+import pickle
+import subprocess
+import sys
+import unittest
+from tctrl.schema import *
+
+def _BuildSchema(indexpaths):
+	return AppSchema(
+		'test',
+		indexpaths=indexpaths,
+		children=[
+			ModuleSpec(
+				'foo1',
+				path='/foo1',
+				params=[
+					ParamSpec('x', ptype=ParamType.float, path='/foo1/x'),
+					ParamSpec(
+						'v',
+						ptype=ParamType.fvec,
+						path='/foo1/v',
+						parts=[
+							ParamPartSpec('v1', path='/foo1/v1'),
+							ParamPartSpec('v2', path='/foo1/v2'),
+						]),
+				],
+				children=[
+					ModuleSpec('bar', path='/foo1/bar'),
+				]),
+			ModuleSpec('foo2', path='/foo2'),
+		],
+	)
+
+class SchemaIndexTest(unittest.TestCase):
+
+	def test_lookups(self):
+		for indexpaths in (False, True):
+			appschema = _BuildSchema(indexpaths)
+			foo1 = appschema.children[0]
+			self.assertIs(appschema.EvaluatePath('foo1/bar'), foo1.children[0])
+			self.assertIsNone(appschema.EvaluatePath('foo1/baz'))
+			self.assertIsNone(appschema.EvaluatePath('foo1/'))
+			self.assertIs(foo1.GetParam('x'), foo1.params[0])
+			self.assertIs(appschema.FindByPath('/foo1/v2'), foo1.params[1].parts[1])
+			self.assertIs(appschema.FindByPath('/foo2'), appschema.children[1])
+			self.assertIsNone(appschema.FindByPath('/nope'))
+
+	def test_invalidation(self):
+		appschema = _BuildSchema(True)
+		foo1 = appschema.EvaluatePath('foo1')
+		self.assertIsNone(foo1.GetParam('y'))
+		foo1.params.append(ParamSpec('y', path='/foo1/y'))
+		self.assertIs(foo1.GetParam('y'), foo1.params[2])
+		self.assertIs(appschema.FindByPath('/foo1/y'), foo1.params[2])
+		foo1.children = [ModuleSpec('baz', path='/foo1/baz')]
+		self.assertIsNone(appschema.EvaluatePath('foo1/bar'))
+		self.assertIs(appschema.EvaluatePath('foo1/baz'), foo1.children[0])
+		foo1.key = 'renamed'
+		self.assertIsNone(appschema.EvaluatePath('foo1/baz'))
+		self.assertIs(appschema.EvaluatePath('renamed/baz'), foo1.children[0])
+
+	def test_invalidation_is_per_schema(self):
+		app1 = _BuildSchema(True)
+		app2 = _BuildSchema(True)
+		index1 = app1.GetIndex()
+		index2 = app2.GetIndex()
+		foo1 = app1.children[0]
+		bartable = foo1.children[0]._keyindex
+		app2.children[0].params.append(ParamSpec('y', path='/foo1/y'))
+		self.assertIs(app1.GetIndex(), index1)
+		self.assertIsNot(app2.GetIndex(), index2)
+		# only the changed node's tables and those of its parents are rebuilt
+		app1.children[1].key = 'renamed'
+		self.assertIs(foo1.children[0]._keyindex, bartable)
+		self.assertIsNone(app1._keyindex)
+		self.assertIsNot(app1.GetIndex(), index1)
+		self.assertIs(app1.EvaluatePath('renamed'), app1.children[1])
+
+	def test_construction_is_untracked(self):
+		appschema = _BuildSchema(True)
+		self.assertIs(type(appschema.children[0]), ModuleSpec)
+		appschema.GetIndex()
+		self.assertIsNot(type(appschema.children[0]), ModuleSpec)
+		self.assertIsInstance(appschema.children[0], ModuleSpec)
+
+	def test_index_ignored_by_eq_and_copy(self):
+		appschema = _BuildSchema(True)
+		appschema.EvaluatePath('foo1/bar')
+		copied = copy.deepcopy(appschema)
+		self.assertEqual(copied, _BuildSchema(True))
+		self.assertIsNone(getattr(copied, '_index', None))
+
+class JsonCacheTest(unittest.TestCase):
+
+	def test_changes_are_serialized(self):
+		appschema = _BuildSchema(False)
+		foo1 = appschema.children[0]
+		first = appschema.ToJson()
+		self.assertIs(appschema.ToJson(), first)
+		foo1.params[1].parts[0].label = 'Part 1'
+		self.assertIn('Part 1', appschema.ToJson())
+		foo1.children.append(ModuleSpec('baz'))
+		self.assertIn('baz', appschema.ToJson())
+		foo1.children[0].tags = ['sometag']
+		self.assertIn('sometag', appschema.ToJson())
+		foo1.children[0].tags.append('othertag')
+		foo1.children[0].MarkChanged()
+		self.assertIn('othertag', appschema.ToJson())
+		self.assertEqual(appschema.ToJson(indent='  '), json.dumps(json.loads(appschema.ToJson()), indent='  ', sort_keys=True))
+
+	def test_shared_nodes(self):
+		shared = ParamSpec('x', label='X')
+		app1 = AppSchema('app1', children=[ModuleSpec('m', params=[shared])])
+		app2 = AppSchema('app2', children=[ModuleSpec('m', params=[shared])])
+		app1.ToJson()
+		app2.ToJson()
+		shared.label = 'Changed'
+		self.assertIn('Changed', app1.ToJson())
+		self.assertIn('Changed', app2.ToJson())
+
+	def test_shared_nodes_released(self):
+		shared = ParamSpec('x', label='X')
+		module = ModuleSpec('m', params=[shared])
+		module.ToJson()
+		for i in range(10):
+			AppSchema('app%d' % i, children=[ModuleSpec('m', params=[shared])]).ToJson()
+		gc.collect()
+		self.assertEqual([ref() for ref in shared._parent if ref() is not None], [module])
+		shared.label = 'Changed'
+		self.assertIn('Changed', module.ToJson())
+
+	def test_json_dict_is_copy(self):
+		appschema = _BuildSchema(False)
+		text = appschema.ToJson()
+		jsondict = appschema.JsonDict
+		jsondict['children'][0]['params'][0]['label'] = 'Changed'
+		jsondict['children'].clear()
+		self.assertEqual(appschema.JsonDict, json.loads(text))
+		appschema.label = 'Label'
+		self.assertNotIn('Changed', appschema.ToJson())
+
+	def test_copies(self):
+		appschema = _BuildSchema(False)
+		appschema.ToJson()
+		copied = copy.deepcopy(appschema)
+		self.assertEqual(copied, appschema)
+		copied.children[0].label = 'Copy'
+		self.assertIn('Copy', copied.ToJson())
+		self.assertNotIn('Copy', appschema.ToJson())
+		self.assertEqual(pickle.loads(pickle.dumps(appschema)), appschema)
+
+class FingerprintTest(unittest.TestCase):
+
+	def test_fingerprints(self):
+		appschema = _BuildSchema(False)
+		first = appschema.Fingerprint()
+		self.assertEqual(len(first), 16)
+		self.assertEqual(_BuildSchema(False).Fingerprint(), first)
+		self.assertEqual(copy.deepcopy(appschema).Fingerprint(), first)
+		foo2 = appschema.children[1].Fingerprint()
+		appschema.children[0].params[1].parts[0].label = 'Part 1'
+		self.assertNotEqual(appschema.Fingerprint(), first)
+		self.assertEqual(appschema.children[1].Fingerprint(), foo2)
+		appschema.children[0].params[1].parts[0].label = None
+		self.assertEqual(appschema.Fingerprint(), first)
+
+	def test_unordered_values(self):
+		a = ModuleSpec('m', tags={'x', 'y', 'z'}, params=[ParamSpec('p', properties={'a': 1, 'b': {'c': 2, 'd': 3}})])
+		b = ModuleSpec('m', tags={'z', 'y', 'x'}, params=[ParamSpec('p', properties={'b': {'d': 3, 'c': 2}, 'a': 1})])
+		self.assertEqual(a.Fingerprint(), b.Fingerprint())
+		self.assertNotEqual(a.Fingerprint(), ModuleSpec('m', tags=['x', 'y', 'z']).Fingerprint())
+		# set order depends on the hash seed, which differs between processes
+		script = 'from tctrl.schema import *; print(ModuleSpec("m", tags={"t%d" % i for i in range(20)}).Fingerprint().hex())'
+		outputs = set()
+		for seed in ('1', '2', '3'):
+			env = dict(os.environ, PYTHONHASHSEED=seed)
+			outputs.add(subprocess.check_output([sys.executable, '-c', script], env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+		self.assertEqual(len(outputs), 1)
+
+class WalkModulesTest(unittest.TestCase):
+
+	def test_orders(self):
+		appschema = _BuildSchema(False)
+		self.assertEqual(
+			[(m.key, p.key, d) for m, p, d in appschema.WalkModules()],
+			[('foo1', 'test', 1), ('bar', 'foo1', 2), ('foo2', 'test', 1)])
+		self.assertEqual(
+			[(m.key, p.key, d) for m, p, d in appschema.WalkModules(postorder=True)],
+			[('bar', 'foo1', 2), ('foo1', 'test', 1), ('foo2', 'test', 1)])
+
+	def test_prune(self):
+		appschema = _BuildSchema(False)
+		prune = lambda m: m.key == 'foo1'
+		self.assertEqual(
+			[m.key for m, _, _ in appschema.WalkModules(prune=prune)],
+			['foo1', 'foo2'])
+		self.assertEqual(
+			[m.key for m, _, _ in appschema.WalkModules(postorder=True, prune=prune)],
+			['foo1', 'foo2'])
+
+	def test_deep_tree(self):
+		appschema = AppSchema('test')
+		parent = appschema
+		for i in range(5000):
+			module = ModuleSpec('m%d' % i)
+			parent.children.append(module)
+			parent = module
+		depths = [d for _, _, d in appschema.WalkModules(postorder=True)]
+		self.assertEqual(depths, list(range(5000, 0, -1)))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,7 +1,12 @@
+import json
 import xml.etree.ElementTree as ET
 from tctrl.schema import *
 import sys
-from bs4 import BeautifulSoup
+
+try:
+	from bs4 import BeautifulSoup
+except ImportError:
+	BeautifulSoup = None
 
 #
 # Example osc mappings
@@ -17,6 +22,11 @@ from bs4 import BeautifulSoup
 # /composition/video/effect5/param2/values (Float 0.0 - 1.0)
 #
 
+# The elements which hold the video effects of the composition and of each
+# layer. Audio effects (such as in audioLayer) have /audio addresses and
+# aren't converted.
+_VideoEffectParents = ('videoEngine', 'videoLayer')
+
 class ResolumeSoupConverter:
 	def __init__(self, compfilepath):
 		self.soup = BeautifulSoup(open(compfilepath), 'xml')
@@ -29,7 +39,7 @@ class ResolumeSoupConverter:
 			label=compname,
 			tags=['resolume'],
 		)
-		app.children.append(self._BuildCompositionMaster(self.soup.composition))
+		app.children.append(self._BuildCompositionMaster(self.soup.composition.find('composition', recursive=False)))
 		for layer in self.soup.composition.find_all('layer', recursive=False):
 			app.children.append(self._BuildLayer(layer))
 		return app
@@ -41,22 +51,30 @@ class ResolumeSoupConverter:
 			moduletype='composition',
 			path='/composition'
 		)
+		self._BuildEffects(module, composition)
 		return module
 
 	def _BuildLayer(self, layer: BeautifulSoup):
-		layerIndex = int(layer['layerIndex'])
+		# layerIndex is 0-based, while the OSC addresses of layers are 1-based
+		layerIndex = int(layer['layerIndex']) + 1
 		module = ModuleSpec(
 			'layer%d' % layerIndex,
 			label=layer.settings.find('name', recursive=False)['value'],
 			path='/layer%d' % layerIndex,
 			moduletype='layer',
 		)
-		effects = layer.effects
-		if effects is not None:
-			for i, effect in enumerate(effects.find_all('effect', recursive=False)):
-				module.children.append(self._BuildEffect(effect, 'effect%d' % (i + 1), basepath=module.path + '/'))
+		self._BuildEffects(module, layer)
 		return module
 
+	def _BuildEffects(self, module: ModuleSpec, elem: BeautifulSoup):
+		effects = []
+		for child in elem.find_all(_VideoEffectParents, recursive=False):
+			effectlist = child.find('effects', recursive=False)
+			if effectlist is not None:
+				effects += effectlist.find_all('effect', recursive=False)
+		for i, effect in enumerate(effects):
+			module.children.append(self._BuildEffect(effect, 'effect%d' % (i + 1), basepath=module.path + '/video/'))
+
 	def _BuildEffect(self, effect: BeautifulSoup, key: str, basepath: str):
 		module = ModuleSpec(
 			key,
@@ -67,133 +85,192 @@ class ResolumeSoupConverter:
 		return module
 
 
-class ResolumeConverter:
+class ResolumeStreamConverter:
+	"""Converts a Resolume composition (.avc) file without loading the whole
+	document, using ElementTree's iterparse. Effects are converted when their
+	elements close, and the composition master and each layer are converted
+	(and their elements cleared) when theirs do, so memory use depends on the
+	size of the largest layer rather than the whole composition."""
+
 	def __init__(self, compfilepath):
-		self.root = ET.parse(compfilepath).getroot()
+		self.compfilepath = compfilepath
+		self.compname = None
+
+	def IterModules(self):
+		"""Lazily yields the ModuleSpecs for the composition master and then
+		each layer, in the order that they appear in the file."""
+		root = None
+		tags = []
+		basepath = None
+		effects = []
+		for event, elem in ET.iterparse(self.compfilepath, events=('start', 'end')):
+			if event == 'start':
+				if root is None:
+					root = elem
+				elif len(tags) == 1:
+					basepath = self._ModulePath(elem)
+				tags.append(elem.tag)
+				continue
+			tags.pop()
+			depth = len(tags)
+			if depth == 1:
+				module = None
+				if elem.tag == 'generalInfo':
+					self.compname = elem.get('name')
+				elif elem.tag == 'composition':
+					module = self._ConvertCompositionMaster(elem, effects)
+				elif elem.tag == 'layer':
+					module = self._ConvertLayer(elem, effects)
+				effects = []
+				root.clear()
+				if module is not None:
+					yield module
+			elif elem.tag == 'effect' and basepath and depth == 4 and tags[-1] == 'effects' and tags[-2] in _VideoEffectParents:
+				effects.append(self._ConvertEffect(elem, basepath + '/video', len(effects) + 1))
+				elem.clear()
 
 	def ConvertToSchema(self):
-		compname = self.root.findtext('generalInfo/@name')
-		app = AppSchema(
-			key=compname,
+		return self._BuildApp(children=list(self.IterModules()))
+
+	def WriteSchemaJson(self, outstream):
+		"""Writes the schema's JSON to a text stream, one module at a time. The
+		children are written first, since the app's other fields depend on the
+		composition name, which is only known once the file has been read, so
+		the output parses to the same object as the schema's ToJson() but the
+		order of its keys may differ."""
+		count = 0
+		for module in self.IterModules():
+			outstream.write('{"children": [' if not count else ', ')
+			outstream.write(module.ToJson())
+			count += 1
+		fields = self._BuildApp().JsonDict
+		if not count:
+			outstream.write(json.dumps(fields, sort_keys=True))
+			return
+		outstream.write(']')
+		for key in sorted(fields):
+			outstream.write(', %s: %s' % (json.dumps(key), json.dumps(fields[key], sort_keys=True)))
+		outstream.write('}')
+
+	def _BuildApp(self, children=None):
+		compname = self.compname or 'composition'
+		return AppSchema(
+			key=compname.replace(' ', ''),
 			label=compname,
 			tags=['resolume'],
-			children=[],
+			children=children,
 		)
-		app.children.append(self._ConvertCompositionMaster(self.root.find('./composition')))
-		for layer in self.root.findall('./composition/layer'):
-			app.children.append(self._ConvertLayer(layer))
-		# ...
-		return app
 
-	def _ConvertCompositionMaster(self, compositionelem: ET.Element):
-		path = 'composition'
-		module = ModuleSpec(
-			'master',
+	def _ModulePath(self, elem: ET.Element):
+		if elem.tag == 'composition':
+			return '/composition'
+		if elem.tag == 'layer':
+			return '/layer%d' % (int(elem.get('layerIndex')) + 1)
+		return None
+
+	def _ConvertCompositionMaster(self, compositionelem: ET.Element, effects):
+		path = '/composition'
+		return ModuleSpec(
+			'composition',
 			label='Composition Master',
 			moduletype='composition',
 			path=path,
+			params=[
+				_BoolParam('bypassed', 'Bypassed', path + '/bypassed', _ChildValue(compositionelem, 'settings/bypassed')),
+			],
+			children=effects,
 		)
-		effects = compositionelem.findall('./videoEngine/effects/effect')
-		for i, effect in enumerate(effects):
-			module.children.append(self._ConvertEffect(effect, path, 'effect%d' % i))
-		return module
 
-	def _ConvertLayer(self, layerelem: ET.Element):
-		layernum = int(layerelem.attrib['layerIndex'])
-		layerkey = 'layer%d' % layernum
-		layerpath = '/layer%d' % layernum
-		module = ModuleSpec(
-			layerkey,
-			label=layerkey,
-			path=layerpath,
+	def _ConvertLayer(self, layerelem: ET.Element, effects):
+		path = self._ModulePath(layerelem)
+		key = path[1:]
+		return ModuleSpec(
+			key,
+			label=_ChildValue(layerelem, 'settings/name') or key,
 			moduletype='layer',
-			children=[],
-			params=[],
-		)
-		module.params.append(
-			self._BypassedParam(
-				layerelem.find('./settings/bypassed'),
-				modulepath=layerpath))
-		module.params.append(
-			ParamSpec(
-				'solo',
-				label='Solo',
-				ptype=ParamType.bool,
-				path='%s/solo' % layerpath,
-				defaultval=False,
-				value=layerelem.find('./settings/solo').attrib('value') != '0'
-			))
-		effects = layerelem.findall('./videoLayer/effects/effect')
-		for i, effect in enumerate(effects):
-			module.children.append(
-				self._ConvertEffect(
-					effect,
-					path='%s/effect%d' % (layerpath, (i + 1)),
-					key='effect%d' % (i + 1),
-				))
-		# ...
-		return module
-
-	def _BypassedParam(self, bypassedelem: ET.Element, modulepath: str):
-		return ParamSpec(
-			'bypass',
-			label='Bypass',
-			path='%s/bypassed/values' % modulepath,
-			defaultval=False,
-			value=bypassedelem.attrib['value'] != '0',
-		)
-
-	def _OpacityParam(self, paramelem: ET.Element, modulepath: str):
-		# TODO: stuff...?
-		return ParamSpec(
-			'opacity',
-			label='Opacity',
-			path='%s/opacity/values' % modulepath,
-			defaultval=1
+			path=path,
+			params=[
+				_BoolParam('bypassed', 'Bypassed', path + '/bypassed', _ChildValue(layerelem, 'settings/bypassed')),
+				_BoolParam('solo', 'Solo', path + '/solo', _ChildValue(layerelem, 'settings/solo')),
+			],
+			children=effects,
 		)
 
-	def _ConvertEffect(self, effectelem: ET.Element, path : str, key : str):
-		module = ModuleSpec(
+	def _ConvertEffect(self, effectelem: ET.Element, basepath, number):
+		key = 'effect%d' % number
+		path = '%s/%s' % (basepath, key)
+		params = [
+			_BoolParam('bypassed', 'Bypassed', path + '/bypassed', _ChildValue(effectelem, 'bypassed')),
+		]
+		for paramelem in effectelem.findall('parameter'):
+			if _ChildValue(paramelem, 'name'):
+				params.append(_ConvertParameter(paramelem, path))
+		return ModuleSpec(
 			key,
+			label=effectelem.get('name'),
+			moduletype=effectelem.get('fileName'),
 			path=path,
-			label=effectelem.attrib['name'],
-			# moduletype ?
-			params=[
-				self._BypassedParam(effectelem.find('./bypassed'), modulepath=path),
-			],
+			params=params,
 		)
-		for paramelem in effectelem.findall('./parameter'):
-			paramkey = paramelem.find('./name').attrib['value']
-			if paramkey == 'Opacity':
-				module.params.append(self._OpacityParam(paramelem, modulepath=path))
-			else:
-				module.params.append(
-					self._ConvertParameter(
-						paramelem,
-						path=path + '/' + paramkey,
-						key=paramkey))
-		# ...
-		return module
 
-	def _ConvertParameter(self, paramelem: ET.Element, path: str, key: str):
-		param = ParamSpec(
+def _ChildValue(elem: ET.Element, path):
+	child = elem.find(path)
+	return None if child is None else child.get('value')
+
+def _BoolParam(key, label, path, value):
+	return ParamSpec(
+		key,
+		label=label,
+		ptype=ParamType.bool,
+		path=path,
+		defaultval=False,
+		value=None if value is None else value != '0',
+	)
+
+def _ConvertParameter(paramelem: ET.Element, effectpath):
+	# Effect parameters are sent over OSC normalized to 0-1, and their values
+	# element (if there is one) has their range and current value.
+	name = _ChildValue(paramelem, 'name')
+	label = _ChildValue(paramelem, 'nameGiven') or name
+	key = name.lower()
+	path = '%s/%s/values' % (effectpath, key)
+	valueselem = paramelem.find('values')
+	def _Value(attrname):
+		text = valueselem.get(attrname) if valueselem is not None else None
+		return None if text is None else float(text)
+	if paramelem.get('paramType') == '0':
+		default = _Value('defaultValue')
+		value = _Value('curValue')
+		return ParamSpec(
 			key,
-			label=paramelem.findtext('./nameGiven/@value'),
-			ptype=ParamType.float,
+			label=label,
+			ptype=ParamType.bool,
 			path=path,
-			minnorm=float(paramelem.findtext('./values/@startValue', default='0')),
-			maxnorm=float(paramelem.findtext('./values/@endValue', default='1')),
-			defaultval=float(paramelem.findtext('./values/@defaultValue', default='0')),
-			value=float(paramelem.findtext('./values/@curValue', default='0')),
+			defaultval=None if default is None else default != 0,
+			value=None if value is None else value != 0,
 		)
-		return param
+	minval = _Value('startValue')
+	maxval = _Value('stopValue')
+	return ParamSpec(
+		key,
+		label=label,
+		ptype=ParamType.float,
+		path=path,
+		minnorm=0.0 if minval is None else minval,
+		maxnorm=1.0 if maxval is None else maxval,
+		defaultval=_Value('defaultValue'),
+		value=_Value('curValue'),
+	)
 
 def main(args):
 	compfilepath = args[1]
-	converter = ResolumeSoupConverter(compfilepath)
-	schema = converter.ConvertToSchema()
-	schemajson = schema.ToJson(indent='  ')
-	print(schemajson)
+	converter = ResolumeStreamConverter(compfilepath)
+	if len(args) > 2:
+		with open(args[2], 'w', encoding='utf-8') as outstream:
+			converter.WriteSchemaJson(outstream)
+	else:
+		converter.WriteSchemaJson(sys.stdout)
+		print()
 
 if __name__ == '__main__':
 	main(sys.argv)